@@ -1 +1 @@
-from pytracertool.pytracertool import *
+from .pytracertool import *
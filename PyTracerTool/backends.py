@@ -0,0 +1,439 @@
+"""
+Tracing backends for PyTracerTool
+
+A backend is responsible for delivering call, line and return events for the traced code to a CodeTracer. Four
+backends are provided:
+
+    - SettraceBackend: Uses `sys.settrace`, available on every Python 3 interpreter.
+    - MonitoringBackend: Uses `sys.monitoring` (PEP 669), available on Python 3.12+. Events are only enabled for the
+      code objects compiled from the user's code, so code the user calls into (the standard library, tabulate, ...)
+      runs without any tracing overhead.
+    - InstrumentBackend: Runs an instrumented copy of the code (see the instrument module), which calls the
+      CodeTracer itself at each step, so no trace hook is installed at all.
+    - ReducedBackend: Runs a copy of the code with reduced instrumentation, which only records assignments, loop
+      binds and calls to print. It is faster than the other backends, but does not record the same steps.
+
+Usage:
+    Backends are not normally used directly; pass `backend="settrace"`, `backend="monitoring"`,
+    `backend="instrument"`, `backend="reduced"` or the default `backend="auto"` to CodeTracer, and `get_backend`
+    picks the backend to use.
+"""
+
+import sys
+import threading
+import types
+import typing
+
+from . import instrument
+
+
+class SettraceBackend(object):
+    """
+    SettraceBackend delivers events to a CodeTracer through `sys.settrace`.
+
+    Before Python 3.12, a loop that jumps back to the instruction it is on (`while True: pass`) produces no trace
+    events at all, so the tracer never gets to check its limits. When the tracer has a timeout, a watchdog thread
+    therefore waits for it, then turns on 'opcode' events for the frames the code is running, which the tracer
+    uses to stop the code.
+
+    Methods:
+        __init__(tracer): Initialise the backend for a CodeTracer.
+        start(code): Install the tracer's step_tracer as the trace function.
+        stop(): Remove the trace function.
+
+    Attributes:
+        name: The name of the backend.
+        instrumented: Whether the backend runs the instrumented code rather than the plain compiled code.
+        tracer: The CodeTracer receiving the events.
+        watchdog: The timer enabling 'opcode' events once the timeout has passed, or None.
+    """
+
+    name = "settrace"
+    instrumented = False
+
+    def __init__(self, tracer):
+        """
+        Initialise a new instance of SettraceBackend.
+
+        :param self: The instance of the class.
+        :param tracer: The CodeTracer receiving the events.
+        :type tracer: CodeTracer
+        """
+        self.tracer = tracer
+        self.watchdog = None
+
+    def start(self, code: types.CodeType):
+        """
+        Start delivering events.
+
+        :param self: The instance of the class.
+        :param code: The compiled code that is about to be executed.
+        :type code: types.CodeType
+        :return: None
+        """
+        timeout = self.tracer.limits.timeout
+        if timeout is not None and sys.version_info < (3, 12):
+            self.watchdog = threading.Timer(timeout, self._interrupt, (threading.get_ident(),))
+            self.watchdog.daemon = True
+            self.watchdog.start()
+        sys.settrace(self.tracer.step_tracer)
+
+    def stop(self):
+        """
+        Stop delivering events.
+
+        :param self: The instance of the class.
+        :return: None
+        """
+        sys.settrace(None)
+        if self.watchdog is not None:
+            self.watchdog.cancel()
+            self.watchdog = None
+
+    @staticmethod
+    def _interrupt(thread_id: int):
+        frame = sys._current_frames().get(thread_id)
+        while frame is not None:
+            if frame.f_trace is not None:
+                frame.f_trace_opcodes = True
+            frame = frame.f_back
+
+
+class MonitoringBackend(object):
+    """
+    MonitoringBackend delivers events to a CodeTracer through `sys.monitoring` (Python 3.12+).
+
+    LINE, JUMP, PY_START, PY_RETURN and PY_YIELD events are enabled locally, only on the code objects compiled
+    from the user's code, so no events are generated for any other code. PY_UNWIND can only be enabled globally;
+    its callback ignores code objects that are not traced.
+
+    LINE is not generated when a jump lands on the line that is already running, which is how a loop written on
+    one line (`for i in range(4): x += i`, or a comprehension) starts its next iteration, whereas sys.settrace
+    reports a 'line' event for every backward jump. The JUMP callback makes up for it: a backward jump to the
+    same line is reported as a line event, and every other jump location is disabled the first time it is seen.
+
+    When the tracer's frame filter allows code outside the submitted source, those code objects cannot be
+    enumerated up front, so the events are enabled globally instead, and each callback returns DISABLE the first
+    time it sees a code location the filter rejects, which turns the event off for that location.
+
+    Methods:
+        __init__(tracer): Initialise the backend for a CodeTracer.
+        is_available(): Check whether the interpreter supports sys.monitoring.
+        start(code): Claim a tool id and enable events on the traced code objects.
+        stop(): Disable all events and release the tool id.
+
+    Attributes:
+        name: The name of the backend.
+        tracer: The CodeTracer receiving the events.
+        tool_id: The sys.monitoring tool id claimed by the backend, or None when not started.
+        code_objects: The set of code objects events are enabled on.
+        global_events: Whether events are enabled globally rather than on the code objects only.
+    """
+
+    name = "monitoring"
+    instrumented = False
+    tool_name = "pytracertool"
+
+    def __init__(self, tracer):
+        """
+        Initialise a new instance of MonitoringBackend.
+
+        :param self: The instance of the class.
+        :param tracer: The CodeTracer receiving the events.
+        :type tracer: CodeTracer
+        """
+        self.tracer = tracer
+        self.tool_id = None
+        self.code_objects = set()
+        self.global_events = False
+        self._decisions = {}
+        self._line_starts = {}
+
+    @staticmethod
+    def is_available() -> bool:
+        """
+        Check whether the running interpreter supports sys.monitoring.
+
+        :return: True on Python 3.12+, False otherwise.
+        :rtype: bool
+        """
+        return hasattr(sys, "monitoring")
+
+    def start(self, code: types.CodeType):
+        """
+        Claim a free tool id, register the callbacks and enable events on the user's code objects.
+
+        :param self: The instance of the class.
+        :param code: The compiled code that is about to be executed.
+        :type code: types.CodeType
+        :return: None
+        :raises RuntimeError: If every sys.monitoring tool id is already in use.
+        """
+        monitoring = sys.monitoring
+        events = monitoring.events
+
+        for tool_id in range(6):
+            if monitoring.get_tool(tool_id) is None:
+                monitoring.use_tool_id(tool_id, self.tool_name)
+                self.tool_id = tool_id
+                break
+        else:
+            raise RuntimeError("No free sys.monitoring tool id is available")
+
+        monitoring.register_callback(self.tool_id, events.PY_START, self._py_start)
+        monitoring.register_callback(self.tool_id, events.LINE, self._line)
+        monitoring.register_callback(self.tool_id, events.JUMP, self._jump)
+        monitoring.register_callback(self.tool_id, events.PY_RETURN, self._py_return)
+        monitoring.register_callback(self.tool_id, events.PY_YIELD, self._py_return)
+        monitoring.register_callback(self.tool_id, events.PY_UNWIND, self._py_unwind)
+
+        local_events = events.PY_START | events.LINE | events.JUMP | events.PY_RETURN | events.PY_YIELD
+        frame_filter = self.tracer.frame_filter
+        self.global_events = bool(frame_filter.allow)
+        self.code_objects = set(
+            code_object for code_object in iter_code_objects(code)
+            if frame_filter.accepts_code(code_object, "__main__")
+        )
+        self._decisions = dict.fromkeys(self.code_objects, True)
+
+        if self.global_events:
+            monitoring.set_events(self.tool_id, local_events | events.PY_UNWIND)
+        else:
+            for code_object in self.code_objects:
+                monitoring.set_local_events(self.tool_id, code_object, local_events)
+            monitoring.set_events(self.tool_id, events.PY_UNWIND)
+
+    def stop(self):
+        """
+        Disable all events, unregister the callbacks and release the tool id.
+
+        :param self: The instance of the class.
+        :return: None
+        """
+        if self.tool_id is None:
+            return
+
+        monitoring = sys.monitoring
+        events = monitoring.events
+
+        monitoring.set_events(self.tool_id, events.NO_EVENTS)
+        for code_object in self.code_objects:
+            monitoring.set_local_events(self.tool_id, code_object, events.NO_EVENTS)
+        for event in (
+            events.PY_START, events.LINE, events.JUMP, events.PY_RETURN, events.PY_YIELD, events.PY_UNWIND
+        ):
+            monitoring.register_callback(self.tool_id, event, None)
+        monitoring.free_tool_id(self.tool_id)
+        if self.global_events:
+            monitoring.restart_events()
+
+        self.tool_id = None
+        self.code_objects = set()
+        self._decisions = {}
+        self._line_starts = {}
+
+    def _is_traced(self, code: types.CodeType, frame: types.FrameType) -> bool:
+        decision = self._decisions.get(code)
+        if decision is None:
+            decision = self._decisions[code] = (
+                "<module>" not in code.co_name and self.tracer.frame_filter.accepts(frame)
+            )
+        return decision
+
+    def _py_start(self, code: types.CodeType, instruction_offset: int):
+        frame = sys._getframe(1)
+        if not self._is_traced(code, frame):
+            return sys.monitoring.DISABLE
+        self.tracer._on_call(frame)
+
+    def _line(self, code: types.CodeType, line_number: int):
+        frame = sys._getframe(1)
+        if not self._is_traced(code, frame):
+            return sys.monitoring.DISABLE
+        self.tracer._on_line(frame)
+
+    def _jump(self, code: types.CodeType, instruction_offset: int, destination_offset: int):
+        if destination_offset > instruction_offset or (
+            self._line_of(code, destination_offset) != self._line_of(code, instruction_offset)
+        ):
+            # Forward jumps produce no 'line' event with sys.settrace, and a jump to another line produces LINE.
+            return sys.monitoring.DISABLE
+        frame = sys._getframe(1)
+        if not self._is_traced(code, frame):
+            return sys.monitoring.DISABLE
+        self.tracer._on_line(frame)
+
+    def _line_of(self, code: types.CodeType, offset: int) -> typing.Optional[int]:
+        lines = self._line_starts.get(code)
+        if lines is None:
+            lines = self._line_starts[code] = {}
+            for start, end, line in code.co_lines():
+                for instruction in range(start, end, 2):
+                    lines[instruction] = line
+        return lines.get(offset)
+
+    def _py_return(self, code: types.CodeType, instruction_offset: int, retval: typing.Any):
+        frame = sys._getframe(1)
+        if not self._is_traced(code, frame):
+            return sys.monitoring.DISABLE
+        self.tracer._on_return(frame, retval)
+
+    def _py_unwind(self, code: types.CodeType, instruction_offset: int, exception: BaseException):
+        frame = sys._getframe(1)
+        if self._is_traced(code, frame):
+            self.tracer._on_return(frame, raised=True)
+
+
+class InstrumentBackend(object):
+    """
+    InstrumentBackend runs the instrumented form of the code, built by instrument.compile_instrumented, in which
+    recording calls inserted into the code report each step to the CodeTracer.
+
+    No trace hook is installed, so the code runs close to its normal speed apart from the recording calls, and
+    any code it calls into runs without any tracing overhead. The steps recorded match those of the other backends
+    except in the cases listed in the instrument module.
+
+    Methods:
+        __init__(tracer): Initialise the backend for a CodeTracer.
+        start(code): Define the recording hooks in the globals the code runs with.
+        stop(): Nothing to undo; the hooks are left in the finished trace's context.
+
+    Attributes:
+        name: The name of the backend.
+        instrumented: Whether the backend runs the instrumented code rather than the plain compiled code.
+        reduced: Whether the code is compiled with reduced instrumentation.
+        tracer: The CodeTracer receiving the steps.
+    """
+
+    name = "instrument"
+    instrumented = True
+    reduced = False
+
+    def __init__(self, tracer):
+        """
+        Initialise a new instance of InstrumentBackend.
+
+        :param self: The instance of the class.
+        :param tracer: The CodeTracer receiving the steps.
+        :type tracer: CodeTracer
+        """
+        self.tracer = tracer
+
+    def start(self, code: types.CodeType):
+        """
+        Define the recording hooks called by the instrumented code in the tracer's context.
+
+        :param self: The instance of the class.
+        :param code: The instrumented code that is about to be executed.
+        :type code: types.CodeType
+        :return: None
+        """
+        self.tracer.context.update({
+            instrument.STEP_HOOK: self.tracer._on_step,
+            instrument.VALUE_HOOK: self.tracer._on_value,
+            instrument.RETURN_HOOK: self.tracer._on_return_value,
+            instrument.ITERATE_HOOK: self.tracer._on_iterate,
+            instrument.ENTER_HOOK: self.tracer._on_enter,
+            instrument.EXIT_HOOK: self.tracer._on_exit,
+            instrument.DECORATE_HOOK: self.tracer._on_decorate,
+        })
+
+    def stop(self):
+        """
+        Stop delivering steps; the instrumented code only calls the hooks while it runs, so there is nothing to undo.
+
+        :param self: The instance of the class.
+        :return: None
+        """
+
+
+class ReducedBackend(InstrumentBackend):
+    """
+    ReducedBackend runs the code compiled with reduced instrumentation, which records a step only after
+    assignments, at loop binds, at the start of functions and after calls to print, with the variables bound there.
+
+    It is a reduced-fidelity mode: the rows differ from those of the other backends, as described in the
+    instrument module, in exchange for recording far fewer values at far fewer points.
+
+    Methods:
+        __init__(tracer): Initialise the backend for a CodeTracer.
+        start(code): Define the recording hooks in the globals the code runs with.
+        stop(): Nothing to undo; the hooks are left in the finished trace's context.
+
+    Attributes:
+        name: The name of the backend.
+        instrumented: Whether the backend runs the instrumented code rather than the plain compiled code.
+        reduced: Whether the code is compiled with reduced instrumentation.
+        tracer: The CodeTracer receiving the steps.
+    """
+
+    name = "reduced"
+    reduced = True
+
+    def start(self, code: types.CodeType):
+        """
+        Define the recording hooks called by the code with reduced instrumentation in the tracer's context.
+
+        :param self: The instance of the class.
+        :param code: The instrumented code that is about to be executed.
+        :type code: types.CodeType
+        :return: None
+        """
+        self.tracer.context.update({
+            instrument.RECORD_HOOK: self.tracer._on_record,
+            instrument.CHECK_HOOK: self.tracer._on_check,
+            instrument.RESULT_HOOK: self.tracer._on_result,
+            instrument.ITERATE_HOOK: self.tracer._on_iterate,
+            instrument.ENTER_HOOK: self.tracer._on_enter,
+            instrument.EXIT_HOOK: self.tracer._on_exit,
+        })
+
+
+BACKENDS = {
+    SettraceBackend.name: SettraceBackend,
+    MonitoringBackend.name: MonitoringBackend,
+    InstrumentBackend.name: InstrumentBackend,
+    ReducedBackend.name: ReducedBackend,
+}
+
+
+def iter_code_objects(code: types.CodeType) -> typing.Iterator[types.CodeType]:
+    """
+    Yield the code objects nested in a compiled code object (functions, classes, comprehensions, ...).
+
+    The module-level code object itself is not yielded, because `<module>` frames are never traced.
+
+    :param code: The compiled code to walk.
+    :type code: types.CodeType
+    :return: An iterator over the nested code objects.
+    :rtype: typing.Iterator[types.CodeType]
+    """
+    stack = [const for const in code.co_consts if isinstance(const, types.CodeType)]
+    while stack:
+        code_object = stack.pop()
+        yield code_object
+        stack.extend(const for const in code_object.co_consts if isinstance(const, types.CodeType))
+
+
+def get_backend(name: str, tracer):
+    """
+    Create the backend with the given name for a CodeTracer.
+
+    :param name: "settrace", "monitoring", "instrument", "reduced", or "auto" to use sys.monitoring when the
+                 interpreter supports it and fall back to sys.settrace otherwise.
+    :type name: str
+    :param tracer: The CodeTracer receiving the events.
+    :type tracer: CodeTracer
+    :return: A new backend instance.
+    :raises ValueError: If the backend name is unknown, or "monitoring" is requested on an interpreter without
+                        sys.monitoring.
+    """
+    if name == "auto":
+        name = MonitoringBackend.name if MonitoringBackend.is_available() else SettraceBackend.name
+
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown tracing backend: {name!r}")
+    if name == MonitoringBackend.name and not MonitoringBackend.is_available():
+        raise ValueError("The 'monitoring' backend requires Python 3.12 or newer")
+
+    return BACKENDS[name](tracer)
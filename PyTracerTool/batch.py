@@ -0,0 +1,303 @@
+"""
+Batch tracing for PyTracerTool
+
+A CodeTracer replaces the process-wide sys.stdin, sys.stdout and trace function while it runs, so two traces cannot
+safely run in threads of the same process. TracingPool runs each trace in its own worker process instead. The
+workers are started (and PyTracerTool imported in them) once, when the pool is created, and each worker traces one
+submission at a time. A submission that runs for longer than the timeout has its worker killed and replaced, so it
+never blocks the rest of the queue.
+
+A worker runs many submissions, so after each one it restores the process-wide state a submission may change
+(builtins, imported modules, sys.path, the recursion limit and the working directory, see worker.ProcessState),
+and the next submission starts from the same state as the first. Changes a submission makes to modules that were
+already imported are not undone; set `max_tasks_per_worker=1` to trace every submission in a fresh process.
+
+Classes:
+    - BatchResult: The outcome of tracing one submission.
+    - TracingPool: A pool of pre-started worker processes tracing submissions in parallel.
+
+Functions:
+    - trace_many(submissions, workers, timeout): Trace many submissions in parallel, yielding results as they complete.
+
+Usage:
+    ```python
+    from PyTracerTool.batch import trace_many
+
+    submissions = [("x = 1\nprint(x)", ""), ("name = input()", "Ada\n")]
+    for result in trace_many(submissions, workers=4, timeout=10):
+        print(result.index, result.error or len(result.trace_table))
+    ```
+"""
+
+import multiprocessing
+import multiprocessing.connection
+import os
+import time
+import typing
+
+from .pytracertool import CodeTracer
+from .worker import ProcessState, warm_up
+
+
+class BatchResult(typing.NamedTuple):
+    """
+    BatchResult is the outcome of tracing one submission.
+
+    Attributes:
+        index: The position of the submission in the submitted sequence.
+        trace_table: The trace table, as a list of rows with the header first, or None if tracing failed.
+        error: A description of the exception raised while tracing, or None if tracing succeeded.
+        timed_out: Whether the submission was stopped because it ran for longer than the timeout.
+        elapsed: The time spent tracing the submission, in seconds.
+    """
+
+    index: int
+    trace_table: typing.Optional[list]
+    error: typing.Optional[str]
+    timed_out: bool
+    elapsed: float
+
+
+def _worker_main(connection: multiprocessing.connection.Connection, tracer_options: dict):
+    """
+    Run in a worker process: trace each submission received on the connection and send back its BatchResult.
+
+    :param connection: The worker's end of the pipe to the pool.
+    :type connection: multiprocessing.connection.Connection
+    :param tracer_options: Keyword arguments passed to every CodeTracer.
+    :type tracer_options: dict
+    :return: None
+    """
+    warm_up(tracer_options)
+    state = ProcessState()
+    while True:
+        try:
+            task = connection.recv()
+        except (EOFError, KeyboardInterrupt):
+            return
+        if task is None:
+            return
+
+        index, python_code, user_input = task
+        start = time.perf_counter()
+        try:
+            tracer = CodeTracer(python_code, user_input, **tracer_options)
+            tracer.generate_trace_table()
+            result = BatchResult(
+                index, [list(row) for row in tracer.trace_table], None, False, time.perf_counter() - start
+            )
+        except KeyboardInterrupt:
+            return
+        except BaseException as error:
+            result = BatchResult(index, None, f"{type(error).__name__}: {error}", False, time.perf_counter() - start)
+        # Restored before the result is sent, so a submission that replaced a builtin cannot corrupt its own result.
+        state.restore()
+        connection.send(result)
+
+
+class _Worker(object):
+    """
+    A worker process of a TracingPool, with the pipe used to talk to it and the task it is running.
+    """
+
+    def __init__(self, context, tracer_options: dict):
+        self.connection, child_connection = context.Pipe()
+        self.process = context.Process(
+            target=_worker_main, args=(child_connection, tracer_options), name="pytracertool-worker", daemon=True
+        )
+        self.process.start()
+        child_connection.close()
+        self.task_index = None
+        self.started = 0.0
+        self.tasks_done = 0
+
+    def assign(self, index: int, python_code: str, user_input: str):
+        self.connection.send((index, python_code, user_input))
+        self.task_index = index
+        self.started = time.perf_counter()
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.connection.close()
+
+    def stop(self):
+        try:
+            self.connection.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(1)
+        if self.process.is_alive():
+            self.kill()
+        else:
+            self.connection.close()
+
+
+class TracingPool(object):
+    """
+    TracingPool traces submissions in parallel, in a pool of pre-started worker processes.
+
+    Each worker process traces one submission at a time, so the process-wide state a CodeTracer replaces while it
+    runs is never shared between two traces. Results are yielded as soon as each trace completes, in completion
+    order. A submission running for longer than `timeout` seconds has its worker killed and replaced, and produces a
+    result with `timed_out` set; a worker that dies (for example because the submission called os._exit) is
+    replaced too.
+
+    Methods:
+        __init__(workers, timeout, max_tasks_per_worker, **tracer_options): Start the worker processes.
+        map_unordered(submissions): Trace submissions, yielding a BatchResult as each one completes.
+        close(): Stop the worker processes.
+
+    Attributes:
+        workers: The number of worker processes.
+        timeout: The maximum time, in seconds, a single submission may run for, or None for no limit.
+        max_tasks_per_worker: The number of submissions after which a worker is replaced by a fresh process, or None
+                              to keep workers for the lifetime of the pool.
+        tracer_options: Keyword arguments passed to every CodeTracer.
+    """
+
+    def __init__(
+        self,
+        workers: typing.Optional[int] = None,
+        timeout: typing.Optional[float] = None,
+        max_tasks_per_worker: typing.Optional[int] = None,
+        **tracer_options,
+    ):
+        """
+        Initialise a new instance of TracingPool, starting its worker processes.
+
+        :param self: The instance of the class.
+        :param workers: The number of worker processes; defaults to the number of CPUs.
+        :type workers: typing.Optional[int]
+        :param timeout: The maximum time, in seconds, a single submission may run for.
+        :type timeout: typing.Optional[float]
+        :param max_tasks_per_worker: The number of submissions after which a worker is replaced by a fresh process.
+        :type max_tasks_per_worker: typing.Optional[int]
+        :param tracer_options: Keyword arguments passed to every CodeTracer, such as backend or allow.
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.timeout = timeout
+        self.max_tasks_per_worker = max_tasks_per_worker
+        self.tracer_options = tracer_options
+        self._context = multiprocessing.get_context()
+        self._workers = [_Worker(self._context, tracer_options) for _ in range(self.workers)]
+
+    def __enter__(self) -> "TracingPool":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def map_unordered(self, submissions: typing.Iterable[typing.Tuple[str, str]]) -> typing.Iterator[BatchResult]:
+        """
+        Trace submissions in the worker processes, yielding a BatchResult as each one completes.
+
+        Submissions are only read from the iterable when a worker is free to trace them.
+
+        :param self: The instance of the class.
+        :param submissions: (python_code, user_input) pairs to trace.
+        :type submissions: typing.Iterable[typing.Tuple[str, str]]
+        :return: An iterator of BatchResult, in completion order.
+        :rtype: typing.Iterator[BatchResult]
+        """
+        tasks = enumerate(submissions)
+        idle = list(self._workers)
+        busy = {}
+
+        while True:
+            while idle:
+                task = next(tasks, None)
+                if task is None:
+                    break
+                index, (python_code, user_input) = task
+                worker = idle.pop()
+                worker.assign(index, python_code, user_input)
+                busy[worker.connection] = worker
+
+            if not busy:
+                return
+
+            wait_for = None
+            if self.timeout is not None:
+                oldest = min(worker.started for worker in busy.values())
+                wait_for = max(0.0, oldest + self.timeout - time.perf_counter())
+
+            for connection in multiprocessing.connection.wait(list(busy), wait_for):
+                worker = busy.pop(connection)
+                try:
+                    result = connection.recv()
+                except Exception as error:
+                    # A submission can leave its worker unable to send a readable result (by patching a module
+                    # the worker uses), so any failure to read is reported as that submission's error.
+                    if isinstance(error, (EOFError, OSError)):
+                        message = "Worker process exited while tracing"
+                    else:
+                        message = f"Worker sent an unreadable result: {type(error).__name__}: {error}"
+                    result = BatchResult(
+                        worker.task_index, None, message, False, time.perf_counter() - worker.started
+                    )
+                    worker = self._replace(worker, kill=True)
+                else:
+                    worker.tasks_done += 1
+                    if self.max_tasks_per_worker and worker.tasks_done >= self.max_tasks_per_worker:
+                        worker = self._replace(worker)
+                worker.task_index = None
+                idle.append(worker)
+                yield result
+
+            if self.timeout is not None:
+                now = time.perf_counter()
+                for connection, worker in list(busy.items()):
+                    if now - worker.started >= self.timeout:
+                        del busy[connection]
+                        result = BatchResult(
+                            worker.task_index, None, f"Timed out after {self.timeout} seconds", True,
+                            now - worker.started,
+                        )
+                        idle.append(self._replace(worker, kill=True))
+                        yield result
+
+    def close(self):
+        """
+        Stop the worker processes.
+
+        :param self: The instance of the class.
+        :return: None
+        """
+        for worker in self._workers:
+            worker.stop()
+        self._workers = []
+
+    def _replace(self, worker: _Worker, kill: bool = False) -> _Worker:
+        if kill:
+            worker.kill()
+        else:
+            worker.stop()
+        replacement = _Worker(self._context, self.tracer_options)
+        self._workers[self._workers.index(worker)] = replacement
+        return replacement
+
+
+def trace_many(
+    submissions: typing.Iterable[typing.Tuple[str, str]],
+    workers: typing.Optional[int] = None,
+    timeout: typing.Optional[float] = None,
+    **tracer_options,
+) -> typing.Iterator[BatchResult]:
+    """
+    Trace many submissions in parallel worker processes, yielding each result as soon as it completes.
+
+    :param submissions: (python_code, user_input) pairs to trace.
+    :type submissions: typing.Iterable[typing.Tuple[str, str]]
+    :param workers: The number of worker processes; defaults to the number of CPUs.
+    :type workers: typing.Optional[int]
+    :param timeout: The maximum time, in seconds, a single submission may run for.
+    :type timeout: typing.Optional[float]
+    :param tracer_options: Keyword arguments passed to every CodeTracer, such as backend or allow.
+    :return: An iterator of BatchResult, in completion order; use BatchResult.index to match results to submissions.
+    :rtype: typing.Iterator[BatchResult]
+
+    :seealso: TracingPool
+    """
+    with TracingPool(workers, timeout, **tracer_options) as pool:
+        yield from pool.map_unordered(submissions)
@@ -0,0 +1,322 @@
+"""
+Trace result caching for PyTracerTool
+
+The same example programs are often traced over and over with the same input. Tracing a program always produces
+the same trace when the program is deterministic, so TraceCache keeps the finished traces, keyed by a hash of the
+source, the input and the tracer options that affect the result. Entries are kept in memory with least recently
+used eviction, and can also be written to a directory so that they survive restarts and are shared between
+processes (such as the workers of a TracingPool). Entries are stored pickled, in memory as on disk, so every lookup
+returns a trace of its own: a CodeTracer restored from the cache can change its trace without changing the cache or
+the other tracers restored from it.
+
+Only programs that is_deterministic accepts are cached: a program whose trace may differ from one run to the next,
+because it uses random numbers, the clock, the file system or object identities, is always traced afresh. A trace
+that still shows an object address once it has run is not stored either (see is_reproducible), since the address
+would be wrong in any other run.
+
+Classes:
+    - CachedTrace: The finished trace of a program, as stored in a TraceCache.
+    - TraceCache: A least recently used cache of finished traces, with an optional on-disk tier.
+
+Functions:
+    - cache_key(python_code, user_input, options): Hash a program, its input and the tracer options.
+    - is_deterministic(python_code): Check whether a program is expected to produce the same trace on every run.
+    - is_reproducible(trace): Check that a finished trace shows no object address.
+
+The modules needed to hash keys and to store traces (hashlib, pickle, tempfile) are imported on first use, so
+importing PyTracerTool does not pay for them when no cache is used.
+
+Usage:
+    ```python
+    from PyTracerTool import CodeTracer
+    from PyTracerTool.cache import TraceCache
+
+    cache = TraceCache(max_entries=1024, directory="/var/cache/pytracertool")
+    tracer = CodeTracer(example_code, "", cache=cache)
+    tracer.generate_trace_table()  # served from the cache when this program and input were traced before
+    ```
+"""
+
+import ast
+import collections
+import os
+import re
+import sys
+import typing
+
+
+CACHE_VERSION = 6
+
+NONDETERMINISTIC_MODULES = frozenset({
+    "asyncio", "datetime", "http", "multiprocessing", "os", "pathlib", "random", "secrets", "shutil", "socket",
+    "subprocess", "tempfile", "threading", "time", "urllib", "uuid",
+})
+
+NONDETERMINISTIC_BUILTINS = frozenset({"__import__", "eval", "exec", "hash", "id", "open"})
+
+_ADDRESS = re.compile(r" at 0x[0-9a-fA-F]+")
+
+
+class CachedTrace(typing.NamedTuple):
+    """
+    CachedTrace is the finished trace of a program, as stored in a TraceCache.
+
+    Attributes:
+        tracer_info: The StepLog of the trace.
+        step_outputs: The captured print outputs, by step index.
+        call_tree: The CallTree of the traced frames.
+        truncated: A description of the limit that stopped the trace, or None.
+        trace_table: The rows of the trace table, with the header first.
+    """
+
+    tracer_info: typing.Any
+    step_outputs: dict
+    call_tree: typing.Any
+    truncated: typing.Optional[str]
+    trace_table: list
+
+
+def cache_key(python_code: str, user_input: str, options: typing.Optional[dict] = None) -> str:
+    """
+    Hash a program, its input and the tracer options that affect its trace.
+
+    The Python version is part of the key, because the line events reported for the same source can differ between
+    versions, and so is the hash seed when it is fixed (see is_deterministic), because it decides the order of sets.
+
+    :param python_code: The source of the program.
+    :type python_code: str
+    :param user_input: The text given to the program on stdin.
+    :type user_input: str
+    :param options: The tracer options that affect the trace; their values must have a stable repr.
+    :type options: typing.Optional[dict]
+    :return: A hexadecimal SHA-256 digest.
+    :rtype: str
+    """
+    import hashlib
+
+    digest = hashlib.sha256()
+    header = (CACHE_VERSION, sys.version_info[:2], _fixed_hash_seed(), sorted((options or {}).items()))
+    for part in (repr(header), python_code, user_input):
+        encoded = part.encode("utf-8", "surrogatepass")
+        digest.update(len(encoded).to_bytes(8, "little"))
+        digest.update(encoded)
+    return digest.hexdigest()
+
+
+def is_deterministic(python_code: str) -> bool:
+    """
+    Check whether a program is expected to produce the same trace every time it is run with the same input, in this
+    process or any other.
+
+    This is a heuristic based on the source alone. A program is considered nondeterministic when it cannot be parsed,
+    or when it:
+
+        - imports a module from NONDETERMINISTIC_MODULES (random, time, os, ...);
+        - uses a builtin from NONDETERMINISTIC_BUILTINS (id, hash, open, ...);
+        - defines a class without a __repr__ method, as its instances are shown with their address;
+        - uses sets (set, frozenset, set displays or comprehensions) while the hash of strings is randomised
+          (PYTHONHASHSEED is not set to a number), or while it defines classes, whose instances are hashed by
+          identity, as either makes the order of the sets differ between runs.
+
+    Other values can still show an address, such as generators or iterators; is_reproducible rejects the traces
+    that do once they have run.
+
+    :param python_code: The source of the program.
+    :type python_code: str
+    :return: True if the program's trace can be cached.
+    :rtype: bool
+    """
+    try:
+        tree = ast.parse(python_code)
+    except (SyntaxError, ValueError):
+        return False
+
+    uses_sets = defines_classes = False
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            modules = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom):
+            modules = [node.module or ""]
+        elif isinstance(node, ast.Name):
+            if node.id in NONDETERMINISTIC_BUILTINS:
+                return False
+            uses_sets = uses_sets or node.id in ("set", "frozenset")
+            continue
+        elif isinstance(node, (ast.Set, ast.SetComp)):
+            uses_sets = True
+            continue
+        elif isinstance(node, ast.ClassDef):
+            defines_classes = True
+            if not any(
+                isinstance(statement, (ast.FunctionDef, ast.AsyncFunctionDef)) and statement.name == "__repr__"
+                for statement in node.body
+            ):
+                return False
+            continue
+        else:
+            continue
+        if any(module.partition(".")[0] in NONDETERMINISTIC_MODULES for module in modules):
+            return False
+    return not uses_sets or (_fixed_hash_seed() is not None and not defines_classes)
+
+
+def is_reproducible(trace: CachedTrace) -> bool:
+    """
+    Check that a finished trace shows no object address, in its variables, its output or its returned values.
+
+    An address is only valid in the process that recorded it, so a trace showing one must not be served to another
+    run, even from a program that is_deterministic accepted.
+
+    :param trace: The finished trace.
+    :type trace: CachedTrace
+    :return: True if the trace holds no object address.
+    :rtype: bool
+    """
+    search = _ADDRESS.search
+    for _, _, _, _, changed, _ in trace.tracer_info.iter_entries():
+        if any(search(value) for value in changed.values()):
+            return False
+    if any(search(text) for text in trace.step_outputs.values()):
+        return False
+    return not any(
+        record.return_value is not None and search(record.return_value) for record in trace.call_tree.frames
+    )
+
+
+def _fixed_hash_seed() -> typing.Optional[str]:
+    # The seed of the hash of strings, or None when it is chosen at random for each process.
+    if not sys.flags.hash_randomization:
+        return "0"
+    seed = os.environ.get("PYTHONHASHSEED", "")
+    return seed if seed.isdigit() else None
+
+
+class TraceCache(object):
+    """
+    TraceCache is a least recently used cache of finished traces, with an optional on-disk tier.
+
+    At most `max_entries` traces are kept in memory, pickled; adding another evicts the least recently used one. When
+    `directory` is set, every stored trace is also pickled to a file in it, named after its key, and a trace missing
+    from memory is looked up there before being reported as a miss. Files are written to a temporary name and then
+    renamed, so several processes can share the directory. The directory is not size-limited, and its files are
+    unpickled when read, so it must only be writable by trusted users.
+
+    Methods:
+        __init__(max_entries, directory): Initialise an empty cache.
+        get(key): Get the trace stored under a key.
+        put(key, trace): Store a trace under a key.
+        clear(): Remove every trace from memory.
+
+    Attributes:
+        max_entries: The maximum number of traces kept in memory.
+        directory: The directory of the on-disk tier, or None for a memory-only cache.
+        hits: The number of lookups answered from memory or disk.
+        misses: The number of lookups that found nothing.
+    """
+
+    def __init__(self, max_entries: int = 256, directory: typing.Optional[str] = None):
+        """
+        Initialise a new, empty instance of TraceCache.
+
+        :param self: The instance of the class.
+        :param max_entries: The maximum number of traces kept in memory.
+        :type max_entries: int
+        :param directory: The directory of the on-disk tier, created if missing; None for a memory-only cache.
+        :type directory: typing.Optional[str]
+        """
+        self.max_entries = max_entries
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._entries or (self.directory is not None and os.path.exists(self._path(key)))
+
+    def get(self, key: str) -> typing.Optional[CachedTrace]:
+        """
+        Get the trace stored under a key, from memory or, failing that, from disk.
+
+        :param self: The instance of the class.
+        :param key: The key, as returned by cache_key.
+        :type key: str
+        :return: A new copy of the stored trace, or None if there is none.
+        :rtype: typing.Optional[CachedTrace]
+        """
+        import pickle
+
+        data = self._entries.get(key)
+        if data is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return pickle.loads(data)
+
+        if self.directory is not None:
+            try:
+                with open(self._path(key), "rb") as file:
+                    data = file.read()
+                trace = pickle.loads(data)
+            except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+                trace = None
+            if isinstance(trace, CachedTrace):
+                self._remember(key, data)
+                self.hits += 1
+                return trace
+
+        self.misses += 1
+        return None
+
+    def put(self, key: str, trace: CachedTrace):
+        """
+        Store a copy of a trace under a key, in memory and, when the cache has a directory, on disk.
+
+        :param self: The instance of the class.
+        :param key: The key, as returned by cache_key.
+        :type key: str
+        :param trace: The trace to store; later changes to its objects do not change the stored copy.
+        :type trace: CachedTrace
+        :return: None
+        """
+        import pickle
+
+        data = pickle.dumps(trace, pickle.HIGHEST_PROTOCOL)
+        self._remember(key, data)
+        if self.directory is None:
+            return
+
+        import tempfile
+
+        descriptor, temporary_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(descriptor, "wb") as file:
+                file.write(data)
+            os.replace(temporary_path, self._path(key))
+        except BaseException:
+            try:
+                os.remove(temporary_path)
+            except OSError:
+                pass
+            raise
+
+    def clear(self):
+        """
+        Remove every trace from memory; the files of the on-disk tier are kept.
+
+        :param self: The instance of the class.
+        :return: None
+        """
+        self._entries.clear()
+
+    def _remember(self, key: str, data: bytes):
+        self._entries[key] = data
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + ".pickle")
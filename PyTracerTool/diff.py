@@ -0,0 +1,341 @@
+"""
+Trace diffing for PyTracerTool
+
+Comparing two traces, such as a student's submission and a model solution, by rendering both tables as text and
+diffing the text is slow and breaks on differences in column layout. This module compares the steps themselves:
+
+    - TraceIndex reduces every step of a trace to an integer key, a hash of its line number and the full state of
+      its frame. The state hash is the sum of the hashes of the frame's (variable, value) pairs, so it is updated
+      from the per-frame deltas of the StepLog rather than recomputed from the full state of every step.
+    - diff_traces aligns the keys of two traces with the linear-space variant of Myers' diff algorithm, after
+      trimming their common prefix and suffix, so similar traces are aligned in close to linear time.
+    - The resulting TraceDiff reports the first divergent step, the variables that differ there, and the aligned
+      steps whose output differs.
+
+A TraceIndex only depends on its own trace, so when many traces are compared against the same reference, the
+reference is indexed once and the index is reused for every comparison:
+
+    reference = TraceIndex(model_tracer)
+    for submission in submissions:
+        result = diff_traces(reference, submission)
+
+Step keys are built with Python's hash(), which is salted per process for strings, so indexes built in different
+processes cannot be compared with each other.
+
+Classes:
+    - TraceIndex: The step keys of a trace, with access to the state and output of each step.
+    - TraceDiff: The alignment of two traces, with their first divergence and output mismatches.
+
+Functions:
+    - diff_traces(reference, candidate): Align two traces and report how they differ.
+"""
+
+import array
+import typing
+
+
+_HASH_MASK = (1 << 64) - 1
+
+
+def _state_hash(state: dict) -> int:
+    return sum(map(hash, state.items())) & _HASH_MASK
+
+
+class TraceIndex(object):
+    """
+    TraceIndex holds a key for every step of a trace, for aligning it with other traces.
+
+    The key of a step is a hash of its line number and of the full variable state of its frame after the step. The
+    output of a step is not part of its key, so steps that only differ by their output are aligned, and reported as
+    output mismatches.
+
+    Methods:
+        __init__(trace): Index a traced CodeTracer or a TraceFile.
+        state_at(index): Get the full variable state at a step.
+        output_at(index): Get the output printed by a step.
+
+    Attributes:
+        keys: An array with the key of every step.
+        lines: An array with the line number of every step.
+        trace: The CodeTracer or TraceFile indexed.
+    """
+
+    def __init__(self, trace):
+        """
+        Index the steps of a trace.
+
+        :param self: The instance of the class.
+        :param trace: A CodeTracer whose code has been traced, or a TraceFile.
+        :type trace: typing.Union[CodeTracer, TraceFile]
+        """
+        self.trace = trace
+        self.keys = array.array("q")
+        self.lines = array.array("l")
+
+        step_log = getattr(trace, "tracer_info", None)
+        if step_log is not None:
+            self._index_step_log(step_log)
+        else:
+            for index in range(len(trace)):
+                line = trace.line_at(index)
+                self._add(line, _state_hash(trace.state_at(index)))
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def state_at(self, index: int) -> dict:
+        """
+        Get the full variable state at a step.
+
+        :param self: The instance of the class.
+        :param index: The index of the step.
+        :type index: int
+        :return: The variables of the step's frame after the step, mapped to their rendered values.
+        :rtype: dict
+        """
+        if hasattr(self.trace, "tracer_info"):
+            return self.trace.tracer_info.state_at(index)
+        return self.trace.state_at(index)
+
+    def output_at(self, index: int) -> str:
+        """
+        Get the output printed by a step.
+
+        :param self: The instance of the class.
+        :param index: The index of the step.
+        :type index: int
+        :return: The output of the step, or an empty string.
+        :rtype: str
+        """
+        if hasattr(self.trace, "step_outputs"):
+            return self.trace.step_outputs.get(index, "")
+        return self.trace.output_at(index)
+
+    def _index_step_log(self, step_log):
+        # The state hash of each frame is kept up to date from the deltas, without rebuilding the full states.
+        states = {}
+        hashes = {}
+        for line, frame_id, _, keyframe, changed, removed in step_log.iter_entries():
+            if keyframe:
+                state = states[frame_id] = dict(changed)
+                state_hash = _state_hash(state)
+            else:
+                state = states[frame_id]
+                state_hash = hashes[frame_id]
+                for name, value in changed.items():
+                    if name in state:
+                        state_hash -= hash((name, state[name]))
+                    state_hash += hash((name, value))
+                    state[name] = value
+                for name in removed:
+                    state_hash -= hash((name, state.pop(name)))
+                state_hash &= _HASH_MASK
+            hashes[frame_id] = state_hash
+            self._add(line, state_hash)
+
+    def _add(self, line: int, state_hash: int):
+        self.lines.append(line)
+        self.keys.append(hash((line, state_hash)))
+
+
+class TraceDiff(typing.NamedTuple):
+    """
+    The alignment of two traces, as computed by diff_traces.
+
+    Attributes:
+        opcodes: The alignment as a list of (tag, i1, i2, j1, j2) tuples, as returned by
+                 difflib.SequenceMatcher.get_opcodes: steps reference[i1:i2] are "equal" to candidate[j1:j2], or
+                 are replaced by them ("replace"), or are deleted ("delete"), or candidate[j1:j2] are inserted
+                 ("insert").
+        first_divergence: The (reference step, candidate step) indices at the start of the first difference, or
+                          None if the steps of the traces are identical. An index equals the length of its trace
+                          when the other trace has extra steps at the end.
+        differing_variables: The variables whose values differ between the steps of the first divergence, mapped to
+                             their (reference value, candidate value); None stands for a missing variable.
+        output_mismatches: A (reference step, candidate step, reference output, candidate output) tuple for each pair
+                           of aligned steps that printed different output.
+        output_equal: Whether the traces printed the same output overall.
+        similarity: The proportion of steps aligned, from 0.0 (nothing in common) to 1.0 (identical steps).
+    """
+
+    opcodes: list
+    first_divergence: typing.Optional[typing.Tuple[int, int]]
+    differing_variables: dict
+    output_mismatches: list
+    output_equal: bool
+    similarity: float
+
+    @property
+    def identical(self) -> bool:
+        return self.first_divergence is None and not self.output_mismatches and self.output_equal
+
+
+def diff_traces(reference, candidate) -> TraceDiff:
+    """
+    Align the steps of two traces and report how the candidate differs from the reference.
+
+    :param reference: The reference trace: a TraceIndex, a traced CodeTracer or a TraceFile. Pass a TraceIndex to
+                      reuse it across many comparisons.
+    :type reference: typing.Union[TraceIndex, CodeTracer, TraceFile]
+    :param candidate: The trace compared with the reference, of the same kinds.
+    :type candidate: typing.Union[TraceIndex, CodeTracer, TraceFile]
+    :return: The alignment of the traces and their differences.
+    :rtype: TraceDiff
+
+    :Example:
+        ```python
+        reference = TraceIndex(model_tracer)
+        result = diff_traces(reference, student_tracer)
+        if result.first_divergence is not None:
+            step, _ = result.first_divergence
+            print("Diverges at step", step, result.differing_variables)
+        ```
+    """
+    if not isinstance(reference, TraceIndex):
+        reference = TraceIndex(reference)
+    if not isinstance(candidate, TraceIndex):
+        candidate = TraceIndex(candidate)
+
+    matches = _match_keys(reference.keys, candidate.keys)
+    opcodes = _opcodes(matches, len(reference), len(candidate))
+
+    first_divergence = None
+    differing_variables = {}
+    for tag, i1, _, j1, _ in opcodes:
+        if tag != "equal":
+            first_divergence = (i1, j1)
+            reference_state = reference.state_at(i1) if i1 < len(reference) else {}
+            candidate_state = candidate.state_at(j1) if j1 < len(candidate) else {}
+            for name in sorted(reference_state.keys() | candidate_state.keys()):
+                reference_value = reference_state.get(name)
+                candidate_value = candidate_state.get(name)
+                if reference_value != candidate_value:
+                    differing_variables[name] = (reference_value, candidate_value)
+            break
+
+    output_mismatches = []
+    for i, j in matches:
+        reference_output = reference.output_at(i)
+        candidate_output = candidate.output_at(j)
+        if reference_output != candidate_output:
+            output_mismatches.append((i, j, reference_output, candidate_output))
+
+    output_equal = (
+        "".join(reference.output_at(i) for i in range(len(reference)))
+        == "".join(candidate.output_at(j) for j in range(len(candidate)))
+    )
+    total = len(reference) + len(candidate)
+    similarity = 2 * len(matches) / total if total else 1.0
+    return TraceDiff(opcodes, first_divergence, differing_variables, output_mismatches, output_equal, similarity)
+
+
+def _match_keys(a: typing.Sequence[int], b: typing.Sequence[int]) -> typing.List[typing.Tuple[int, int]]:
+    # Trim the common prefix and suffix, then align the rest with the linear-space Myers algorithm.
+    n, m = len(a), len(b)
+    prefix = 0
+    while prefix < n and prefix < m and a[prefix] == b[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < n - prefix and suffix < m - prefix and a[n - 1 - suffix] == b[m - 1 - suffix]:
+        suffix += 1
+
+    matches = [(i, i) for i in range(prefix)]
+    middle = []
+    # Ranges still to align, as (a start, a stop, b start, b stop); processed in order, left part first.
+    pending = [(prefix, n - suffix, prefix, m - suffix)]
+    while pending:
+        a_start, a_stop, b_start, b_stop = pending.pop()
+        if a_start == a_stop or b_start == b_stop:
+            continue
+        x, y, u, v, edits = _middle_snake(a, a_start, a_stop, b, b_start, b_stop)
+        if edits <= 1:
+            middle.extend(_match_one_edit(a, a_start, a_stop, b, b_start, b_stop))
+            continue
+        middle.extend((a_start + k, b_start + k - x + y) for k in range(x, u))
+        pending.append((a_start + u, a_stop, b_start + v, b_stop))
+        pending.append((a_start, a_start + x, b_start, b_start + y))
+
+    matches.extend(sorted(middle))
+    matches.extend((n - suffix + k, m - suffix + k) for k in range(suffix))
+    return matches
+
+
+def _middle_snake(
+    a: typing.Sequence[int], a_start: int, a_stop: int, b: typing.Sequence[int], b_start: int, b_stop: int,
+) -> typing.Tuple[int, int, int, int, int]:
+    # Find the middle snake of an optimal edit path, searching from both ends at once. Returns the snake as
+    # (x, y, u, v), relative to the starts of the ranges, and the number of edits of the whole path.
+    n, m = a_stop - a_start, b_stop - b_start
+    delta = n - m
+    odd = delta % 2 == 1
+    max_edits = (n + m + 1) // 2
+    offset = max_edits + 1
+    forward = [0] * (2 * offset + 1)
+    backward = [0] * (2 * offset + 1)
+
+    for d in range(max_edits + 1):
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and forward[offset + k - 1] < forward[offset + k + 1]):
+                x = forward[offset + k + 1]
+            else:
+                x = forward[offset + k - 1] + 1
+            y = x - k
+            start_x, start_y = x, y
+            while x < n and y < m and a[a_start + x] == b[b_start + y]:
+                x += 1
+                y += 1
+            forward[offset + k] = x
+            if odd and delta - (d - 1) <= k <= delta + (d - 1) and x + backward[offset + delta - k] >= n:
+                return start_x, start_y, x, y, 2 * d - 1
+
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and backward[offset + k - 1] < backward[offset + k + 1]):
+                x = backward[offset + k + 1]
+            else:
+                x = backward[offset + k - 1] + 1
+            y = x - k
+            start_x, start_y = x, y
+            while x < n and y < m and a[a_stop - 1 - x] == b[b_stop - 1 - y]:
+                x += 1
+                y += 1
+            backward[offset + k] = x
+            if not odd and -d <= delta - k <= d and x + forward[offset + delta - k] >= n:
+                return n - x, m - y, n - start_x, m - start_y, 2 * d
+
+    raise AssertionError("no middle snake found")
+
+
+def _match_one_edit(
+    a: typing.Sequence[int], a_start: int, a_stop: int, b: typing.Sequence[int], b_start: int, b_stop: int,
+) -> typing.Iterator[typing.Tuple[int, int]]:
+    # The ranges differ by at most one insertion or deletion, so matching greedily is optimal.
+    i, j = a_start, b_start
+    while i < a_stop and j < b_stop:
+        if a[i] == b[j]:
+            yield i, j
+            i += 1
+            j += 1
+        elif a_stop - a_start > b_stop - b_start:
+            i += 1
+        else:
+            j += 1
+
+
+def _opcodes(matches: typing.List[typing.Tuple[int, int]], n: int, m: int) -> list:
+    opcodes = []
+    i = j = 0
+    for match_i, match_j in matches + [(n, m)]:
+        if i < match_i and j < match_j:
+            opcodes.append(("replace", i, match_i, j, match_j))
+        elif i < match_i:
+            opcodes.append(("delete", i, match_i, j, j))
+        elif j < match_j:
+            opcodes.append(("insert", i, i, j, match_j))
+        if match_i < n or match_j < m:
+            if opcodes and opcodes[-1][0] == "equal" and opcodes[-1][2] == match_i:
+                tag, i1, _, j1, _ = opcodes[-1]
+                opcodes[-1] = (tag, i1, match_i + 1, j1, match_j + 1)
+            else:
+                opcodes.append(("equal", match_i, match_i + 1, match_j, match_j + 1))
+        i, j = match_i + 1, match_j + 1
+    return opcodes
@@ -0,0 +1,196 @@
+"""
+Trace table display for PyTracerTool
+
+A trace table can have many thousands of rows, while a viewer shows a page of them at a time. TableRenderer
+renders a window of the rows (and, for wide tables, of the columns) of a trace table, so the cost of showing a
+page depends on the size of the page rather than on the size of the table. Three formats are supported:
+
+    - "text": a tabulate grid, as printed by `str(tracer)`.
+    - "html": an HTML <table>. Values are HTML-escaped here, when the page is rendered, and the line breaks of
+      multi-line values (such as the attribute grids of objects) become <br>.
+    - "json": a JSON object holding the header, the rows and the position of the window in the table.
+
+The values stored in the trace table are the plain rendered strings; no format-specific escaping is applied to
+them while tracing.
+
+Classes:
+    - TableRenderer: Renders windows and pages of a trace table in text, HTML or JSON.
+"""
+
+import html
+import json
+import math
+import typing
+
+
+FORMATS = ("text", "html", "json")
+
+COLUMNS_TYPE = typing.Optional[typing.Union[slice, typing.Iterable[typing.Union[str, int]]]]
+
+
+class TableRenderer(object):
+    """
+    TableRenderer renders windows and pages of a trace table in text, HTML or JSON.
+
+    The table is either a list of rows with the header first, or an object with a `header` attribute and a
+    `rows(start, stop)` method, such as a TraceTable or a TraceFile. Only the rows of the requested window are read
+    from it.
+
+    Methods:
+        __init__(table, page_size): Initialise a renderer for a table.
+        window(start, stop, columns): Get the header and rows of a window of the table.
+        render(start, stop, columns, format): Render a window of the table.
+        page(number, columns, format): Render a page of the table.
+
+    Attributes:
+        table: The table being rendered.
+        page_size: The number of rows on a page.
+        header: The header row of the table.
+        row_count: The number of rows in the table, not counting the header.
+        page_count: The number of pages in the table.
+    """
+
+    def __init__(self, table: typing.Any, page_size: int = 50):
+        """
+        Initialise a new instance of TableRenderer.
+
+        :param self: The instance of the class.
+        :param table: A list of rows with the header first, or an object with `header` and `rows(start, stop)`.
+        :type table: typing.Any
+        :param page_size: The number of rows on a page.
+        :type page_size: int
+        """
+        if page_size < 1:
+            raise ValueError("page_size must be at least 1")
+
+        self.table = table
+        self.page_size = page_size
+        if hasattr(table, "header"):
+            self.header = list(table.header)
+            self.row_count = table.row_count if hasattr(table, "row_count") else len(table)
+        else:
+            self.header = list(table[0]) if table else []
+            self.row_count = max(len(table) - 1, 0)
+
+    @property
+    def page_count(self) -> int:
+        return max(math.ceil(self.row_count / self.page_size), 1)
+
+    def window(
+        self, start: int = 0, stop: typing.Optional[int] = None, columns: COLUMNS_TYPE = None
+    ) -> typing.Tuple[list, list]:
+        """
+        Get the header and rows of a window of the table.
+
+        :param self: The instance of the class.
+        :param start: The index of the first row, not counting the header.
+        :type start: int
+        :param stop: The index after the last row; None for the end of the table.
+        :type stop: typing.Optional[int]
+        :param columns: The columns to include: a slice of column positions, or column names and positions, in the
+                        order they should appear; None for every column.
+        :type columns: typing.Union[slice, typing.Iterable[typing.Union[str, int]], None]
+        :return: The header and the rows of the window.
+        :rtype: typing.Tuple[list, list]
+        :raises KeyError: If a column name is not in the header.
+        """
+        start, stop, _ = slice(start, stop).indices(self.row_count)
+        stop = max(start, stop)
+        if hasattr(self.table, "rows"):
+            rows = self.table.rows(start, stop)
+        else:
+            rows = self.table[start + 1:stop + 1]
+
+        if columns is None:
+            return list(self.header), [list(row) for row in rows]
+
+        if isinstance(columns, slice):
+            positions = list(range(len(self.header)))[columns]
+        else:
+            names = {name: position for position, name in enumerate(self.header)}
+            positions = [column if isinstance(column, int) else names[column] for column in columns]
+        header = [self.header[position] for position in positions]
+        return header, [[row[position] for position in positions] for row in rows]
+
+    def render(
+        self,
+        start: int = 0,
+        stop: typing.Optional[int] = None,
+        columns: COLUMNS_TYPE = None,
+        format: str = "text",
+    ) -> str:
+        """
+        Render a window of the table.
+
+        :param self: The instance of the class.
+        :param start: The index of the first row, not counting the header.
+        :type start: int
+        :param stop: The index after the last row; None for the end of the table.
+        :type stop: typing.Optional[int]
+        :param columns: The columns to include, as for window; None for every column.
+        :type columns: typing.Union[slice, typing.Iterable[typing.Union[str, int]], None]
+        :param format: "text", "html" or "json".
+        :type format: str
+        :return: The rendered window.
+        :rtype: str
+        :raises ValueError: If the format is unknown.
+        """
+        if format not in FORMATS:
+            raise ValueError(f"Unknown format: {format!r}, expected one of {', '.join(FORMATS)}")
+
+        header, rows = self.window(start, stop, columns)
+        if format == "text":
+            # Imported here rather than with the module: tabulate takes longer to import than the rest of the
+            # package, and is not needed to trace code, only to print the table.
+            import tabulate
+
+            return tabulate.tabulate(rows, headers=header, tablefmt="grid")
+        if format == "html":
+            return self._render_html(header, rows)
+
+        start, stop, _ = slice(start, stop).indices(self.row_count)
+        return json.dumps({
+            "header": header,
+            "rows": rows,
+            "start": start,
+            "stop": start + len(rows),
+            "row_count": self.row_count,
+        })
+
+    def page(self, number: int, columns: COLUMNS_TYPE = None, format: str = "text") -> str:
+        """
+        Render a page of the table.
+
+        :param self: The instance of the class.
+        :param number: The page number, starting at 1.
+        :type number: int
+        :param columns: The columns to include, as for window; None for every column.
+        :type columns: typing.Union[slice, typing.Iterable[typing.Union[str, int]], None]
+        :param format: "text", "html" or "json".
+        :type format: str
+        :return: The rendered page.
+        :rtype: str
+        :raises IndexError: If the page number is out of range.
+        """
+        if not 1 <= number <= self.page_count:
+            raise IndexError("page number out of range")
+        start = (number - 1) * self.page_size
+        return self.render(start, start + self.page_size, columns, format)
+
+    @staticmethod
+    def _render_html(header: list, rows: list) -> str:
+        parts = ["<table>", "<thead><tr>"]
+        parts.extend(f"<th>{_html_cell(cell)}</th>" for cell in header)
+        parts.append("</tr></thead>")
+        parts.append("<tbody>")
+        for row in rows:
+            parts.append("<tr>")
+            parts.extend(f"<td>{_html_cell(cell)}</td>" for cell in row)
+            parts.append("</tr>")
+        parts.append("</tbody>")
+        parts.append("</table>")
+        return "".join(parts)
+
+
+def _html_cell(value: typing.Any) -> str:
+    return html.escape(str(value)).replace("\n", "<br>")
@@ -0,0 +1,117 @@
+"""
+Frame filtering for PyTracerTool
+
+Tracing a frame is expensive: every line of it generates an event, and every step takes a snapshot of its
+variables. FrameFilter decides which frames are worth tracing. By default only the code compiled from the submitted
+source is traced, so the standard library and third-party modules the user's code calls into (sorted, json, random,
+...) run without line events. Extra modules or files can be allowed, and any module or file can be denied, by name
+pattern.
+
+Classes:
+    - FrameFilter: Decides, per code object, whether a frame should be traced.
+"""
+
+import fnmatch
+import os
+import types
+import typing
+
+
+PACKAGE_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+
+
+class FrameFilter(object):
+    """
+    FrameFilter decides whether a frame should be traced.
+
+    A frame is traced when its code was compiled from the submitted source, or when its module name or filename
+    matches one of the `allow` patterns, and neither its module name nor its filename matches one of the `deny`
+    patterns. The frames of PyTracerTool itself are never traced. Patterns use shell-style wildcards, as
+    understood by `fnmatch`, for example "random", "mypackage.*" or "*/helpers.py".
+
+    Decisions are cached per code object, so the patterns are only matched once for each function.
+
+    Methods:
+        __init__(source_filename, allow, deny): Initialise a FrameFilter.
+        accepts(frame): Check whether a frame should be traced.
+        accepts_code(code, module_name): Check whether the frames of a code object should be traced.
+
+    Attributes:
+        source_filename: The filename the submitted source was compiled with.
+        allow: Module name or filename patterns traced in addition to the submitted source.
+        deny: Module name or filename patterns that are never traced.
+    """
+
+    def __init__(
+        self,
+        source_filename: str,
+        allow: typing.Optional[typing.Iterable[str]] = None,
+        deny: typing.Optional[typing.Iterable[str]] = None,
+    ):
+        """
+        Initialise a new instance of FrameFilter.
+
+        :param self: The instance of the class.
+        :param source_filename: The filename the submitted source was compiled with.
+        :type source_filename: str
+        :param allow: Module name or filename patterns traced in addition to the submitted source.
+        :type allow: typing.Optional[typing.Iterable[str]]
+        :param deny: Module name or filename patterns that are never traced.
+        :type deny: typing.Optional[typing.Iterable[str]]
+        """
+        self.source_filename = source_filename
+        self.allow = tuple(allow or ())
+        self.deny = tuple(deny or ())
+        self._decisions = {}
+
+    def accepts(self, frame: types.FrameType) -> bool:
+        """
+        Check whether a frame should be traced.
+
+        :param self: The instance of the class.
+        :param frame: The frame being entered.
+        :type frame: types.FrameType
+        :return: True if the frame should be traced.
+        :rtype: bool
+        """
+        decision = self._decisions.get(frame.f_code)
+        if decision is None:
+            decision = self.accepts_code(frame.f_code, frame.f_globals.get("__name__", ""))
+        return decision
+
+    def accepts_code(self, code: types.CodeType, module_name: str = "") -> bool:
+        """
+        Check whether the frames of a code object should be traced, caching the decision.
+
+        :param self: The instance of the class.
+        :param code: The code object being executed.
+        :type code: types.CodeType
+        :param module_name: The name of the module the code belongs to.
+        :type module_name: str
+        :return: True if frames executing the code should be traced.
+        :rtype: bool
+        """
+        decision = self._decisions.get(code)
+        if decision is not None:
+            return decision
+
+        filename = code.co_filename
+        if filename == self.source_filename:
+            decision = True
+        elif filename.startswith(PACKAGE_DIRECTORY + os.sep):
+            decision = False
+        else:
+            decision = self._matches(self.allow, module_name, filename)
+
+        if decision and self.deny:
+            decision = not self._matches(self.deny, module_name, filename)
+
+        self._decisions[code] = decision
+        return decision
+
+    @staticmethod
+    def _matches(patterns: typing.Tuple[str, ...], module_name: str, filename: str) -> bool:
+        return any(
+            fnmatch.fnmatchcase(module_name, pattern) or fnmatch.fnmatchcase(filename, pattern)
+            for pattern in patterns
+        )
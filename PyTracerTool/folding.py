@@ -0,0 +1,110 @@
+"""
+Loop folding for PyTracerTool
+
+A loop produces one step per executed line per iteration, so the trace of a tight loop grows with the number of
+iterations rather than with the size of the program. find_cycles detects runs of steps in which the same sequence
+of line numbers repeats, and describes each run as a FoldedBlock. CodeTracer.folded_trace_table uses the blocks to
+show only the first and last iterations of each loop, with a row counting the iterations in between, and
+CodeTracer.expand_block gives back the full rows of a block.
+
+Classes:
+    - FoldedBlock: A run of steps in which the same sequence of lines repeats.
+
+Functions:
+    - find_cycles(lines, min_repeats, max_period): Find the runs of repeated line sequences in a trace.
+"""
+
+import typing
+
+
+class FoldedBlock(typing.NamedTuple):
+    """
+    FoldedBlock describes a run of steps in which the same sequence of lines repeats.
+
+    Attributes:
+        start: The index of the first step of the run.
+        period: The number of steps in one iteration.
+        repeats: The number of iterations.
+        lines: The line numbers executed by one iteration.
+    """
+
+    start: int
+    period: int
+    repeats: int
+    lines: typing.Tuple[int, ...]
+
+    @property
+    def stop(self) -> int:
+        """
+        The index of the first step after the run.
+        """
+        return self.start + self.period * self.repeats
+
+    def iteration(self, number: int) -> range:
+        """
+        Get the step indices of one iteration of the run.
+
+        :param self: The instance of the class.
+        :param number: The iteration number, starting at 0; negative numbers count from the last iteration.
+        :type number: int
+        :return: The range of step indices of the iteration.
+        :rtype: range
+        """
+        if number < 0:
+            number += self.repeats
+        if not 0 <= number < self.repeats:
+            raise IndexError("iteration out of range")
+        first = self.start + number * self.period
+        return range(first, first + self.period)
+
+
+def find_cycles(lines: typing.Sequence[int], min_repeats: int = 3, max_period: int = 32) -> typing.List[FoldedBlock]:
+    """
+    Find the runs of steps in which the same sequence of line numbers repeats.
+
+    The trace is scanned from the start. At each step, the shortest sequence of at most `max_period` lines that
+    immediately repeats at least `min_repeats` times in a row is looked for, and if there is one, the whole run is
+    reported as one block and the scan continues after it. A shorter sequence that repeats fewer times does not
+    hide a longer one that repeats enough. Runs never overlap. The scan is linear in the number of steps inside
+    blocks; for a step outside them, it tries at most `max_period` sequences, most of which fail on their first
+    line.
+
+    :param lines: The line number of every step, such as CodeTracer.execution_order.
+    :type lines: typing.Sequence[int]
+    :param min_repeats: The minimum number of iterations for a run to be reported.
+    :type min_repeats: int
+    :param max_period: The maximum number of steps in one iteration.
+    :type max_period: int
+    :return: The runs found, in trace order.
+    :rtype: typing.List[FoldedBlock]
+    """
+    blocks = []
+    count = len(lines)
+    index = 0
+
+    while index < count:
+        first_line = lines[index]
+        found = None
+        for period in range(1, min(max_period, (count - index) // 2) + 1):
+            if lines[index + period] != first_line:
+                continue
+            pattern = lines[index:index + period]
+            if lines[index + period:index + 2 * period] != pattern:
+                continue
+
+            repeats = 2
+            position = index + 2 * period
+            while lines[position:position + period] == pattern:
+                repeats += 1
+                position += period
+            if repeats >= min_repeats:
+                found = FoldedBlock(index, period, repeats, tuple(pattern))
+                break
+
+        if found is None:
+            index += 1
+        else:
+            blocks.append(found)
+            index = found.stop
+
+    return blocks
@@ -0,0 +1,331 @@
+"""
+Call tracking for PyTracerTool
+
+The StepLog of a trace holds the steps of every traced frame, interleaved in the order they ran. CallTree records
+the calls around them: every traced frame gets a FrameRecord, linked to the frame that called it and to the frames
+it called, holding the value it returned and the index of its last step (whose state, in the StepLog, is the
+variables it ended with), and the order the frames started and finished in is logged, to be read as CallEvents.
+Calls are recorded while the traced code runs, so a record is kept small, and the events are only built when they
+are read.
+
+The variables of a frame are labelled "(function)variable" in the trace table, so the nested calls of a recursive
+function would share, and overwrite, the columns of the calls they are nested in. Each frame is therefore given a
+scope name: the function name for the outermost running call of a function, and the function name followed by
+the recursion level for the calls nested in it ("fact:2" for the first nested call of fact, "fact:3" for the next,
+...). A function that does not recurse keeps the plain labels. Calls are counted per function, not per name, so
+two functions with the same name (such as the __init__ methods of two classes, one calling the other) are not taken
+for a recursion.
+
+Classes:
+    - CallEvent: A traced frame starting or finishing, as logged in CodeTracer.calls_log.
+    - FrameRecord: A traced frame: its function, caller, callees, last step and return value.
+    - CallTree: The tree of the traced frames of a run, built as the frames start and finish.
+
+Functions:
+    - label_key(label): Sort key ordering variable labels by function, recursion level and variable name.
+"""
+
+import array
+import typing
+
+
+class CallEvent(typing.NamedTuple):
+    """
+    CallEvent is a traced frame starting or finishing.
+
+    Attributes:
+        kind: "call" when the frame started, "return" when it returned (or, for a generator, yielded), "unwind" when
+              it finished because of an exception.
+        frame_id: The id of the frame.
+        function: The name of the function.
+        depth: The call depth of the frame; 0 for main(), the frame the submitted code runs in.
+        step: The number of steps recorded before the event, which is the index of the next step.
+        value: For a "return", the rendered value returned or yielded; None otherwise.
+    """
+
+    kind: str
+    frame_id: int
+    function: str
+    depth: int
+    step: int
+    value: typing.Optional[str]
+
+
+class FrameRecord(object):
+    """
+    FrameRecord describes one traced frame.
+
+    A generator gets a new FrameRecord each time it is resumed (except with the "instrument" backend, see the
+    instrument module), which finishes when it yields, with the yielded value as its return value.
+
+    Attributes:
+        frame_id: The id of the frame, as stored in the StepLog of the trace.
+        function: The name of the function.
+        scope: The name the frame's variables are labelled with: the function name, followed by the recursion level
+               (as in "fact:2") when the function was already running below this frame.
+        level: The recursion level: 1, plus the number of frames of the same function running below this one.
+        depth: The call depth; 0 for main(), the frame the submitted code runs in.
+        parent: The FrameRecord of the calling frame, or None.
+        children: The FrameRecords of the frames called by this one, in call order.
+        call_step: The number of steps recorded before the frame started.
+        return_step: The number of steps recorded when the frame finished, or None if it was still running when the
+                     trace ended.
+        last_step: The index of the last step of the frame, or -1 if it recorded none (or has not finished). The
+                   state of that step in the StepLog holds the variables the frame ended with.
+        return_value: The rendered value the frame returned or yielded, or None.
+        raised: Whether the frame finished because of an exception.
+    """
+
+    __slots__ = (
+        "frame_id", "function", "scope", "level", "depth", "parent", "children", "call_step", "return_step",
+        "last_step", "return_value", "raised",
+    )
+
+    def __init__(
+        self,
+        frame_id: int,
+        function: str,
+        scope: str,
+        level: int,
+        parent: typing.Optional["FrameRecord"],
+        call_step: int,
+    ):
+        self.frame_id = frame_id
+        self.function = function
+        self.scope = scope
+        self.level = level
+        self.depth = parent.depth + 1 if parent is not None else 0
+        self.parent = parent
+        self.children = []
+        self.call_step = call_step
+        self.return_step = None
+        self.last_step = -1
+        self.return_value = None
+        self.raised = False
+
+    def __repr__(self) -> str:
+        return f"FrameRecord(frame_id={self.frame_id}, scope={self.scope!r}, depth={self.depth})"
+
+
+class CallTree(object):
+    """
+    CallTree records the traced frames of a run as a tree of FrameRecords, and logs their calls and returns.
+
+    Frame ids are given out in the order the frames start, so `frames[frame_id]` is the record of a frame.
+
+    Methods:
+        enter(function, parent_id, step, key): Record a frame starting, and give it a frame id.
+        exit(frame_id, step, last_step, return_value, raised): Record a frame finishing.
+        interrupt(frame_id, last_step): Record the last state of a frame that was still running when the trace ended.
+        stack(frame_id): Get the records of the frames running when a frame was, from main() to the frame.
+        walk(): Iterate over the records depth-first, in call order.
+
+    Attributes:
+        frames: Every FrameRecord, indexed by frame id.
+        roots: The records of the frames with no traced caller (main(), and the frames of allowed modules called
+               from outside the traced code).
+        events: The CallEvents of the run, in order, built from the records when read.
+        max_depth: The deepest call depth reached.
+    """
+
+    def __init__(self):
+        self.frames = []
+        self.roots = []
+        self.max_depth = 0
+        self._running = {}
+        self._running_keys = {}
+        self._scopes = {}
+        # The order of the events: the frame id for a call, and -1 - frame id for a return or an unwind.
+        self._order = array.array("l")
+
+    def __len__(self) -> int:
+        return len(self.frames)
+
+    @property
+    def events(self) -> typing.List[CallEvent]:
+        events = []
+        frames = self.frames
+        for entry in self._order:
+            if entry >= 0:
+                record = frames[entry]
+                events.append(CallEvent("call", entry, record.function, record.depth, record.call_step, None))
+            else:
+                record = frames[-1 - entry]
+                events.append(CallEvent(
+                    "unwind" if record.raised else "return", record.frame_id, record.function, record.depth,
+                    record.return_step, record.return_value,
+                ))
+        return events
+
+    def __getstate__(self) -> dict:
+        # The records are pickled as flat tuples, with the id of their parent instead of a reference to it, so that
+        # pickling the tree of a deep recursion does not recurse once per level.
+        frames = [
+            (
+                record.function, record.level, record.parent.frame_id if record.parent is not None else None,
+                record.call_step, record.return_step, record.last_step, record.return_value, record.raised,
+            )
+            for record in self.frames
+        ]
+        return {"frames": frames, "order": self._order, "max_depth": self.max_depth}
+
+    def __setstate__(self, state: dict):
+        self.__init__()
+        for function, level, parent_id, call_step, return_step, last_step, return_value, raised in state["frames"]:
+            parent = self.frames[parent_id] if parent_id is not None else None
+            record = FrameRecord(len(self.frames), function, self._scope(function, level), level, parent, call_step)
+            record.return_step, record.last_step = return_step, last_step
+            record.return_value, record.raised = return_value, raised
+            self.frames.append(record)
+            (parent.children if parent is not None else self.roots).append(record)
+        self._order = state["order"]
+        self.max_depth = state["max_depth"]
+
+    def enter(
+        self,
+        function: str,
+        parent_id: typing.Optional[int],
+        step: int,
+        key: typing.Hashable = None,
+    ) -> FrameRecord:
+        """
+        Record a frame starting, and give it a frame id.
+
+        :param self: The instance of the class.
+        :param function: The name of the frame's function.
+        :type function: str
+        :param parent_id: The frame id of the nearest traced frame below it in the stack, or None.
+        :type parent_id: typing.Optional[int]
+        :param step: The number of steps recorded so far.
+        :type step: int
+        :param key: What identifies the function when counting the recursion level, such as its code object;
+                    defaults to its name.
+        :type key: typing.Hashable
+        :return: The record of the frame.
+        :rtype: FrameRecord
+        """
+        if key is None:
+            key = function
+        level = self._running.get(key, 0) + 1
+        self._running[key] = level
+        parent = self.frames[parent_id] if parent_id is not None else None
+        frame_id = len(self.frames)
+        self._running_keys[frame_id] = key
+        record = FrameRecord(frame_id, function, self._scope(function, level), level, parent, step)
+        self.frames.append(record)
+        if parent is not None:
+            parent.children.append(record)
+        else:
+            self.roots.append(record)
+        if record.depth > self.max_depth:
+            self.max_depth = record.depth
+        self._order.append(frame_id)
+        return record
+
+    def exit(
+        self,
+        frame_id: int,
+        step: int,
+        last_step: typing.Optional[int],
+        return_value: typing.Optional[str] = None,
+        raised: bool = False,
+    ):
+        """
+        Record a frame finishing.
+
+        :param self: The instance of the class.
+        :param frame_id: The id of the frame.
+        :type frame_id: int
+        :param step: The number of steps recorded so far.
+        :type step: int
+        :param last_step: The index of the frame's last step, as returned by StepLog.end_frame, or None.
+        :type last_step: typing.Optional[int]
+        :param return_value: The rendered value the frame returned or yielded.
+        :type return_value: typing.Optional[str]
+        :param raised: Whether the frame finished because of an exception.
+        :type raised: bool
+        :return: None
+        """
+        record = self.interrupt(frame_id, last_step)
+        record.return_step = step
+        record.return_value = return_value
+        record.raised = raised
+        self._order.append(-1 - frame_id)
+
+    def interrupt(self, frame_id: int, last_step: typing.Optional[int]) -> FrameRecord:
+        """
+        Record the last state of a frame that was still running when the trace ended (or that is finishing).
+
+        :param self: The instance of the class.
+        :param frame_id: The id of the frame.
+        :type frame_id: int
+        :param last_step: The index of the frame's last step, as returned by StepLog.end_frame, or None.
+        :type last_step: typing.Optional[int]
+        :return: The record of the frame.
+        :rtype: FrameRecord
+        """
+        record = self.frames[frame_id]
+        key = self._running_keys.pop(frame_id)
+        level = self._running[key] - 1
+        if level:
+            self._running[key] = level
+        else:
+            # Forgotten once no call is running, so the code objects of finished functions are not kept alive.
+            del self._running[key]
+        if last_step is not None:
+            record.last_step = last_step
+        return record
+
+    def stack(self, frame_id: int) -> typing.List[FrameRecord]:
+        """
+        Get the records of the frames that were running when a frame was, from the outermost to the frame itself.
+
+        :param self: The instance of the class.
+        :param frame_id: The id of the frame.
+        :type frame_id: int
+        :return: The records, outermost first.
+        :rtype: typing.List[FrameRecord]
+        """
+        stack = []
+        record = self.frames[frame_id]
+        while record is not None:
+            stack.append(record)
+            record = record.parent
+        stack.reverse()
+        return stack
+
+    def walk(self) -> typing.Iterator[FrameRecord]:
+        """
+        Iterate over the records depth-first, each frame before the frames it called, in call order.
+
+        :param self: The instance of the class.
+        :return: An iterator of FrameRecord.
+        :rtype: typing.Iterator[FrameRecord]
+        """
+        pending = list(reversed(self.roots))
+        while pending:
+            record = pending.pop()
+            yield record
+            pending.extend(reversed(record.children))
+
+    def _scope(self, function: str, level: int) -> str:
+        # Every call at the same level shares the same scope string.
+        scope = self._scopes.get((function, level))
+        if scope is None:
+            scope = self._scopes[(function, level)] = function if level == 1 else f"{function}:{level}"
+        return scope
+
+
+def label_key(label: str) -> tuple:
+    """
+    Sort key ordering variable labels ("(function)variable" or "(function:level)variable") by function, recursion
+    level and variable name, so "(fact:10)n" comes after "(fact:9)n".
+
+    :param label: The label.
+    :type label: str
+    :return: The sort key.
+    :rtype: tuple
+    """
+    scope, _, variable = label[1:].partition(")")
+    function, _, level = scope.partition(":")
+    return function, int(level) if level.isdigit() else 1, variable
@@ -0,0 +1,525 @@
+"""
+AST instrumentation for PyTracerTool
+
+The trace hooks (`sys.settrace` and `sys.monitoring`) make the interpreter stop at every line of the traced code.
+Instrumentation rewrites the syntax tree of the submitted code instead, inserting a call to a recording hook at each
+point where the trace hooks would have completed a step, and compiles the result. The code then runs with no trace
+function installed at all, and only pays for the recording calls themselves.
+
+The recording calls are placed so that the steps match the ones recorded through the trace hooks:
+
+    - after every simple statement (assignments, augmented assignments, expression statements such as calls to
+      print, imports, ...), and after def and class statements;
+    - around the test of if, elif and while statements, which is recorded after it has been evaluated;
+    - at the start of the body and of the else clause of for loops, once the loop target has been bound;
+    - at the start of the body of with, try and except clauses;
+    - before return, break, continue and raise statements, after the returned value has been evaluated;
+    - after with statements, for the step that runs __exit__ on the with line;
+    - at the start of class bodies, for the step on the class line;
+    - after the subject of a match statement, and after each case pattern that is tried, whether or not it matches;
+    - after each decorator has been evaluated, and again after it has been applied;
+    - just before a generator is suspended by a yield, instead of after the statement holding the yield.
+
+A body written on the same line as its header (`for i in range(3): total += i`) runs in the same step as the
+header, as no new line starts between them, so the step at the start of the body (or after the test, when it is
+true) is left out and the step recorded after the body stands for both.
+
+Function bodies are also wrapped to report the start and end of each frame, and returned values are reported
+with the step of the return statement. The iterables of comprehensions and generator expressions are wrapped too,
+so that the limits of the trace are checked before each of their items, although no step is recorded for them.
+
+Known differences from tracing with hooks:
+
+    - Comprehensions, lambdas and generator expressions are not instrumented, so the steps the trace hooks record
+      for each of their iterations (in a frame of their own before Python 3.12, in the enclosing frame since)
+      are not recorded.
+    - A statement that raises an exception produces no step; the trace hooks record it with the state at the
+      point where the exception is caught.
+    - Statements spanning several lines are recorded once, on their first line.
+    - A while loop written on one line records one more step, on the loop line, when its test turns false after
+      the body has run; the trace hooks include that test in the step of the last iteration.
+    - A generator keeps the same frame across yields, rather than starting a new frame each time it resumes.
+    - The last step of an `except ... as name` clause still shows `name`, which the trace hooks only record once
+      it has been deleted at the end of the clause.
+    - Only the submitted code is instrumented, so the `allow` patterns of a CodeTracer have no effect.
+
+Reduced instrumentation:
+
+Recording every step costs a snapshot of the frame at each line, which keeps the "instrument" backend close to the
+speed of the trace hooks. With `reduced=True`, the "reduced" backend records far fewer points, and only renders
+the variables each of them binds:
+
+    - after assignments, augmented assignments and annotated assignments, with the variables they assign; an
+      assignment to an attribute or an item (`self.total = 0`, `counts[word] += 1`) updates the variable it starts
+      from;
+    - at the start of the body of for loops, with the loop target;
+    - at the start of a function, on the def line, with the parameters;
+    - after calls to print, with no variables, so the output has a step of its own;
+    - after method calls on a variable (`numbers.append(i)`), with that variable, as they may change it in place.
+
+This is a reduced-fidelity mode. It does not produce the same rows as the other backends:
+
+    - Each row keeps the last recorded value of the frame's variables, and only the variables recorded at that
+      point are rendered again. A value changed in any other way (through another name, by a function it is
+      passed to, ...) shows its new value at the next point where it is recorded.
+    - Tests, returns, jumps, imports, del and other statements record no step, nor do names bound by with, except,
+      import, match patterns or the walrus operator.
+    - Several recording points on one line make several steps.
+
+The limits of the trace are still checked at every recording point, at the start of each iteration of while
+loops, and before each item of comprehensions and generator expressions.
+
+Functions:
+    - instrument_source(python_code, filename, reduced): Parse, wrap in main() and instrument the submitted code.
+    - compile_instrumented(python_code, filename, reduced): Compile the instrumented code, caching the result.
+"""
+
+import ast
+import functools
+import types
+import typing
+
+
+STEP_HOOK = "__pytracertool_step__"
+VALUE_HOOK = "__pytracertool_value__"
+ENTER_HOOK = "__pytracertool_enter__"
+EXIT_HOOK = "__pytracertool_exit__"
+RETURN_HOOK = "__pytracertool_return__"
+ITERATE_HOOK = "__pytracertool_iterate__"
+DECORATE_HOOK = "__pytracertool_decorate__"
+RECORD_HOOK = "__pytracertool_record__"
+CHECK_HOOK = "__pytracertool_check__"
+RESULT_HOOK = "__pytracertool_result__"
+
+_SIMPLE_STATEMENTS = (
+    ast.Assign, ast.AugAssign, ast.AnnAssign, ast.Expr, ast.Pass, ast.Import, ast.ImportFrom, ast.Delete,
+    ast.Assert,
+)
+_JUMP_STATEMENTS = (ast.Break, ast.Continue, ast.Raise)
+
+
+def _call(hook: str, *arguments: ast.expr) -> ast.Call:
+    return ast.Call(func=ast.Name(id=hook, ctx=ast.Load()), args=list(arguments), keywords=[])
+
+
+def _step(line: int, node: ast.AST) -> ast.Expr:
+    return ast.copy_location(ast.Expr(value=_call(STEP_HOOK, ast.Constant(value=line))), node)
+
+
+def _value(line: int, value: ast.expr, hook: str = VALUE_HOOK) -> ast.Call:
+    return ast.copy_location(_call(hook, ast.Constant(value=line), value), value)
+
+
+class _Instrumenter(ast.NodeTransformer):
+    """
+    Inserts the recording calls into the statements of a syntax tree.
+    """
+
+    def instrument_body(self, body: typing.List[ast.stmt]) -> typing.List[ast.stmt]:
+        instrumented = []
+        for position, statement in enumerate(body):
+            # Checked before the body of the statement gets its own recording calls.
+            one_line = _on_header_line(getattr(statement, "body", None), statement)
+            statement = self.visit(statement)
+            line = statement.lineno
+            next_line = body[position + 1].lineno if position + 1 < len(body) else None
+
+            if isinstance(statement, _SIMPLE_STATEMENTS):
+                if _is_docstring(statement, position):
+                    instrumented.append(statement)
+                    continue
+                if _YieldRecorder(line).record(statement):
+                    # The step of a statement that yields ends when the generator is suspended.
+                    instrumented.append(statement)
+                    continue
+                instrumented.append(statement)
+                # Several statements on one line make a single step, recorded after the last of them.
+                if next_line != line:
+                    instrumented.append(_step(line, statement))
+            elif isinstance(statement, _JUMP_STATEMENTS):
+                instrumented.append(_step(line, statement))
+                instrumented.append(statement)
+            elif isinstance(statement, ast.Return):
+                value = statement.value or ast.copy_location(ast.Constant(value=None), statement)
+                statement.value = _value(line, value, RETURN_HOOK)
+                instrumented.append(statement)
+            elif isinstance(statement, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                instrumented.append(statement)
+                instrumented.append(_step(line, statement))
+            elif isinstance(statement, (ast.With, ast.AsyncWith)):
+                # Leaving the with block runs its __exit__ on the with line, which is a step of its own unless the
+                # block was already on that line.
+                instrumented.append(statement)
+                if not one_line:
+                    instrumented.append(_step(line, statement))
+            else:
+                instrumented.append(statement)
+        return instrumented
+
+    def visit_FunctionDef(self, node: ast.FunctionDef) -> ast.FunctionDef:
+        node.decorator_list = self._decorators(node)
+        node.body = self._frame_body(node.body, node)
+        return node
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def visit_ClassDef(self, node: ast.ClassDef) -> ast.ClassDef:
+        # The code of a decorated class starts on the line of its first decorator.
+        first_line = node.decorator_list[0].lineno if node.decorator_list else node.lineno
+        node.decorator_list = self._decorators(node)
+        node.body = self._frame_body(node.body, node)
+        # A class body starts with a step on its first line, and one on its docstring if it has one.
+        opening_steps = [_step(first_line, node)]
+        if _is_docstring(node.body[0], 0):
+            opening_steps.append(_step(node.body[0].lineno, node.body[0]))
+        node.body[-1].body[:0] = opening_steps
+        return node
+
+    def visit_If(self, node: ast.If) -> ast.If:
+        if _on_header_line(node.body, node):
+            node.test = self.visit(node.test)
+            # The body continues the step of the test, so only a false test ends a step of its own.
+            node.body = self.instrument_body(node.body)
+            node.orelse = [_step(node.lineno, node)] + self.instrument_body(node.orelse)
+        else:
+            node.test = _value(node.lineno, self.visit(node.test))
+            node.body = self.instrument_body(node.body)
+            node.orelse = self.instrument_body(node.orelse)
+        return node
+
+    visit_While = visit_If
+
+    def visit_For(self, node: ast.For) -> ast.For:
+        node.body = self._header_step(node) + self.instrument_body(node.body)
+        node.orelse = [_step(node.lineno, node)] + self.instrument_body(node.orelse)
+        return node
+
+    visit_AsyncFor = visit_For
+
+    def visit_With(self, node: ast.With) -> ast.With:
+        node.body = self._header_step(node) + self.instrument_body(node.body)
+        return node
+
+    visit_AsyncWith = visit_With
+
+    def visit_Try(self, node: ast.Try) -> ast.Try:
+        node.body = self._header_step(node) + self.instrument_body(node.body)
+        for handler in node.handlers:
+            handler.body = self._header_step(handler) + self.instrument_body(handler.body)
+        node.orelse = self.instrument_body(node.orelse)
+        node.finalbody = self.instrument_body(node.finalbody)
+        return node
+
+    visit_TryStar = visit_Try
+
+    def visit_Match(self, node: ast.AST) -> ast.AST:
+        node.subject = _value(node.lineno, self.visit(node.subject))
+        cases = []
+        for case in node.cases:
+            line = case.pattern.lineno
+            if case.guard is not None:
+                case.guard = self.visit(case.guard)
+            # The step on the case line ends when its body starts, or when the next case is tried.
+            header = [] if _on_header_line(case.body, case.pattern) else [_step(line, case.pattern)]
+            case.body = header + self.instrument_body(case.body)
+            cases.append(case)
+            if case.guard is None and _is_irrefutable(case.pattern):
+                continue
+            # A case that always matches but whose guard records the step and is false, so the next case is tried.
+            wildcard = ast.copy_location(ast.MatchAs(pattern=None, name=None), case.pattern)
+            failed_guard = _value(line, ast.copy_location(ast.Constant(value=False), case.pattern))
+            cases.append(ast.match_case(pattern=wildcard, guard=failed_guard, body=[ast.copy_location(ast.Pass(), case)]))
+        node.cases = cases
+        return node
+
+    def visit_Lambda(self, node: ast.Lambda) -> ast.Lambda:
+        return node
+
+    def visit_ListComp(self, node: ast.AST) -> ast.AST:
+        self.generic_visit(node)
+        for generator in node.generators:
+            generator.iter = ast.copy_location(_call(ITERATE_HOOK, generator.iter), generator.iter)
+        return node
+
+    visit_SetComp = visit_DictComp = visit_GeneratorExp = visit_ListComp
+
+    def _decorators(self, node: ast.AST) -> typing.List[ast.expr]:
+        # Each decorator is recorded on its line once evaluated and again once applied. The decorator added last,
+        # which is applied first, records the step on the definition line that ends once the object is created.
+        if not node.decorator_list:
+            return []
+        decorators = [
+            ast.copy_location(_call(DECORATE_HOOK, ast.Constant(value=decorator.lineno), self.visit(decorator)),
+                              decorator)
+            for decorator in node.decorator_list
+        ]
+        return decorators + [ast.copy_location(_call(DECORATE_HOOK, ast.Constant(value=node.lineno)), node)]
+
+    def _header_step(self, node: ast.AST) -> typing.List[ast.stmt]:
+        # A body written on the line of its header runs in the same step as the header, which its last statement
+        # records.
+        if _on_header_line(node.body, node):
+            return []
+        return [_step(node.lineno, node)]
+
+    def _frame_body(self, body: typing.List[ast.stmt], node: ast.stmt) -> typing.List[ast.stmt]:
+        # The docstring stays the first statement, so it is still picked up as __doc__.
+        docstring = body[:1] if body and _is_docstring(body[0], 0) else []
+        enter = ast.copy_location(ast.Expr(value=_call(ENTER_HOOK)), node)
+        exit_frame = ast.copy_location(ast.Expr(value=_call(EXIT_HOOK)), node)
+        # A frame left because of an exception reports it before re-raising; the bare raise keeps the traceback.
+        unwind = ast.copy_location(
+            ast.ExceptHandler(
+                type=None, name=None,
+                body=[ast.Expr(value=_call(EXIT_HOOK, ast.Constant(value=True))), ast.Raise(exc=None, cause=None)],
+            ),
+            node,
+        )
+        wrapped = ast.copy_location(
+            ast.Try(body=self.instrument_body(body[len(docstring):]) or [ast.Pass()], handlers=[unwind], orelse=[],
+                    finalbody=[exit_frame]),
+            node,
+        )
+        return docstring + [enter, wrapped]
+
+
+class _ReducedInstrumenter(_Instrumenter):
+    """
+    Inserts the recording calls of reduced instrumentation: after the statements that bind or may change
+    variables, with those variables, and after calls to print.
+    """
+
+    def instrument_body(self, body: typing.List[ast.stmt]) -> typing.List[ast.stmt]:
+        instrumented = []
+        for statement in body:
+            statement = self.visit(statement)
+            instrumented.append(statement)
+            names = None
+            if isinstance(statement, ast.Assign):
+                names = _bound_names(statement.targets)
+            elif isinstance(statement, ast.AugAssign) or (
+                isinstance(statement, ast.AnnAssign) and statement.value is not None
+            ):
+                names = _bound_names([statement.target])
+            elif isinstance(statement, ast.Expr) and isinstance(statement.value, ast.Call):
+                names = _changed_by_call(statement.value)
+            elif isinstance(statement, ast.Return) and statement.value is not None:
+                statement.value = ast.copy_location(_call(RESULT_HOOK, statement.value), statement.value)
+            if names is not None:
+                instrumented.append(_record(statement.lineno, names, statement))
+        return instrumented
+
+    def visit_FunctionDef(self, node: ast.FunctionDef) -> ast.FunctionDef:
+        node.decorator_list = [self.visit(decorator) for decorator in node.decorator_list]
+        arguments = node.args
+        parameters = [
+            argument.arg for argument in arguments.posonlyargs + arguments.args + [arguments.vararg]
+            + arguments.kwonlyargs + [arguments.kwarg] if argument is not None
+        ]
+        node.body = self._frame_body(node.body, node)
+        if parameters:
+            # The parameters are recorded on the def line as the first step of the frame.
+            node.body[-1].body.insert(0, _record(node.lineno, parameters, node))
+        return node
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def visit_ClassDef(self, node: ast.ClassDef) -> ast.ClassDef:
+        node.decorator_list = [self.visit(decorator) for decorator in node.decorator_list]
+        node.body = self._frame_body(node.body, node)
+        return node
+
+    def visit_If(self, node: ast.If) -> ast.If:
+        node.test = self.visit(node.test)
+        node.body = self.instrument_body(node.body)
+        node.orelse = self.instrument_body(node.orelse)
+        return node
+
+    def visit_While(self, node: ast.While) -> ast.While:
+        node.test = self.visit(node.test)
+        # A loop whose body records nothing is still stopped by the limits.
+        node.body = [ast.copy_location(ast.Expr(value=_call(CHECK_HOOK)), node)] + self.instrument_body(node.body)
+        node.orelse = self.instrument_body(node.orelse)
+        return node
+
+    def visit_For(self, node: ast.For) -> ast.For:
+        node.iter = self.visit(node.iter)
+        node.body = [_record(node.lineno, _bound_names([node.target]), node)] + self.instrument_body(node.body)
+        node.orelse = self.instrument_body(node.orelse)
+        return node
+
+    visit_AsyncFor = visit_For
+
+    def visit_With(self, node: ast.With) -> ast.With:
+        node.items = [self.visit(item) for item in node.items]
+        node.body = self.instrument_body(node.body)
+        return node
+
+    visit_AsyncWith = visit_With
+
+    def visit_Try(self, node: ast.Try) -> ast.Try:
+        node.body = self.instrument_body(node.body)
+        for handler in node.handlers:
+            handler.body = self.instrument_body(handler.body)
+        node.orelse = self.instrument_body(node.orelse)
+        node.finalbody = self.instrument_body(node.finalbody)
+        return node
+
+    visit_TryStar = visit_Try
+
+    def visit_Match(self, node: ast.AST) -> ast.AST:
+        node.subject = self.visit(node.subject)
+        for case in node.cases:
+            if case.guard is not None:
+                case.guard = self.visit(case.guard)
+            case.body = self.instrument_body(case.body)
+        return node
+
+
+class _YieldRecorder(ast.NodeTransformer):
+    """
+    Wraps the values of the yield expressions of a statement, so a step is recorded just before the generator is
+    suspended.
+    """
+
+    def __init__(self, line: int):
+        self.line = line
+        self.found = False
+
+    def record(self, statement: ast.stmt) -> bool:
+        self.visit(statement)
+        return self.found
+
+    def visit_Yield(self, node: ast.AST) -> ast.AST:
+        self.generic_visit(node)
+        node.value = _value(self.line, node.value or ast.copy_location(ast.Constant(value=None), node))
+        self.found = True
+        return node
+
+    visit_YieldFrom = visit_Yield
+
+    def visit_Lambda(self, node: ast.Lambda) -> ast.Lambda:
+        return node
+
+
+def _record(line: int, names: typing.List[str], node: ast.AST) -> ast.Expr:
+    values = [ast.Name(id=name, ctx=ast.Load()) for name in names]
+    call = _call(RECORD_HOOK, ast.Constant(value=line), ast.Constant(value=tuple(names)), *values)
+    return ast.copy_location(ast.Expr(value=call), node)
+
+
+def _bound_names(targets: typing.List[ast.expr]) -> typing.List[str]:
+    # The variables bound by assignment targets, in order; an attribute or item target changes the variable its
+    # expression starts from.
+    names = []
+    stack = list(reversed(targets))
+    while stack:
+        target = stack.pop()
+        while isinstance(target, (ast.Attribute, ast.Subscript, ast.Starred)):
+            target = target.value
+        if isinstance(target, (ast.Tuple, ast.List)):
+            stack.extend(reversed(target.elts))
+        elif isinstance(target, ast.Name) and target.id not in names:
+            names.append(target.id)
+    return names
+
+
+def _changed_by_call(call: ast.Call) -> typing.Optional[typing.List[str]]:
+    # The variables that a call statement is recorded with: none for print, the variable a method is called on,
+    # or None when the call is not recorded at all.
+    function = call.func
+    if isinstance(function, ast.Name):
+        return [] if function.id == "print" else None
+    if isinstance(function, ast.Attribute):
+        names = _bound_names([function.value])
+        return names or None
+    return None
+
+
+def _on_header_line(body: typing.Optional[typing.List[ast.stmt]], node: ast.AST) -> bool:
+    return bool(body) and body[0].lineno == node.lineno
+
+
+def _is_irrefutable(pattern: ast.AST) -> bool:
+    if isinstance(pattern, ast.MatchAs):
+        return pattern.pattern is None or _is_irrefutable(pattern.pattern)
+    if isinstance(pattern, ast.MatchOr):
+        return any(_is_irrefutable(alternative) for alternative in pattern.patterns)
+    return False
+
+
+def _is_docstring(statement: ast.stmt, position: int) -> bool:
+    return (
+        position == 0 and isinstance(statement, ast.Expr)
+        and isinstance(statement.value, ast.Constant) and isinstance(statement.value.value, str)
+    )
+
+
+def instrument_source(python_code: str, filename: str, reduced: bool = False) -> ast.Module:
+    """
+    Parse the submitted code, wrap it in a main() function and insert the recording calls.
+
+    The recording calls refer to the hooks by the global names STEP_HOOK, VALUE_HOOK, RETURN_HOOK, ENTER_HOOK,
+    EXIT_HOOK, ITERATE_HOOK and DECORATE_HOOK, which must be defined in the globals the code is executed with:
+
+        - STEP_HOOK(line): record a step of the calling frame.
+        - VALUE_HOOK(line, value): record a step of the calling frame and return `value`.
+        - RETURN_HOOK(line, value): record a step of the calling frame, which is about to return `value`, and
+          return `value`.
+        - ENTER_HOOK(): report that the calling frame has started.
+        - EXIT_HOOK(raised=False): report that the calling frame is about to finish; it is called with True, then
+          again without arguments, when the frame is left because of an exception.
+        - ITERATE_HOOK(iterable): return an iterator over the iterable of a comprehension or generator expression,
+          checking the limits of the trace before each item.
+        - DECORATE_HOOK(line, decorator): record a step of the calling frame and return a decorator that applies
+          `decorator`, then records a step on `line`; DECORATE_HOOK(line) records nothing and returns a decorator
+          that records a step on `line` and returns the decorated object unchanged.
+
+    Reduced instrumentation calls ENTER_HOOK, EXIT_HOOK and ITERATE_HOOK as above, and the following hooks instead
+    of the others:
+
+        - RECORD_HOOK(line, names, *values): record a step of the calling frame, in which the variables named in
+          the tuple `names` have the given values and the others keep the values they were last recorded with.
+        - CHECK_HOOK(): check the limits of the trace.
+        - RESULT_HOOK(value): remember the value the calling frame is about to return, and return it.
+
+    :param python_code: The submitted code.
+    :type python_code: str
+    :param filename: The filename to report in tracebacks.
+    :type filename: str
+    :param reduced: Whether to insert the recording calls of reduced instrumentation.
+    :type reduced: bool
+    :return: The instrumented syntax tree, with line numbers matching the submitted code; the tree of the submitted
+             code itself when it has no statements.
+    :rtype: ast.Module
+    """
+    user_tree = ast.parse(python_code, filename)
+    if not user_tree.body:
+        # Nothing to run, and nothing to record: the wrapper's `pass` is not a line of the submitted code.
+        return user_tree
+    wrapper = ast.parse("def main():\n\tpass\nmain()", filename)
+    wrapper.body[0].body = user_tree.body
+
+    main = wrapper.body[0]
+    instrumenter = _ReducedInstrumenter() if reduced else _Instrumenter()
+    main.body = instrumenter._frame_body(main.body, main)
+    return ast.fix_missing_locations(wrapper)
+
+
+@functools.lru_cache(maxsize=256)
+def compile_instrumented(python_code: str, filename: str, reduced: bool = False) -> types.CodeType:
+    """
+    Compile the instrumented form of the submitted code, caching the code object per source.
+
+    :param python_code: The submitted code.
+    :type python_code: str
+    :param filename: The filename to report in tracebacks.
+    :type filename: str
+    :param reduced: Whether to insert the recording calls of reduced instrumentation.
+    :type reduced: bool
+    :return: Code object that defines the instrumented main() function, then calls it.
+    :rtype: types.CodeType
+
+    :seealso: instrument_source
+    """
+    return compile(instrument_source(python_code, filename, reduced), filename, "exec")
@@ -0,0 +1,88 @@
+"""
+Execution limits for PyTracerTool
+
+Traced code is run with no bounds of its own, so an infinite loop would run (and grow the recorded trace) forever.
+TraceLimits bounds a trace by the number of steps, the wall-clock time, the size of the captured output and the
+size of the stored snapshots. When a limit is reached, TraceLimitExceeded is raised inside the traced code to stop
+it, and the CodeTracer keeps the steps recorded until then.
+
+Classes:
+    - TraceLimits: The limits applied to a trace.
+    - TraceLimitExceeded: Raised inside the traced code when a limit is reached.
+"""
+
+import typing
+
+
+class TraceLimitExceeded(BaseException):
+    """
+    Raised inside the traced code to stop it when one of its TraceLimits is reached.
+
+    It derives from BaseException, like SystemExit, so `except Exception` blocks in the traced code do not catch it.
+
+    Attributes:
+        limit: The name of the limit that was reached, such as "max_steps".
+        value: The value of the limit.
+    """
+
+    def __init__(self, limit: str, value: typing.Any):
+        """
+        Initialise a new instance of TraceLimitExceeded.
+
+        :param self: The instance of the class.
+        :param limit: The name of the limit that was reached.
+        :type limit: str
+        :param value: The value of the limit.
+        :type value: typing.Any
+        """
+        super().__init__(f"{limit} ({value}) reached")
+        self.limit = limit
+        self.value = value
+
+
+class TraceLimits(object):
+    """
+    TraceLimits holds the limits applied to a trace; a limit set to None is not applied.
+
+    Methods:
+        __init__(max_steps, timeout, max_output_bytes, max_snapshot_bytes): Initialise the limits.
+
+    Attributes:
+        max_steps: The maximum number of steps recorded.
+        timeout: The maximum wall-clock time, in seconds, the traced code may run for. Only checked between lines,
+                 so a single long-running call into C code (such as sum(range(10**12))) is not interrupted; use the
+                 timeout of a TracingPool to kill such code.
+        max_output_bytes: The maximum number of bytes (UTF-8 encoded) of output captured.
+        max_snapshot_bytes: The maximum number of bytes (UTF-8 encoded) of rendered values stored in the step log.
+    """
+
+    def __init__(
+        self,
+        max_steps: typing.Optional[int] = None,
+        timeout: typing.Optional[float] = None,
+        max_output_bytes: typing.Optional[int] = None,
+        max_snapshot_bytes: typing.Optional[int] = None,
+    ):
+        """
+        Initialise a new instance of TraceLimits.
+
+        :param self: The instance of the class.
+        :param max_steps: The maximum number of steps recorded.
+        :type max_steps: typing.Optional[int]
+        :param timeout: The maximum wall-clock time, in seconds, the traced code may run for.
+        :type timeout: typing.Optional[float]
+        :param max_output_bytes: The maximum number of bytes of output captured.
+        :type max_output_bytes: typing.Optional[int]
+        :param max_snapshot_bytes: The maximum number of bytes of rendered values stored in the step log.
+        :type max_snapshot_bytes: typing.Optional[int]
+        """
+        self.max_steps = max_steps
+        self.timeout = timeout
+        self.max_output_bytes = max_output_bytes
+        self.max_snapshot_bytes = max_snapshot_bytes
+
+    def __repr__(self) -> str:
+        return (
+            f"TraceLimits(max_steps={self.max_steps!r}, timeout={self.timeout!r}, "
+            f"max_output_bytes={self.max_output_bytes!r}, max_snapshot_bytes={self.max_snapshot_bytes!r})"
+        )
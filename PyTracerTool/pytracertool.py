@@ -1,5 +1,3 @@
-
-
 """
 Welcome to the PyTracerTool Module
 
@@ -26,11 +24,33 @@ Disclaimer:
 """
 
 import sys
-import copy
-import tabulate
+import ast
+import functools
 import types
 import typing
 import io
+import time
+import queue
+import threading
+
+from .backends import get_backend
+from .display import COLUMNS_TYPE, TableRenderer
+from .filters import FrameFilter
+from .instrument import compile_instrumented
+from .folding import FoldedBlock, find_cycles
+from .frames import CallEvent, CallTree, label_key
+from .limits import TraceLimitExceeded, TraceLimits
+from .rendering import ValueRenderer
+from .stats import TraceStats
+from .steps import StepLog, TraceStep
+from .table import TraceTable
+
+if typing.TYPE_CHECKING:
+    # Only the optional features (caching, diffing and trace files) use these, so the methods implementing them
+    # import them when they are first called, and importing PyTracerTool does not pay for them.
+    from .cache import CachedTrace, TraceCache
+    from .diff import TraceDiff, TraceIndex
+    from .tracefile import TraceFile
 
 TRACER_RETURN_TYPE = typing.Optional[
     typing.Callable[
@@ -40,53 +60,154 @@ TRACER_RETURN_TYPE = typing.Optional[
 FRAME_TYPE = types.FrameType
 ANY_TYPE = typing.Any
 
+SOURCE_FILENAME = "<usercode>"
+
+
+class TracingStopped(BaseException):
+    """
+    Raised inside the traced code to halt it, once the consumer of CodeTracer.iter_steps() stops iterating.
+
+    It derives from BaseException, like SystemExit, so `except Exception` blocks in the traced code do not catch it.
+    """
+
+
+@functools.lru_cache(maxsize=256)
+def _compile_source(python_code: str) -> types.CodeType:
+    user_tree = ast.parse(python_code, SOURCE_FILENAME)
+    if not user_tree.body:
+        # Nothing to run: main() would only hold the wrapper's `pass`, which is not a line of the submitted code.
+        return compile(user_tree, SOURCE_FILENAME, "exec")
+    wrapper = ast.parse("def main():\n\tpass\nmain()", SOURCE_FILENAME)
+    wrapper.body[0].body = user_tree.body
+
+    return compile(wrapper, SOURCE_FILENAME, "exec")
+
+
+class OutputChunk(typing.NamedTuple):
+    """
+    The output written during one step of the traced code.
+
+    Attributes:
+        step: The index of the step in the trace.
+        line: The line number of the step.
+        text: The text written during the step.
+    """
+
+    step: int
+    line: typing.Optional[int]
+    text: str
+
 
 class OutputLogger(object):
     """
     OutputLogger captures and logs the output produced by print statements during code execution.
 
     This class is used to capture the output of print statements generated during the execution
-    of the provided code. The captured output is associated with the line numbers in the code
-    where the print statements occurred. It achieves this by temporarily redirecting the standard
-    output stream to an instance of OutputLogger, which logs the output along with the corresponding
-    line numbers.
+    of the provided code, by temporarily redirecting the standard output stream to an instance of
+    OutputLogger. Written text is buffered until the tracer records the step it was written in and
+    calls end_step(), which tags the buffered text with the index and line of that step. Each step
+    therefore gets exactly the output it produced, and the output of a line that runs many times
+    (such as the body of a loop) is never merged into one growing string.
+
+    When `max_bytes` is set, output beyond that many bytes is dropped and TraceLimitExceeded is raised from write(),
+    which stops the code that printed it.
+
+    Only output written by the thread that created the logger is captured. Output written by other threads,
+    such as a caller consuming CodeTracer.iter_steps() while the traced code runs, goes to `stream`.
 
     Methods:
-        __init__(): Initialises an instance of OutputLogger
-        write(text): Log the provided text along with the current line number.
+        __init__(stream, max_bytes): Initialises an instance of OutputLogger
+        write(text): Buffer the provided text until the step it was written in is recorded.
+        end_step(step, line): Tag the text written since the last call with a step, and return it.
         flush(): Placeholder method; no action is taken.
 
     Attributes:
-        output_lines: A dictionary mapping line numbers to captured output text.
-                      Keys represent line numbers, and values represent the corresponding output.
+        chunks: The OutputChunk of every step that wrote output, in step order.
+        pending: The chunks of text written since end_step() was last called.
+        output_lines: A dictionary mapping line numbers (as strings) to all the output captured on that line.
+        stream: The stream receiving output written by other threads.
+        max_bytes: The maximum number of bytes (UTF-8 encoded) captured, or None for no limit.
+        output_bytes: The number of bytes captured so far (only counted when `max_bytes` is set).
+        writes: The number of calls to write() captured so far.
+        exceeded: The TraceLimitExceeded raised once `max_bytes` was reached, or None.
     """
 
-    def __init__(self):
+    def __init__(self, stream: typing.Optional[typing.TextIO] = None, max_bytes: typing.Optional[int] = None):
         """
         Initialize a new instance of OutputLogger.
 
         :param self: The instance of the class.
+        :param stream: The stream receiving output written by other threads; defaults to the current sys.stdout.
+        :type stream: typing.Optional[typing.TextIO]
+        :param max_bytes: The maximum number of bytes (UTF-8 encoded) captured.
+        :type max_bytes: typing.Optional[int]
         """
-        self.output_lines = {}
+        self.chunks = []
+        self.pending = []
+        self.stream = stream if stream is not None else sys.stdout
+        self.max_bytes = max_bytes
+        self.output_bytes = 0
+        self.writes = 0
+        self.exceeded = None
+        self._thread_id = threading.get_ident()
+
+    @property
+    def output_lines(self) -> dict:
+        texts = {}
+        for chunk in self.chunks:
+            texts.setdefault(str(chunk.line), []).append(chunk.text)
+        return {line: "".join(parts) for line, parts in texts.items()}
 
     def write(self, text:str):
         """
-        Log the provided text along with the current line number.
+        Buffer the provided text until the step it was written in is recorded.
 
         :param self: The instance of the class.
         :param text: The text to be logged.
         :type text: str
         :return: None
+        :raises TraceLimitExceeded: If the text takes the output over `max_bytes`.
         """
 
-        frame = sys._getframe(1)
-        line_number = frame.f_lineno
-
-        if str(line_number) in self.output_lines:
-            self.output_lines[str(line_number)] += str(text)
-        else:
-            self.output_lines[str(line_number)] = str(text)
+        if threading.get_ident() != self._thread_id:
+            self.stream.write(text)
+            return
+        self.writes += 1
+        text = str(text)
+
+        if self.max_bytes is not None:
+            if self.exceeded is not None:
+                raise self.exceeded
+            encoded = text.encode("utf-8")
+            self.output_bytes += len(encoded)
+            if self.output_bytes > self.max_bytes:
+                allowed = len(encoded) - (self.output_bytes - self.max_bytes)
+                text = encoded[:allowed].decode("utf-8", "ignore")
+                self.exceeded = TraceLimitExceeded("max_output_bytes", self.max_bytes)
+                if text:
+                    self.pending.append(text)
+                raise self.exceeded
+
+        self.pending.append(text)
+
+    def end_step(self, step: int, line: typing.Optional[int]) -> str:
+        """
+        Tag the text written since the last call with the step it was written in, and return it.
 
+        :param self: The instance of the class.
+        :param step: The index of the step.
+        :type step: int
+        :param line: The line number of the step.
+        :type line: typing.Optional[int]
+        :return: The text written since end_step() was last called.
+        :rtype: str
+        """
+        if not self.pending:
+            return ""
+        text = "".join(self.pending)
+        self.pending = []
+        self.chunks.append(OutputChunk(step, line, text))
+        return text
 
     def flush(self):
         """
@@ -109,28 +230,111 @@ class CodeTracer(object):
     Methods:
         __init__(python_code): Initialize a new instance of CodeTracer with the provided Python code.
         __str__(): Returns the trace table in a string format
+        render(): Render a window of the trace table as text, HTML or JSON.
         format_code_for_tracing(): Format the Python code for tracing by encapsulating it in a main() function.
+        compile_instrumented(reduced): Compile the code with recording calls inserted, for the "instrument" and
+            "reduced" backends.
         capture_print_statements(): Capture print outputs during code execution and associate them with line numbers.
         trace_lines(): Trace and record the order in which lines are executed.
         variables_tracer(): Trace and record the changes in variable values during code execution.
+        step_tracer(): Record line number, variable snapshot and output for every step in a single pass.
+        iter_steps(): Trace the code, yielding a TraceStep for each step as soon as it is recorded.
         generate_trace_table(): Trace execution order, variable changes, and print outputs to generate a trace table.
+        find_loops(): Find the runs of steps in which the same sequence of lines repeats.
+        folded_trace_table(): Get the trace table with the middle iterations of each loop collapsed into one row.
+        expand_block(): Get the full trace table rows of a folded loop.
+        save_trace(): Write the last trace to a binary trace file, readable step by step with TraceFile.
+        diff(): Align the last trace with a reference trace and report where they diverge.
 
     Attributes:
         code: The Python code to be traced.
         execution_order: A list to store the order in which lines of code are executed.
-        tracer_info: A list to store information about variable values during execution.
-        trace_table: A list to store a formatted trace table.
-        calls_log: A list to log function calls during execution.
-        output_lines: A dictionary to store captured print statement outputs.
+        tracer_info: A StepLog storing the variable values of every step as per-frame deltas.
+        trace_table: The trace table of the last trace: a TraceTable, used like a list of rows with the header first.
+        calls_log: The CallEvents of the last trace: every traced frame starting and finishing, with its frame id,
+                   depth and return value.
+        call_tree: The CallTree of the last trace, with a FrameRecord for every traced frame: its caller, callees,
+                   last step and return value.
+        output_lines: A dictionary mapping line numbers (as strings) to all the output printed on that line.
+        step_outputs: A dictionary mapping the index of every step that printed output to the text it printed.
         context: A dictionary to store the execution context.
+        backend: The name of the tracing backend used by generate_trace_table.
+        renderer: The ValueRenderer turning variable values into the strings shown in the trace table.
+        snapshotter: The Snapshotter taking the snapshots of the variables of each step.
+        frame_filter: The FrameFilter deciding which frames are traced.
+        limits: The TraceLimits applied to generate_trace_table and iter_steps.
+        truncated: A description of the limit that stopped the last trace, or None if it ran to completion.
+        cache: The TraceCache generate_trace_table uses, or None.
+        stats: The TraceStats of the last run, or None unless `collect_stats` was set.
     """
 
-    def __init__(self, python_code: str, user_input: str):
+    def __init__(
+        self,
+        python_code: str,
+        user_input: str,
+        backend: str = "auto",
+        keyframe_interval: int = 32,
+        render_cache_size: int = 4096,
+        allow: typing.Optional[typing.Iterable[str]] = None,
+        deny: typing.Optional[typing.Iterable[str]] = None,
+        max_steps: typing.Optional[int] = None,
+        timeout: typing.Optional[float] = None,
+        max_output_bytes: typing.Optional[int] = None,
+        max_snapshot_bytes: typing.Optional[int] = None,
+        cache: typing.Optional["TraceCache"] = None,
+        collect_stats: bool = False,
+        snapshot: str = "deep",
+        change_detection: str = "exact",
+    ):
         """
         Initialize a new instance of CodeTracer.
 
         :param python_code: The Python code to be traced.
         :type python_code: str
+        :param user_input: The text given to the code on stdin, read by input().
+        :type user_input: str
+        :param backend: The tracing backend used by generate_trace_table: "settrace", "monitoring" (Python 3.12+),
+                        "instrument" to run an instrumented copy of the code instead of installing a trace hook,
+                        "reduced" to run a copy instrumented to record only assignments, loop binds and calls to print
+                        (a faster, reduced-fidelity trace; see the instrument module), or "auto" to use "monitoring"
+                        where available and fall back to "settrace" otherwise.
+        :type backend: str
+        :param keyframe_interval: The number of steps of a frame between two full snapshots in `tracer_info`.
+        :type keyframe_interval: int
+        :param render_cache_size: The maximum number of rendered values cached by `renderer`.
+        :type render_cache_size: int
+        :param allow: Module name or filename patterns (such as "random" or "*/helpers.py") traced in addition to
+                      the submitted code. By default only the submitted code is traced.
+        :type allow: typing.Optional[typing.Iterable[str]]
+        :param deny: Module name or filename patterns that are never traced.
+        :type deny: typing.Optional[typing.Iterable[str]]
+        :param max_steps: The maximum number of steps traced.
+        :type max_steps: typing.Optional[int]
+        :param timeout: The maximum wall-clock time, in seconds, the traced code may run for.
+        :type timeout: typing.Optional[float]
+        :param max_output_bytes: The maximum number of bytes of output captured.
+        :type max_output_bytes: typing.Optional[int]
+        :param max_snapshot_bytes: The maximum number of bytes (UTF-8 encoded) of variable values stored in
+                                   `tracer_info`.
+        :type max_snapshot_bytes: typing.Optional[int]
+        :param cache: A TraceCache generate_trace_table serves deterministic programs from, and stores their traces
+                      in; None to always trace the code.
+        :type cache: typing.Optional[TraceCache]
+        :param collect_stats: Whether to collect a TraceStats in `stats` on every run, with counters and timings of
+                              each phase of the tracer, each traced line and each function.
+        :type collect_stats: bool
+        :param snapshot: How variable values are captured before being rendered: "deep" to render deep copies,
+                         "shallow" to render the live values (for values that cannot be copied, such as files or
+                         generators), or "repr" to render size-bounded reprs.
+        :type snapshot: str
+        :param change_detection: How unchanged containers are detected, so their previous rendering is reused:
+                                 "exact", "sampled" (constant time for lists and tuples, but may miss a change) or
+                                 "off". See the snapshots module.
+        :type change_detection: str
+
+        :note:
+            When one of the limits is reached, the traced code is stopped, `truncated` describes the limit, and the
+            trace table holds the steps recorded until then, followed by a row marking the truncation.
 
         :note:
             This constructor initializes an instance of the CodeTracer class with the provided Python code.
@@ -140,12 +344,44 @@ class CodeTracer(object):
 
         self.code = python_code
         self.execution_order = []
-        self.tracer_info = []
+        self.tracer_info = StepLog(keyframe_interval)
         self.trace_table = []
-        self.calls_log = []
-        self.output_lines = []
+        self.call_tree = CallTree()
+        self.step_outputs = {}
         self.context = {}
         self.user_input = user_input
+        self.backend = backend
+        self.keyframe_interval = keyframe_interval
+        self.renderer = ValueRenderer(render_cache_size)
+        # Imported here rather than with the module, as it imports copy, which takes long to import.
+        from .snapshots import Snapshotter
+
+        self.snapshotter = Snapshotter(self.renderer, snapshot, change_detection)
+        self.frame_filter = FrameFilter(SOURCE_FILENAME, allow, deny)
+        self.limits = TraceLimits(max_steps, timeout, max_output_bytes, max_snapshot_bytes)
+        self.truncated = None
+        self.cache = cache
+        self.collect_stats = collect_stats
+        self.stats = None
+        self._pending_lines = {}
+        self._frame_ids = {}
+        self._return_values = {}
+        self._raising = None
+        self._output_logger = None
+        self._step_sink = None
+        self._halted_by = None
+        self._deadline = None
+
+    @property
+    def calls_log(self) -> typing.List[CallEvent]:
+        return self.call_tree.events
+
+    @property
+    def output_lines(self) -> dict:
+        texts = {}
+        for index, text in self.step_outputs.items():
+            texts.setdefault(str(self.execution_order[index]), []).append(text)
+        return {line: "".join(parts) for line, parts in texts.items()}
 
     def __str__(self) -> str:
         """
@@ -178,10 +414,44 @@ class CodeTracer(object):
             The trace_table_str will contain a formatted table as a string, which you can print:
 
 
-        :seealso: generate_trace_table
+        :seealso: generate_trace_table, render
+        """
+
+        return TableRenderer(self.trace_table).render()
+
+    def render(
+        self,
+        start: int = 0,
+        stop: typing.Optional[int] = None,
+        columns: COLUMNS_TYPE = None,
+        format: str = "text",
+    ) -> str:
+        """
+        Render a window of the trace table, without formatting the rest of it.
+
+        :param self: The instance of the class.
+        :param start: The index of the first row, not counting the header.
+        :type start: int
+        :param stop: The index after the last row; None for the end of the table.
+        :type stop: typing.Optional[int]
+        :param columns: The columns to include: a slice of column positions, or column names (such as "Line" or
+                        "(main)x") and positions; None for every column.
+        :type columns: typing.Union[slice, typing.Iterable[typing.Union[str, int]], None]
+        :param format: "text" for a tabulate grid, "html" for an HTML table with escaped values, or "json".
+        :type format: str
+        :return: The rendered window.
+        :rtype: str
+
+        :Example:
+            ```python
+            tracer.generate_trace_table()
+            first_page = tracer.render(0, 50, format="html")
+            ```
+
+        :seealso: TableRenderer
         """
 
-        return tabulate.tabulate(self.trace_table, headers="firstrow", tablefmt="grid")
+        return TableRenderer(self.trace_table).render(start, stop, columns, format)
 
     def format_code_for_tracing(self) -> str:
         """
@@ -222,6 +492,48 @@ class CodeTracer(object):
 
         return code_start + "\n".join(lines) + "\n\t" + "_finished = True"
 
+    def compile_for_tracing(self) -> types.CodeType:
+        """
+        Compile the Python code, wrapped in a main() function, ready to be traced.
+
+        :param self: The instance of the class.
+        :return: Code object that defines main() with the user's code as its body, then calls it.
+        :rtype: types.CodeType
+
+        :note:
+            - Unlike `format_code_for_tracing`, the wrapping is done on the syntax tree rather than by indenting
+              the source text, so line numbers reported while tracing match the lines of the code provided, and
+              multi-line strings are left untouched.
+            - No `_finished = True` line is needed, because the state after the last line is captured when
+              main() returns.
+            - Compiled code objects are cached per source, so the same code is only parsed and compiled once
+              per process.
+            - Code with no statements (empty, or only comments) is compiled as it is, without main(), so its
+              trace has no steps.
+        """
+
+        return _compile_source(self.code)
+
+    def compile_instrumented(self, reduced: bool = False) -> types.CodeType:
+        """
+        Compile the Python code, wrapped in a main() function, with recording calls inserted at every step.
+
+        :param self: The instance of the class.
+        :param reduced: Whether to insert the recording calls of reduced instrumentation instead.
+        :type reduced: bool
+        :return: Code object that defines the instrumented main() function, then calls it.
+        :rtype: types.CodeType
+
+        :note:
+            This is the code run by the "instrument" backend. It reports its steps by calling `_on_step`,
+            `_on_value`, `_on_enter` and `_on_exit`, so it records the same steps as `step_tracer` (with the
+            exceptions listed in the instrument module) without a trace hook being installed. The "reduced" backend
+            runs the code compiled with `reduced=True`, which only reports the variables bound at a few points
+            through `_on_record` (see the instrument module).
+        """
+
+        return compile_instrumented(self.code, SOURCE_FILENAME, reduced)
+
     def lines_tracer(
         self, frame: FRAME_TYPE, event: str, arg: ANY_TYPE
     ) -> TRACER_RETURN_TYPE:
@@ -293,36 +605,563 @@ class CodeTracer(object):
             print(tracer.tracer_info)  # Print the recorded variable values
             ```
 
-            The `tracer_info` list will contain dictionaries representing variable changes in each line.
+            The `tracer_info` StepLog will contain the variable values at each line.
         """
 
         if event == "call":
-            function_name = frame.f_code.co_name
-            self.calls_log.append(f"Calling function: {function_name}")
+            self._frame_id(frame)
 
         elif event == "line":
-            local_variables = frame.f_locals
-            local_variables_deepcopy = copy.deepcopy(local_variables)
+            self.tracer_info.append(self._frame_id(frame), frame.f_lineno, self.snapshot_variables(frame))
 
+        elif event == "return":
+            self._end_frame(frame, arg)
 
-            vars_in_context = {
-                f"({frame.f_code.co_name}){var}".replace('<','&lt;').replace('>','&gt;'): (
-                    (tabulate.tabulate([vars(value).keys(), vars(value).values()], tablefmt="grid")).replace("\n","<br>")
-                    if "object" in str(value) and var != "self"
-                    and "_iterator object at 0x" not in str(value)
-                    else str(value).replace('<','&lt;').replace('>','&gt;')
-                )
-                for var, value in local_variables_deepcopy.items()
-                if (
-                    "<module>" not in frame.f_code.co_name
-                    and "function" not in str(value)
-                    and not (str(var).startswith("__") and str(var).endswith("__"))
-                )
-            }
+        return self.variables_tracer
 
-            self.tracer_info.append(copy.deepcopy(vars_in_context))
+    def snapshot_variables(self, frame: FRAME_TYPE) -> dict:
+        """
+        Take a rendered snapshot of the local variables of a frame.
 
-        return self.variables_tracer
+        :param self: The instance of the class.
+        :param frame: The frame whose local variables are captured.
+        :type frame: types.FrameType
+        :return: A dictionary mapping "(function)variable" labels to the rendered variable values.
+        :rtype: dict
+
+        :note:
+            The nested calls of a recursive function are labelled with their recursion level, as in
+            "(function:2)variable", so they do not share the columns of the calls they are nested in (see the
+            frames module).
+
+        :note:
+            Functions, dunder names and the variables of `<module>` frames are left out of the snapshot.
+            Objects (other than `self` and iterators) are rendered as a grid of their attributes.
+            Values are captured and rendered by `snapshotter`, which reuses the rendering of containers that did
+            not change since the previous step of the frame.
+        """
+
+        if "<module>" in frame.f_code.co_name:
+            return {}
+        frame_id = self._frame_ids.get(frame)
+        if frame_id is None:
+            frame_id = self._frame_id(frame)
+        return self.snapshotter.snapshot(frame, frame_id, self.stats, self.call_tree.frames[frame_id].scope)
+
+    def step_tracer(
+        self, frame: FRAME_TYPE, event: str, arg: ANY_TYPE
+    ) -> TRACER_RETURN_TYPE:
+        """
+        Trace function that records the line number and variable snapshot of every step in a single pass.
+
+        A step is recorded once a line has finished executing, which is when the next 'line' or the 'return'
+        event arrives for the same frame. The step stores the line number in `execution_order` and the
+        snapshot of the frame's variables, taken after the line ran, in the `tracer_info` StepLog. Both
+        therefore always have the same length and stay aligned, even for programs that call functions or behave
+        differently from one run to the next.
+
+        Frames rejected by `frame_filter` (by default, any code not compiled from the submitted source) get None
+        as their local trace function, so CPython generates no line events for them.
+
+        Every traced frame is recorded in `call_tree` when it starts, and again when it returns, with its return
+        value, or when an exception makes it unwind (an 'exception' event followed by a 'return' event, with no
+        'line' event in between).
+
+        'opcode' events only check the limits; they are delivered once SettraceBackend has found the code still
+        running past its timeout.
+
+        :param self: The instance of the class.
+        :param frame: The current frame being executed.
+        :type frame: types.FrameType
+        :param event: The event type, such as 'call', 'line', 'return', etc.
+        :type event: str
+        :param arg: Additional event information.
+        :type arg: typing.Any
+        :return: The next trace function to use, or None to stop tracing.
+        :rtype: typing.Optional[typing.Callable[[types.FrameType, str, typing.Any], typing.Optional[typing.Callable]]]
+
+        :seealso: generate_trace_table
+        """
+
+        if event == "call":
+            if not self._on_call(frame):
+                return None
+
+        elif event == "line":
+            self._on_line(frame)
+
+        elif event == "return":
+            self._on_return(frame, arg, self._raising is frame)
+
+        elif event == "exception":
+            self._raising = frame
+
+        elif event == "opcode":
+            # Only enabled by SettraceBackend once the timeout has passed, for code that produces no line events.
+            self._check_limits()
+
+        return self.step_tracer
+
+    def _on_call(self, frame: FRAME_TYPE) -> bool:
+        """
+        Handle a frame starting to execute.
+
+        :param self: The instance of the class.
+        :param frame: The frame that was entered.
+        :type frame: types.FrameType
+        :return: Whether the lines of the frame should be traced.
+        :rtype: bool
+        """
+
+        if self._halted_by is not None:
+            raise self._halted_by
+        if not self.frame_filter.accepts(frame):
+            return False
+        function_name = frame.f_code.co_name
+        if self.stats is not None:
+            self.stats._event(function_name)
+            self.stats._resume(None)
+        if "<module>" in function_name:
+            return False
+        self._frame_id(frame)
+        return True
+
+    def _on_line(self, frame: FRAME_TYPE):
+        """
+        Handle a frame starting a new line: the previous line of the frame has finished executing.
+
+        :param self: The instance of the class.
+        :param frame: The frame executing the line.
+        :type frame: types.FrameType
+        :return: None
+        """
+
+        if self._halted_by is not None:
+            raise self._halted_by
+        if self.stats is not None:
+            self.stats._event(frame.f_code.co_name)
+        self._raising = None
+        self._complete_step(frame)
+        self._check_limits()
+        self._pending_lines[frame] = frame.f_lineno
+        if self.stats is not None:
+            self.stats._resume(frame.f_lineno)
+
+    def _on_return(self, frame: FRAME_TYPE, value: ANY_TYPE = None, raised: bool = False):
+        """
+        Handle a frame returning (or yielding, or unwinding because of an exception).
+
+        :param self: The instance of the class.
+        :param frame: The frame that is returning.
+        :type frame: types.FrameType
+        :param value: The value returned or yielded.
+        :type value: typing.Any
+        :param raised: Whether the frame is unwinding because of an exception.
+        :type raised: bool
+        :return: None
+        """
+
+        if self._halted_by is not None:
+            return
+        if self.stats is not None:
+            self.stats._event(frame.f_code.co_name)
+        self._complete_step(frame)
+        self._end_frame(frame, value, raised)
+        self._check_limits()
+        if self.stats is not None:
+            self.stats._resume(self._pending_lines.get(frame.f_back))
+
+    def _on_step(self, line: int):
+        """
+        Record a step of the calling frame; called by the code compiled by compile_instrumented.
+
+        :param self: The instance of the class.
+        :param line: The line number of the step.
+        :type line: int
+        :return: None
+        """
+
+        if self._halted_by is not None:
+            raise self._halted_by
+        frame = sys._getframe(1)
+        if self.stats is not None:
+            self.stats._event(frame.f_code.co_name)
+        self._record_step(frame, line)
+        self._check_limits()
+        if self.stats is not None:
+            self.stats._resume(line)
+
+    def _on_value(self, line: int, value: ANY_TYPE) -> ANY_TYPE:
+        """
+        Record a step of the calling frame once `value` has been evaluated; called by the code compiled by
+        compile_instrumented around if and while tests and returned values.
+
+        :param self: The instance of the class.
+        :param line: The line number of the step.
+        :type line: int
+        :param value: The value of the test or of the returned expression.
+        :type value: typing.Any
+        :return: The value, unchanged.
+        :rtype: typing.Any
+        """
+
+        if self._halted_by is not None:
+            raise self._halted_by
+        frame = sys._getframe(1)
+        if self.stats is not None:
+            self.stats._event(frame.f_code.co_name)
+        self._record_step(frame, line)
+        self._check_limits()
+        if self.stats is not None:
+            self.stats._resume(line)
+        return value
+
+    def _on_iterate(self, iterable: typing.Iterable) -> typing.Iterator:
+        """
+        Iterate over the iterable of a comprehension or generator expression, checking the limits before every
+        item; called by the code compiled by compile_instrumented, which records no steps inside comprehensions.
+
+        :param self: The instance of the class.
+        :param iterable: The iterable.
+        :type iterable: typing.Iterable
+        :return: An iterator over the items of the iterable.
+        :rtype: typing.Iterator
+        """
+
+        # iter() is called now, as the comprehension would have, so an iterable that is not iterable fails here.
+        return self._limited(iter(iterable))
+
+    def _limited(self, iterator: typing.Iterator) -> typing.Iterator:
+        for item in iterator:
+            if self._halted_by is not None:
+                raise self._halted_by
+            self._check_limits()
+            yield item
+
+    def _on_return_value(self, line: int, value: ANY_TYPE) -> ANY_TYPE:
+        """
+        Record the step of a return statement of the calling frame once the returned value has been evaluated,
+        and remember the value until the frame finishes; called by the code compiled by compile_instrumented.
+
+        :param self: The instance of the class.
+        :param line: The line number of the return statement.
+        :type line: int
+        :param value: The returned value.
+        :type value: typing.Any
+        :return: The value, unchanged.
+        :rtype: typing.Any
+        """
+
+        if self._halted_by is not None:
+            raise self._halted_by
+        frame = sys._getframe(1)
+        if self.stats is not None:
+            self.stats._event(frame.f_code.co_name)
+        self._record_step(frame, line)
+        self._return_values[frame] = value
+        self._check_limits()
+        if self.stats is not None:
+            self.stats._resume(line)
+        return value
+
+    def _on_decorate(self, line: int, *decorator: ANY_TYPE) -> typing.Callable:
+        """
+        Record the step of a decorator line of the calling frame once the decorator has been evaluated, and return a
+        decorator that applies it and records the line again; called by the code compiled by compile_instrumented.
+
+        Without a decorator, nothing is recorded yet, and the returned decorator, applied before the others,
+        records the step on the definition line and leaves the decorated object unchanged.
+
+        :param self: The instance of the class.
+        :param line: The line number of the decorator, or of the definition.
+        :type line: int
+        :param decorator: The evaluated decorator, if any.
+        :type decorator: typing.Any
+        :return: A decorator wrapping the evaluated one.
+        :rtype: typing.Callable
+        """
+
+        if decorator:
+            self._hook_step(sys._getframe(1), line)
+        # functools.partial adds no Python frame, so the decorator is applied straight from the defining frame.
+        return functools.partial(self._apply_decorator, line, decorator)
+
+    def _apply_decorator(self, line: int, decorator: tuple, target: ANY_TYPE) -> ANY_TYPE:
+        """
+        Apply a decorator returned by _on_decorate and record the step of its line in the defining frame.
+
+        :param self: The instance of the class.
+        :param line: The line number of the decorator, or of the definition.
+        :type line: int
+        :param decorator: A tuple holding the evaluated decorator, or an empty tuple.
+        :type decorator: tuple
+        :param target: The function or class being decorated.
+        :type target: typing.Any
+        :return: The decorated object.
+        :rtype: typing.Any
+        """
+
+        if decorator:
+            target = decorator[0](target)
+        self._hook_step(sys._getframe(1), line)
+        return target
+
+    def _hook_step(self, frame: FRAME_TYPE, line: int):
+        """
+        Record a step of a frame of the instrumented code and check the limits, as _on_step does for its caller.
+
+        :param self: The instance of the class.
+        :param frame: The frame the step belongs to.
+        :type frame: types.FrameType
+        :param line: The line number of the step.
+        :type line: int
+        :return: None
+        """
+
+        if self._halted_by is not None:
+            raise self._halted_by
+        if self.stats is not None:
+            self.stats._event(frame.f_code.co_name)
+        self._record_step(frame, line)
+        self._check_limits()
+        if self.stats is not None:
+            self.stats._resume(line)
+
+    def _on_record(self, line: int, names: tuple, *values: ANY_TYPE):
+        """
+        Record a step of the calling frame from the variables it assigned; called by the code compiled by
+        compile_instrumented with reduced instrumentation.
+
+        :param self: The instance of the class.
+        :param line: The line number of the step.
+        :type line: int
+        :param names: The names of the variables assigned by the step.
+        :type names: tuple
+        :param values: The values of the variables, in the same order.
+        :type values: typing.Any
+        :return: None
+        """
+
+        if self._halted_by is not None:
+            raise self._halted_by
+        stats = self.stats
+        if stats is not None:
+            start = time.perf_counter()
+
+        frame = sys._getframe(1)
+        frame_id = self._frame_ids.get(frame)
+        if frame_id is None:
+            frame_id = self._frame_id(frame)
+        scope = self.call_tree.frames[frame_id].scope
+        render = self.renderer.render if self.snapshotter.mode != "repr" else self.snapshotter.render_value
+        label = self.renderer.label
+        assigned = {}
+        for name, value in zip(names, values):
+            rendered = render(name, value)
+            if rendered is not None:
+                assigned[label(scope, name)] = rendered
+        changes = self.tracer_info.append_changes(frame_id, line, assigned)
+        index = len(self.tracer_info) - 1
+        output = self._output_logger.end_step(index, line) if self._output_logger is not None else ""
+
+        if stats is not None:
+            elapsed = time.perf_counter() - start
+            stats.count("steps")
+            stats.add_time("step", elapsed)
+            line_stats = stats.line(line)
+            line_stats.steps += 1
+            line_stats.record.add(elapsed)
+        if self._step_sink is not None:
+            self._step_sink(
+                TraceStep(index, line, dict(changes), output, self.call_tree.frames[frame_id].depth, frame_id)
+            )
+        self._check_limits()
+
+    def _on_check(self):
+        """
+        Check the limits of the trace; called by the code compiled by compile_instrumented with reduced
+        instrumentation at the start of each iteration of a while loop.
+
+        :param self: The instance of the class.
+        :return: None
+        """
+
+        if self._halted_by is not None:
+            raise self._halted_by
+        self._check_limits()
+
+    def _on_result(self, value: ANY_TYPE) -> ANY_TYPE:
+        """
+        Remember the value the calling frame is about to return until it finishes, without recording a step;
+        called by the code compiled by compile_instrumented with reduced instrumentation.
+
+        :param self: The instance of the class.
+        :param value: The returned value.
+        :type value: typing.Any
+        :return: The value, unchanged.
+        :rtype: typing.Any
+        """
+
+        self._return_values[sys._getframe(1)] = value
+        return value
+
+    def _on_enter(self):
+        """
+        Handle the calling frame starting to execute; called by the code compiled by compile_instrumented.
+
+        :param self: The instance of the class.
+        :return: None
+        """
+
+        if self._halted_by is not None:
+            raise self._halted_by
+        frame = sys._getframe(1)
+        self._frame_id(frame)
+        if self.stats is not None:
+            self.stats._event(frame.f_code.co_name)
+            self.stats._resume(None)
+
+    def _on_exit(self, raised: bool = False):
+        """
+        Handle the calling frame finishing; called by the code compiled by compile_instrumented.
+
+        :param self: The instance of the class.
+        :param raised: Whether the frame is being left because of an exception.
+        :type raised: bool
+        :return: None
+        """
+
+        frame = sys._getframe(1)
+        self._end_frame(frame, self._return_values.pop(frame, None), raised)
+
+    def _check_limits(self):
+        """
+        Stop the traced code if one of the limits has been reached.
+
+        :param self: The instance of the class.
+        :return: None
+        :raises TraceLimitExceeded: If a limit has been reached.
+        """
+
+        limits = self.limits
+        if limits.max_steps is not None and len(self.tracer_info) >= limits.max_steps:
+            self._halt(TraceLimitExceeded("max_steps", limits.max_steps))
+        if limits.max_snapshot_bytes is not None and self.tracer_info.stored_size > limits.max_snapshot_bytes:
+            self._halt(TraceLimitExceeded("max_snapshot_bytes", limits.max_snapshot_bytes))
+        if self._deadline is not None and time.perf_counter() > self._deadline:
+            self._halt(TraceLimitExceeded("timeout", limits.timeout))
+
+    def _halt(self, reason: BaseException):
+        """
+        Stop the traced code: raise `reason` now, and again at every later call or line event, so the traced code
+        cannot carry on by catching it.
+
+        :param self: The instance of the class.
+        :param reason: The exception stopping the code, TracingStopped or TraceLimitExceeded.
+        :type reason: BaseException
+        :return: None
+        """
+
+        self._halted_by = reason
+        raise reason
+
+    def _complete_step(self, frame: FRAME_TYPE):
+        """
+        Record the step that was pending for a frame, if there is one.
+
+        :param self: The instance of the class.
+        :param frame: The frame whose pending line has finished executing.
+        :type frame: types.FrameType
+        :return: None
+        """
+
+        line_num = self._pending_lines.pop(frame, None)
+        if line_num is not None:
+            self._record_step(frame, line_num)
+
+    def _record_step(self, frame: FRAME_TYPE, line_num: int):
+        """
+        Record a step: the line of a frame that has finished executing, with the frame's variables and the output
+        printed since the previous step.
+
+        :param self: The instance of the class.
+        :param frame: The frame that executed the line.
+        :type frame: types.FrameType
+        :param line_num: The line number.
+        :type line_num: int
+        :return: None
+        """
+
+        stats = self.stats
+        if stats is not None:
+            start = time.perf_counter()
+
+        frame_id = self._frame_id(frame)
+        changes = self.tracer_info.append(frame_id, line_num, self.snapshot_variables(frame))
+        index = len(self.tracer_info) - 1
+        output = self._output_logger.end_step(index, line_num) if self._output_logger is not None else ""
+
+        if stats is not None:
+            elapsed = time.perf_counter() - start
+            stats.count("steps")
+            stats.add_time("step", elapsed)
+            line_stats = stats.line(line_num)
+            line_stats.steps += 1
+            line_stats.record.add(elapsed)
+
+        if self._step_sink is not None:
+            # The changes are stored in the step log, so the consumer is given a copy it is free to modify.
+            step = TraceStep(index, line_num, dict(changes), output, self.call_tree.frames[frame_id].depth, frame_id)
+            self._step_sink(step)
+
+    def _frame_id(self, frame: FRAME_TYPE) -> int:
+        """
+        Get the id identifying a frame in the step log. A frame seen for the first time is recorded in
+        `call_tree`, under the nearest traced frame below it in the stack, and given a new id.
+
+        :param self: The instance of the class.
+        :param frame: The frame being executed.
+        :type frame: types.FrameType
+        :return: The frame id.
+        :rtype: int
+        """
+
+        frame_id = self._frame_ids.get(frame)
+        if frame_id is None:
+            caller = frame.f_back
+            while caller is not None and caller not in self._frame_ids:
+                caller = caller.f_back
+            parent_id = self._frame_ids[caller] if caller is not None else None
+            record = self.call_tree.enter(frame.f_code.co_name, parent_id, len(self.tracer_info), frame.f_code)
+            frame_id = self._frame_ids[frame] = record.frame_id
+        return frame_id
+
+    def _end_frame(self, frame: FRAME_TYPE, value: ANY_TYPE = None, raised: bool = False):
+        """
+        Record a frame finishing in `call_tree`, and forget it, so its last state is no longer kept for computing
+        deltas.
+
+        :param self: The instance of the class.
+        :param frame: The frame that returned.
+        :type frame: types.FrameType
+        :param value: The value the frame returned or yielded.
+        :type value: typing.Any
+        :param raised: Whether the frame finished because of an exception.
+        :type raised: bool
+        :return: None
+        """
+
+        frame_id = self._frame_ids.pop(frame, None)
+        if frame_id is not None:
+            return_value = None
+            if not raised:
+                try:
+                    return_value = self.snapshotter.render_value("return", value)
+                except Exception:
+                    pass
+            last_step = self.tracer_info.end_frame(frame_id)
+            self.call_tree.exit(frame_id, len(self.tracer_info), last_step, return_value, raised)
+            self.snapshotter.end_frame(frame_id)
 
     def trace_lines(self):
         """
@@ -331,10 +1170,11 @@ class CodeTracer(object):
         :param self: The instance of the class.
 
         :note:
-            This method sets up a tracing mechanism using `sys.settrace` to track the execution
-            order of lines within the provided code. It populates the `execution_order` list with
-            line numbers in the order they are executed. After tracing is complete, the tracing
-            function is unset using `sys.settrace(None)`.
+            The code is run once under the tracing backend, as for generate_trace_table, so the limits of the
+            tracer apply and `truncated` tells whether one of them stopped the code. It populates
+            `execution_order` with the line numbers of the submitted code, in the order they are executed.
+            Output printed by the code is captured in `output_lines` rather than written to the standard output,
+            and the standard streams are restored afterwards, even if the code raised an exception.
 
         :example:
             Suppose we have an instance of the CodeTracer class and want to trace the execution order
@@ -350,27 +1190,18 @@ class CodeTracer(object):
 
             tracer = CodeTracer(example_code)
             tracer.trace_lines()
-            print("Execution Order:", tracer.execution_order)
+            print("Execution Order:", list(tracer.execution_order))
 
             The output will show the order in which the lines were executed:
 
             '''
-            Value of x: 10
-            Value of y: 15
             Execution Order: [2, 3, 4, 5]
             '''
 
             :return: None
         """
 
-        self.execution_order = []
-        sys.settrace(self.lines_tracer)
-
-        input_stream = io.StringIO(self.user_input)
-
-        sys.stdin = input_stream
-        exec(self.code)
-        sys.settrace(None)
+        self._execute()
 
     def capture_print_statements(self) -> dict:
         """
@@ -382,6 +1213,9 @@ class CodeTracer(object):
         the standard output stream to an instance of OutputLogger, which logs the output along
         with the corresponding line numbers.
 
+        The code is run once under the tracing backend, as for generate_trace_table, since the
+        output is attributed to lines through the steps recorded by the tracer.
+
         :param self: The instance of the class.
         :return: A dictionary mapping line numbers to captured output text.
         :rtype: dict
@@ -404,20 +1238,8 @@ class CodeTracer(object):
             }
         """
 
-        output_logger = OutputLogger()
-        original_stdout = sys.stdout
-
-        sys.stdout = output_logger
-
-        input_stream = io.StringIO(self.user_input)
-
-        sys.stdin = input_stream
-
-        exec(self.code)
-
-        sys.stdout = original_stdout
-
-        return output_logger.output_lines
+        self._execute()
+        return self.output_lines
 
     def generate_trace_table(self):
         """
@@ -430,12 +1252,12 @@ class CodeTracer(object):
         :param self: The instance of the class.
 
         :note:
-            This method builds upon the `trace_lines` method to track the execution order
-            and captures print outputs using `capture_print_statements`. It then prepares
-            the code for execution by formatting it and appending a call to `main()`.
-            The `variables_tracer` tracing mechanism is set up using `sys.settrace`, and
-            the formatted code is executed. After execution is complete, the tracing function
-            is unset using `sys.settrace(None)`.
+            The code is wrapped in a `main()` function by `compile_for_tracing` and executed
+            exactly once. During that single run, the tracing backend (`sys.monitoring` on
+            Python 3.12+, `sys.settrace` otherwise) reports every step, whose line number and
+            variable snapshot are recorded, while an `OutputLogger` on stdout captures the
+            print outputs, so every row of the table comes from the same execution. After
+            execution is complete, the tracing function, stdout and stdin are restored.
 
         :return: None
 
@@ -466,44 +1288,417 @@ class CodeTracer(object):
             | 3     | 10 | 15 | Value of y: 15    |
             +-------+----+----+-------------------+
 
-        :seealso: trace_lines, capture_print_statements, format_code_for_tracing, variables_tracer
+        :note:
+            When the tracer has a `cache` and is_deterministic accepts the code, the trace is looked up in the cache
+            first, under a key made from the code, the input and the options that affect the trace. A cached trace
+            restores `tracer_info`, `execution_order`, `step_outputs`, `call_tree`, `truncated` and `trace_table`
+            without running the code, so `context` stays empty. Every tracer restored from the cache gets its own
+            copy of them. A trace stopped by a limit is not stored when a timeout is set, because which limit is
+            reached first then depends on the speed of the machine, and neither is a trace that shows an object
+            address (see is_reproducible).
+
+        :seealso: step_tracer, compile_for_tracing, snapshot_variables, TraceLimits, TraceCache
         """
 
+        key = None
+        if self.cache is not None:
+            # Only imported when a cache is used, which has already imported the module to create the cache.
+            from .cache import CachedTrace, is_deterministic, is_reproducible
 
-        formatted_code = self.format_code_for_tracing()
+            if is_deterministic(self.code):
+                key = self._cache_key()
+                cached = self.cache.get(key)
+                if cached is not None:
+                    self._restore(cached)
+                    return
 
-        formatted_code += "\n" + "main()"
-        print(formatted_code)
+        self._execute()
+        self._build_trace_table()
 
+        if key is not None and (self.truncated is None or self.limits.timeout is None):
+            trace = CachedTrace(self.tracer_info, self.step_outputs, self.call_tree, self.truncated, self.trace_table)
+            if is_reproducible(trace):
+                self.cache.put(key, trace)
 
-        sys.settrace(self.variables_tracer)
+    def _cache_key(self) -> str:
+        """
+        Get the key the trace of this tracer is cached under.
 
-        input_stream = io.StringIO(self.user_input)
+        :param self: The instance of the class.
+        :return: A hash of the code, the input and every option that affects the trace.
+        :rtype: str
 
-        sys.stdin = input_stream
-        exec(formatted_code)
-        sys.settrace(None)
+        :seealso: cache_key
+        """
 
-        self.trace_lines()
+        options = {
+            "backend": self.backend,
+            "keyframe_interval": self.keyframe_interval,
+            "allow": self.frame_filter.allow,
+            "deny": self.frame_filter.deny,
+            "max_steps": self.limits.max_steps,
+            "timeout": self.limits.timeout,
+            "max_output_bytes": self.limits.max_output_bytes,
+            "max_snapshot_bytes": self.limits.max_snapshot_bytes,
+            "snapshot": self.snapshotter.mode,
+            "change_detection": self.snapshotter.change_detection,
+            "sample_size": self.snapshotter.sample_size,
+        }
+        from .cache import cache_key
+
+        return cache_key(self.code, self.user_input, options)
+
+    def _restore(self, cached: "CachedTrace"):
+        """
+        Take the results of the last trace from a trace found in the cache, instead of running the code.
+
+        :param self: The instance of the class.
+        :param cached: The cached trace, which the tracer takes ownership of.
+        :type cached: CachedTrace
+        :return: None
+
+        :note:
+            When statistics are collected, `stats` is a new TraceStats that only counts the cache hit, since no
+            code was run, rather than the statistics of a previous run.
+        """
+
+        self.stats = stats = TraceStats() if self.collect_stats else None
+        if stats is not None:
+            stats.count("cache_hits")
+        self.tracer_info = cached.tracer_info
+        self.execution_order = self.tracer_info.lines
+        self.step_outputs = cached.step_outputs
+        self.call_tree = cached.call_tree
+        self.truncated = cached.truncated
+        self.context = {}
+        self.trace_table = cached.trace_table
+
+    def iter_steps(self, buffer_size: int = 64) -> typing.Iterator[TraceStep]:
+        """
+        Trace the code, yielding each step as soon as it has been recorded.
+
+        The code runs in a background thread, which hands the steps over through a queue holding at most
+        `buffer_size` steps: once the queue is full, the traced code waits until the caller consumes more steps.
+        When the caller stops iterating (by breaking out of the loop or closing the generator), the traced code
+        is halted by raising TracingStopped at its next event, so no more of it is executed. The limits given to
+        CodeTracer apply as they do to generate_trace_table.
+
+        If the traced code raises an exception, it is re-raised by the generator after the steps recorded before
+        it were yielded. Once every step has been yielded, `trace_table` is built as by generate_trace_table.
+
+        :param self: The instance of the class.
+        :param buffer_size: The maximum number of steps recorded ahead of the caller.
+        :type buffer_size: int
+        :return: An iterator of TraceStep records, in the order the steps finished executing.
+        :rtype: typing.Iterator[TraceStep]
+
+        :Example:
+            Showing the first steps of a long-running program without waiting for it to finish:
+
+            ```python
+            tracer = CodeTracer(example_code, "")
+            for step in tracer.iter_steps():
+                print(step.line, step.changes, step.output)
+                if step.index == 100:
+                    break  # the traced program is halted here
+            ```
+
+        :seealso: generate_trace_table, TraceStep
+        """
+
+        steps = queue.Queue(maxsize=buffer_size)
+        finished = object()
+        failure = []
+
+        def run():
+            try:
+                self._execute(steps.put)
+            except TracingStopped:
+                pass
+            except BaseException as error:
+                failure.append(error)
+            finally:
+                steps.put(finished)
+
+        worker = threading.Thread(target=run, name="pytracertool-iter-steps", daemon=True)
+        worker.start()
+        completed = False
+        try:
+            while True:
+                step = steps.get()
+                if step is finished:
+                    break
+                yield step
+            completed = True
+        finally:
+            if not completed:
+                self._halted_by = TracingStopped()
+                while worker.is_alive():
+                    try:
+                        while True:
+                            steps.get_nowait()
+                    except queue.Empty:
+                        pass
+                    worker.join(0.05)
+
+        worker.join()
+        if failure:
+            raise failure[0]
+        self._build_trace_table()
+
+    def _execute(self, step_sink: typing.Optional[typing.Callable[[TraceStep], None]] = None):
+        """
+        Execute the code once under the tracing backend, recording every step in `tracer_info`.
+
+        :param self: The instance of the class.
+        :param step_sink: A function called with a TraceStep each time a step is recorded.
+        :type step_sink: typing.Optional[typing.Callable[[TraceStep], None]]
+        :return: None
+        """
+
+        self.tracer_info = StepLog(self.keyframe_interval)
+        self.execution_order = self.tracer_info.lines
+        self.call_tree = CallTree()
+        self._pending_lines = {}
+        self._frame_ids = {}
+        self._return_values = {}
+        self._raising = None
+        self.snapshotter.clear()
+        self._step_sink = step_sink
+        self._halted_by = None
+        self.truncated = None
+        self.context = {"__name__": "__main__"}
+        self.stats = stats = TraceStats() if self.collect_stats else None
+        render_hits, render_misses = self.renderer.hits, self.renderer.misses
+
+        backend = get_backend(self.backend, self)
+        traced_code = self.compile_instrumented(backend.reduced) if backend.instrumented else self.compile_for_tracing()
+        original_stdout = sys.stdout
+        original_stdin = sys.stdin
+        output_logger = self._output_logger = OutputLogger(original_stdout, self.limits.max_output_bytes)
+
+        sys.stdout = output_logger
+        sys.stdin = io.StringIO(self.user_input)
+        if self.limits.timeout is not None:
+            self._deadline = time.perf_counter() + self.limits.timeout
+        execute_start = time.perf_counter()
+        backend.start(traced_code)
+        try:
+            exec(traced_code, self.context)
+        except TraceLimitExceeded:
+            pass
+        finally:
+            backend.stop()
+            # Frames still running were stopped by a limit, or are suspended generators (with the "instrument"
+            # backend); their last state is kept in call_tree.
+            for frame_id in self._frame_ids.values():
+                self.call_tree.interrupt(frame_id, self.tracer_info.end_frame(frame_id))
+            self._frame_ids = {}
+            self._return_values = {}
+            self._raising = None
+            if output_logger.pending and self.execution_order:
+                # Output written after the last recorded step, when a limit stopped the code in the middle of a
+                # line, is shown with that step.
+                last = len(self.execution_order) - 1
+                output_logger.end_step(last, self.execution_order[last])
+            if stats is not None:
+                stats.add_time("execute", time.perf_counter() - execute_start)
+                stats.count("render_cache_hits", self.renderer.hits - render_hits)
+                stats.count("render_cache_misses", self.renderer.misses - render_misses)
+                stats.count("output_writes", output_logger.writes)
+                stats.count("output_chars", sum(len(chunk.text) for chunk in output_logger.chunks))
+            sys.stdout = original_stdout
+            sys.stdin = original_stdin
+            self.step_outputs = step_outputs = {}
+            for chunk in output_logger.chunks:
+                step_outputs[chunk.step] = step_outputs.get(chunk.step, "") + chunk.text
+            self._output_logger = None
+            self._step_sink = None
+            self._deadline = None
+
+        halted_by = self._halted_by or output_logger.exceeded
+        if isinstance(halted_by, TraceLimitExceeded):
+            self.truncated = str(halted_by)
+
+    def _build_trace_table(self):
+        """
+        Build `trace_table` from the recorded steps and print outputs, as a columnar TraceTable.
+
+        :param self: The instance of the class.
+        :return: None
+        """
+
+        start = time.perf_counter()
+        self.trace_table = TraceTable.from_steps(self.tracer_info, self.step_outputs, truncated=self.truncated)
+        if self.stats is not None:
+            self.stats.add_time("table", time.perf_counter() - start)
+
+    def _build_row(self, index: int, line: int, entry: dict, variables: typing.List[str]) -> list:
+        """
+        Build the trace table row of a step from its state, for the tables built from the step log rather than
+        read from `trace_table` (folded_trace_table and expand_block).
+
+        :param self: The instance of the class.
+        :param index: The index of the step, used to look up the output it printed.
+        :type index: int
+        :param line: The line number of the step.
+        :type line: int
+        :param entry: The full variable state of the step's frame after the step.
+        :type entry: dict
+        :param variables: The variable columns of the row, in order.
+        :type variables: typing.List[str]
+        :return: The line number, the value of each variable (an empty string if it is not in the state), and the
+                 output of the step.
+        :rtype: list
+        """
+        output = self.step_outputs.get(index, "")
+        return [line] + [entry.get(var,'') for var in variables] + [output]
+
+    def find_loops(self, min_repeats: int = 3, max_period: int = 32) -> typing.List[FoldedBlock]:
+        """
+        Find the runs of steps in which the same sequence of lines repeats, such as the iterations of a loop.
+
+        :param self: The instance of the class.
+        :param min_repeats: The minimum number of iterations for a run to be reported.
+        :type min_repeats: int
+        :param max_period: The maximum number of steps in one iteration.
+        :type max_period: int
+        :return: The runs found in the last trace, in trace order.
+        :rtype: typing.List[FoldedBlock]
+
+        :seealso: find_cycles, folded_trace_table
+        """
+
+        return find_cycles(self.execution_order, min_repeats, max_period)
+
+    def folded_trace_table(self, head: int = 2, tail: int = 1, max_period: int = 32) -> list:
+        """
+        Get the trace table of the last trace with the middle iterations of each loop collapsed into one row.
+
+        For each run of more than `head + tail` iterations found by find_loops, the rows of the first `head` and
+        last `tail` iterations are kept, and the iterations in between are replaced by a single row whose OUTPUT
+        cell counts them. The size of the table therefore follows the structure of the program rather than the
+        number of iterations. Only the rows that are kept are rebuilt from `tracer_info`, so this does not require
+        `trace_table` to have been built.
+
+        :param self: The instance of the class.
+        :param head: The number of leading iterations of each loop kept in full.
+        :type head: int
+        :param tail: The number of trailing iterations of each loop kept in full.
+        :type tail: int
+        :param max_period: The maximum number of steps in one iteration of a loop.
+        :type max_period: int
+        :return: The rows of the table, with the header first. The folded rows appear in the same order as the
+                 blocks returned by find_loops with the same arguments, so expand_block can be used to show one.
+        :rtype: list
+
+        :seealso: find_loops, expand_block
+        """
+
+        variables = sorted(self.tracer_info.variable_names(), key=label_key)
+        table = [["Line"] + variables + ["OUTPUT"]]
+        blocks = self.find_loops(head + tail + 1, max_period)
+
+        kept = []
+        position = 0
+        for block in blocks:
+            kept.append(range(position, block.start))
+            kept.append(range(block.start, block.start + head * block.period))
+            kept.append(block)
+            kept.append(range(block.stop - tail * block.period, block.stop))
+            position = block.stop
+        kept.append(range(position, len(self.tracer_info)))
+
+        for part in kept:
+            if isinstance(part, FoldedBlock):
+                hidden = part.repeats - head - tail
+                lines = ", ".join(str(line) for line in dict.fromkeys(part.lines))
+                table.append(
+                    ["..."] + ['' for var in variables] + [f"[{hidden} more iterations of lines {lines} folded]"]
+                )
+            else:
+                for index in part:
+                    state = self.tracer_info.state_at(index)
+                    table.append(self._build_row(index, self.execution_order[index], state, variables))
+
+        if self.truncated is not None:
+            table.append(["..."] + ['' for var in variables] + [f"[Trace truncated: {self.truncated}]"])
+        return table
+
+    def expand_block(self, block: FoldedBlock) -> list:
+        """
+        Get the full trace table rows of every iteration of a folded loop.
+
+        :param self: The instance of the class.
+        :param block: A block returned by find_loops.
+        :type block: FoldedBlock
+        :return: The rows of the steps in the block, with the same columns as folded_trace_table and without the
+                 header.
+        :rtype: list
+        """
+
+        variables = sorted(self.tracer_info.variable_names(), key=label_key)
+        return [
+            self._build_row(index, self.execution_order[index], self.tracer_info.state_at(index), variables)
+            for index in range(block.start, block.stop)
+        ]
+
+    def save_trace(self, path: str):
+        """
+        Write the last trace to a binary trace file.
 
-        self.output_lines = self.capture_print_statements()
+        The file stores every distinct value once and the steps as per-frame deltas, with an index of the steps, so
+        TraceFile can read any step (or range of steps) without loading the rest of the file.
 
-        variables = set()
-        for entry in self.tracer_info:
-            variables.update(entry.keys())
+        :param self: The instance of the class.
+        :param path: The path of the file to write.
+        :type path: str
+        :return: None
+
+        :Example:
+            ```python
+            tracer.generate_trace_table()
+            tracer.save_trace("trace.bin")
+
+            from PyTracerTool.tracefile import TraceFile
+
+            with TraceFile("trace.bin") as trace:
+                print(trace.header, trace.row(50000))
+            ```
+
+        :seealso: TraceFile, write_trace_file
+        """
 
-        variables = sorted(variables)
-        header = ["Line"] + variables + ["OUTPUT"]
-        print(self.output_lines)
-        self.trace_table = [header]
-        for index, entry in enumerate(self.tracer_info[3:]):
-            currLine = self.execution_order[index]
-            output = ""
+        from .tracefile import write_trace_file
 
-            if str(currLine) in self.output_lines:
-                output = self.output_lines[str(currLine)]
-            #if self.trace_table[-1][0] != currLine:
-            values = [currLine] + [entry.get(var,'') for var in variables] + [output]
-            self.trace_table.append(values)
+        outputs = [self.step_outputs.get(index, "") for index in range(len(self.execution_order))]
+        write_trace_file(path, self.tracer_info, outputs, self.truncated)
+
+    def diff(self, reference: typing.Union["CodeTracer", "TraceIndex", "TraceFile"]) -> "TraceDiff":
+        """
+        Align the steps of the last trace with those of a reference trace, and report how they differ.
+
+        :param self: The instance of the class.
+        :param reference: The reference trace: a traced CodeTracer, a TraceFile, or a TraceIndex of either, which
+                          can be reused to compare many traces against the same reference.
+        :type reference: typing.Union[CodeTracer, TraceIndex, TraceFile]
+        :return: The alignment of the traces, their first divergence and their output mismatches.
+        :rtype: TraceDiff
+
+        :Example:
+            ```python
+            from PyTracerTool.diff import TraceIndex
+
+            reference = TraceIndex(model_tracer)
+            for tracer in submissions:
+                tracer.generate_trace_table()
+                result = tracer.diff(reference)
+                print(result.first_divergence, result.differing_variables, result.output_equal)
+            ```
+
+        :seealso: diff_traces, TraceIndex
+        """
 
+        from .diff import diff_traces
 
+        return diff_traces(reference, self)
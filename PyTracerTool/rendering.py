@@ -0,0 +1,169 @@
+"""
+Value rendering for PyTracerTool
+
+Turning variable values into the strings shown in the trace table (including the attribute grid drawn with
+tabulate for objects) is the most expensive part of taking a snapshot. ValueRenderer renders each distinct value
+once and keeps the result in a size-bounded LRU cache, so the same value seen on later steps is not rendered
+again.
+
+Classes:
+    - ValueRenderer: Renders variable names and values for the trace table, caching the results.
+"""
+
+import collections
+import typing
+
+
+_CACHEABLE_TYPES = (int, bool, str, bytes, type(None))
+
+
+class ValueRenderer(object):
+    """
+    ValueRenderer renders variable names and values for the trace table, caching the rendered strings.
+
+    Values are rendered as plain text; escaping for a display format, such as HTML, is left to TableRenderer.
+
+    Values are cached by content rather than identity, because the snapshots being rendered are copies of the
+    traced variables:
+
+        - Immutable scalars (int, bool, str, bytes, None) and flat tuples of them are keyed by their type and value.
+        - Objects, which are rendered as a grid of their attributes, are keyed by their type and the type and
+          string form of every attribute, so only the tabulate call is saved and a changed attribute is never
+          missed.
+
+    Other values (lists, dicts, floats, ...) are rendered every time, since no cheap key identifies what their
+    rendered string will be. The cache holds at most `max_entries` values; the least recently used entry is
+    evicted first.
+
+    Methods:
+        __init__(max_entries): Initialise a ValueRenderer with an empty cache.
+        label(function_name, var): Render the column label of a variable.
+        render(var, value): Render the value of a variable, or return None if it is not shown.
+        clear(): Empty the cache.
+
+    Attributes:
+        max_entries: The maximum number of rendered values kept in the cache.
+        hits: The number of values served from the cache.
+        misses: The number of cacheable values that had to be rendered.
+    """
+
+    def __init__(self, max_entries: int = 4096):
+        """
+        Initialise a new instance of ValueRenderer.
+
+        :param self: The instance of the class.
+        :param max_entries: The maximum number of rendered values kept in the cache; 0 disables caching.
+        :type max_entries: int
+        """
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._cache = collections.OrderedDict()
+        self._labels = {}
+
+    def label(self, function_name: str, var: str) -> str:
+        """
+        Render the column label of a variable, such as "(main)x".
+
+        :param self: The instance of the class.
+        :param function_name: The name of the function the variable belongs to.
+        :type function_name: str
+        :param var: The name of the variable.
+        :type var: str
+        :return: The label of the variable.
+        :rtype: str
+        """
+        key = (function_name, var)
+        label = self._labels.get(key)
+        if label is None:
+            label = self._labels[key] = f"({function_name}){var}"
+        return label
+
+    def render(self, var: str, value: typing.Any) -> typing.Optional[str]:
+        """
+        Render the value of a variable.
+
+        Functions are not shown. Objects (other than `self` and iterators) are rendered as a grid of their
+        attributes; every other value is rendered as its string form.
+
+        :param self: The instance of the class.
+        :param var: The name of the variable.
+        :type var: str
+        :param value: The value of the variable.
+        :type value: typing.Any
+        :return: The rendered value, or None if the variable should not be shown.
+        :rtype: typing.Optional[str]
+        """
+        key = self._scalar_key(value)
+        if key is not None:
+            return self._cached(key, value, var)
+
+        text = str(value)
+        if "function" in text:
+            return None
+        if (
+            "object" in text and var != "self"
+            and "_iterator object at 0x" not in text
+            and hasattr(value, "__dict__")
+        ):
+            attributes = vars(value)
+            key = (
+                type(value),
+                tuple(attributes),
+                tuple((type(attribute), str(attribute)) for attribute in attributes.values()),
+            )
+            return self._cached(key, value, var, text)
+
+        return text
+
+    def clear(self):
+        """
+        Empty the cache.
+
+        :param self: The instance of the class.
+        :return: None
+        """
+        self._cache.clear()
+        self._labels.clear()
+
+    @staticmethod
+    def _scalar_key(value: typing.Any) -> typing.Optional[tuple]:
+        value_type = type(value)
+        if value_type in _CACHEABLE_TYPES:
+            return (value_type, value)
+        if value_type is tuple and all(type(item) in _CACHEABLE_TYPES for item in value):
+            return (tuple, tuple(map(type, value)), value)
+        return None
+
+    def _cached(self, key: tuple, value: typing.Any, var: str, text: typing.Optional[str] = None) -> typing.Optional[str]:
+        cache = self._cache
+        if key in cache:
+            self.hits += 1
+            cache.move_to_end(key)
+            return cache[key]
+
+        self.misses += 1
+        rendered = self._render_uncached(var, value, text)
+        if self.max_entries > 0:
+            cache[key] = rendered
+            if len(cache) > self.max_entries:
+                cache.popitem(last=False)
+        return rendered
+
+    @staticmethod
+    def _render_uncached(var: str, value: typing.Any, text: typing.Optional[str] = None) -> typing.Optional[str]:
+        if text is None:
+            text = str(value)
+        if "function" in text:
+            return None
+        if (
+            "object" in text and var != "self"
+            and "_iterator object at 0x" not in text
+            and hasattr(value, "__dict__")
+        ):
+            # tabulate is imported on first use, so tracing programs without objects does not load it.
+            import tabulate
+
+            attributes = vars(value)
+            return tabulate.tabulate([attributes.keys(), attributes.values()], tablefmt="grid")
+        return text
@@ -0,0 +1,312 @@
+"""
+Snapshot policies for PyTracerTool
+
+Every step takes a snapshot of the variables of a frame: the values are copied, then rendered to the strings shown
+in the trace table. Copying and rendering a large container costs time proportional to its size, so a program
+that keeps a large list in a variable pays that cost on every step, even when the list does not change. Snapshotter
+takes snapshots under a configurable policy:
+
+    - The snapshot mode decides how values are captured before being rendered:
+        - "deep" copies them with copy.deepcopy, falling back to the value itself when it cannot be copied. Values
+          deepcopy would return as they are (numbers, strings, functions, ...) are not passed to it.
+        - "shallow" renders the live values without copying them, which also works for values that cannot be
+          copied, such as files, generators and locks.
+        - "repr" renders the live values with reprlib, which bounds the size (and cost) of every rendered value and
+          shows objects by their repr rather than as a grid of their attributes.
+    - Change detection decides when a value can be assumed unchanged since the previous step of the same frame,
+      so its previous rendering is reused instead of copying and rendering it again:
+        - "exact" applies to the builtin containers (list, tuple, dict, set, frozenset) whose items are all
+          immutable scalars. The container is unchanged when it holds the same item objects, in the same order,
+          as when it was last rendered, which is checked by identity without rendering anything.
+        - "sampled" does the same for dicts and sets, but only checks the length of lists and tuples and the
+          identity of `sample_size` of their items spread over the container, so checking a large list costs
+          the same as checking a small one. A change to an item that is not sampled is missed until the next
+          change that is.
+        - "off" renders every value on every step.
+
+Unchanged values share the same rendered string object across consecutive snapshots, and the StepLog only stores
+the values that changed, so a large container that is not modified is rendered once and stored once.
+
+Classes:
+    - Snapshotter: Takes rendered snapshots of the variables of frames under a snapshot policy.
+"""
+
+import operator
+import reprlib
+import sys
+import time
+import types
+import typing
+
+
+SNAPSHOT_MODES = ("deep", "shallow", "repr")
+CHANGE_DETECTION_MODES = ("exact", "sampled", "off")
+
+_SCALAR_TYPES = frozenset({int, float, complex, bool, str, bytes, type(None)})
+_SEQUENCE_TYPES = (list, tuple)
+_CONTAINER_TYPES = frozenset({list, tuple, dict, set, frozenset})
+# The types copy.deepcopy returns as they are, so a snapshot need not copy them.
+_ATOMIC_TYPES = _SCALAR_TYPES | {
+    type, range, property, types.FunctionType, types.BuiltinFunctionType, types.CodeType, type(Ellipsis),
+    type(NotImplemented),
+}
+_MISSING = object()
+
+
+def _try_deepcopy(value: typing.Any) -> typing.Any:
+    """
+    Deep-copy a value, or return the value itself if it cannot be copied.
+
+    Some objects (modules, generators, file handles, objects holding locks, ...) cannot be deep-copied. Rendering
+    the live object is better than dropping the variable, or failing the whole snapshot.
+
+    :param value: The value to copy.
+    :type value: typing.Any
+    :return: A deep copy of the value, or the value itself.
+    :rtype: typing.Any
+    """
+    import copy
+
+    try:
+        return copy.deepcopy(value)
+    except Exception:
+        return value
+
+
+def _is_flat(items: typing.Iterable) -> bool:
+    return all(type(item) in _SCALAR_TYPES for item in items)
+
+
+def _same_items(previous: tuple, current: typing.Iterable) -> bool:
+    return all(map(operator.is_, previous, current))
+
+
+class Snapshotter(object):
+    """
+    Snapshotter takes rendered snapshots of the variables of frames under a snapshot policy.
+
+    The last rendering of every tracked container is remembered per frame and variable, along with the item
+    objects it was rendered from, until the frame ends.
+
+    Methods:
+        __init__(renderer, mode, change_detection, sample_size): Initialise a Snapshotter.
+        snapshot(frame, frame_id, stats, scope): Take a rendered snapshot of the local variables of a frame.
+        render_value(var, value): Render a single live value.
+        end_frame(frame_id): Forget what was remembered about a frame that has finished executing.
+        clear(): Forget what was remembered about every frame.
+
+    Attributes:
+        renderer: The ValueRenderer rendering the values in the "deep" and "shallow" modes.
+        mode: "deep", "shallow" or "repr".
+        change_detection: "exact", "sampled" or "off".
+        sample_size: The number of items checked per list or tuple by "sampled" change detection.
+        reused: The number of values whose previous rendering was reused.
+    """
+
+    def __init__(self, renderer, mode: str = "deep", change_detection: str = "exact", sample_size: int = 16):
+        """
+        Initialise a new instance of Snapshotter.
+
+        :param self: The instance of the class.
+        :param renderer: The ValueRenderer rendering the values.
+        :type renderer: ValueRenderer
+        :param mode: "deep", "shallow" or "repr".
+        :type mode: str
+        :param change_detection: "exact", "sampled" or "off".
+        :type change_detection: str
+        :param sample_size: The number of items checked per list or tuple by "sampled" change detection.
+        :type sample_size: int
+        :raises ValueError: If the mode or the change detection is unknown.
+        """
+        if mode not in SNAPSHOT_MODES:
+            raise ValueError(f"Unknown snapshot mode: {mode!r}, expected one of {', '.join(SNAPSHOT_MODES)}")
+        if change_detection not in CHANGE_DETECTION_MODES:
+            raise ValueError(
+                f"Unknown change detection: {change_detection!r}, expected one of {', '.join(CHANGE_DETECTION_MODES)}"
+            )
+
+        self.renderer = renderer
+        self.mode = mode
+        self.change_detection = change_detection
+        self.sample_size = max(sample_size, 1)
+        self.reused = 0
+        self._known = {}
+        self._repr = reprlib.Repr()
+        self._repr.maxstring = 80
+        self._repr.maxother = 80
+
+    def snapshot(
+        self, frame: types.FrameType, frame_id: int, stats=None, scope: typing.Optional[str] = None
+    ) -> dict:
+        """
+        Take a rendered snapshot of the local variables of a frame.
+
+        :param self: The instance of the class.
+        :param frame: The frame whose local variables are captured.
+        :type frame: types.FrameType
+        :param frame_id: The id of the frame in the step log.
+        :type frame_id: int
+        :param stats: The TraceStats of the run, or None.
+        :type stats: typing.Optional[TraceStats]
+        :param scope: The name the variables are labelled with; defaults to the name of the frame's function.
+        :type scope: typing.Optional[str]
+        :return: A dictionary mapping "(scope)variable" labels to the rendered variable values.
+        :rtype: dict
+        """
+        function_name = scope or frame.f_code.co_name
+        local_variables = dict(frame.f_locals)
+
+        # Only the variables holding a tracked container are checked; everything else is rendered again.
+        known = self._known.get(frame_id)
+        reused = {}
+        if known:
+            for var, previous in list(known.items()):
+                value = local_variables.get(var, _MISSING)
+                if value is _MISSING:
+                    del known[var]
+                elif self._unchanged(previous, value):
+                    reused[var] = previous[2]
+            to_copy = {var: value for var, value in local_variables.items() if var not in reused}
+        else:
+            to_copy = local_variables
+
+        copied = self._copy(to_copy, stats) if self.mode == "deep" else to_copy
+        if stats is not None:
+            render_start = time.perf_counter()
+
+        detect = self.change_detection != "off"
+        render = self._render_repr if self.mode == "repr" else self.renderer.render
+        label = self.renderer.label
+        vars_in_context = {}
+        rendered_count = 0
+        for var, value in local_variables.items():
+            if reused and var in reused:
+                rendered = reused[var]
+            else:
+                if var[:2] == "__" and var[-2:] == "__":
+                    continue
+                rendered = render(var, copied[var])
+                rendered_count += 1
+                if type(value) in _CONTAINER_TYPES:
+                    if detect:
+                        if known is None:
+                            known = self._known[frame_id] = {}
+                        self._remember(known, var, value, rendered)
+                elif known and var in known:
+                    del known[var]
+            if rendered is not None:
+                vars_in_context[label(function_name, var)] = rendered
+
+        self.reused += len(reused)
+        if stats is not None:
+            stats.add_time("render", time.perf_counter() - render_start)
+            stats.count("values_rendered", rendered_count)
+            stats.count("values_reused", len(reused))
+        return vars_in_context
+
+    def render_value(self, var: str, value: typing.Any) -> typing.Optional[str]:
+        """
+        Render a single live value, such as the value returned by a frame, as the snapshot mode renders variables.
+
+        :param self: The instance of the class.
+        :param var: The name the value is rendered under.
+        :type var: str
+        :param value: The value.
+        :type value: typing.Any
+        :return: The rendered value, or None for values that are not shown (such as functions).
+        :rtype: typing.Optional[str]
+        """
+        if self.mode == "repr":
+            return self._render_repr(var, value)
+        return self.renderer.render(var, value)
+
+    def end_frame(self, frame_id: int):
+        """
+        Forget what was remembered about a frame that has finished executing.
+
+        :param self: The instance of the class.
+        :param frame_id: The id of the frame.
+        :type frame_id: int
+        :return: None
+        """
+        self._known.pop(frame_id, None)
+
+    def clear(self):
+        """
+        Forget what was remembered about every frame.
+
+        :param self: The instance of the class.
+        :return: None
+        """
+        self._known.clear()
+        self.reused = 0
+
+    def _copy(self, values: dict, stats=None) -> dict:
+        # Immutable scalars and functions are their own copies, so only the other values go through deepcopy.
+        mutable = {}
+        for var, value in values.items():
+            if type(value) not in _ATOMIC_TYPES:
+                mutable[var] = value
+        if not mutable:
+            return values
+        # Imported on the first copy rather than with the module: copy takes long to import, and is not needed by the
+        # "shallow" and "repr" modes, or by code whose variables are all immutable.
+        import copy
+
+        if stats is not None:
+            copy_start = time.perf_counter()
+
+        try:
+            copied = copy.deepcopy(mutable)
+            copied_whole = True
+        except Exception:
+            copied = {var: _try_deepcopy(value) for var, value in mutable.items()}
+            copied_whole = False
+
+        if stats is not None:
+            stats.add_time("deepcopy", time.perf_counter() - copy_start)
+            stats.count("deepcopies" if copied_whole else "deepcopy_fallbacks")
+            stats.count("copied_bytes", sum(map(sys.getsizeof, mutable.values())))
+        if len(copied) == len(values):
+            return copied
+        return {**values, **copied}
+
+    def _render_repr(self, var: str, value: typing.Any) -> typing.Optional[str]:
+        if type(value) is str:
+            return value if len(value) <= self._repr.maxstring else value[:self._repr.maxstring - 3] + "..."
+        text = self._repr.repr(value)
+        if "function" in text:
+            return None
+        return text
+
+    def _remember(self, known: dict, var: str, value: typing.Any, rendered: typing.Optional[str]):
+        value_type = type(value)
+        if value_type is not dict:
+            items = tuple(value)
+            if _is_flat(items):
+                known[var] = (value_type, items, rendered)
+                return
+        else:
+            keys, items = tuple(value), tuple(value.values())
+            if _is_flat(keys) and _is_flat(items):
+                known[var] = (value_type, (keys, items), rendered)
+                return
+        known.pop(var, None)
+
+    def _unchanged(self, previous: tuple, value: typing.Any) -> bool:
+        value_type, items, _ = previous
+        if type(value) is not value_type:
+            return False
+
+        if value_type is dict:
+            keys, values = items
+            return len(value) == len(keys) and _same_items(keys, value) and _same_items(values, value.values())
+
+        if len(value) != len(items):
+            return False
+        if self.change_detection == "sampled" and value_type in _SEQUENCE_TYPES:
+            step = max(len(items) // self.sample_size, 1)
+            return all(value[index] is items[index] for index in range(0, len(items), step)) and (
+                not items or value[-1] is items[-1]
+            )
+        return _same_items(items, value)
@@ -0,0 +1,261 @@
+"""
+Tracer statistics for PyTracerTool
+
+When a trace is slow, the time may have gone to the traced code itself, to copying its variables, to rendering
+their values, to capturing its output or to building the trace table. TraceStats collects the counters and timings
+needed to tell these apart. It is opt-in: a CodeTracer created with `collect_stats=True` fills a new TraceStats on
+every run, and leaves `stats` set to None otherwise, so tracing without statistics pays nothing for them.
+
+Classes:
+    - Histogram: A distribution of durations in power-of-two microsecond buckets.
+    - LineStats: The counters and timing histograms of one traced line.
+    - TraceStats: The counters, phase timings, per-line and per-frame statistics of a run.
+"""
+
+import collections
+import time
+import typing
+
+
+class Histogram(object):
+    """
+    Histogram records a distribution of durations in power-of-two buckets.
+
+    A duration of d microseconds is counted in the bucket whose upper bound is the smallest power of two greater
+    than d (bucket 1 holds durations under 1us, bucket 2 those from 1us to 2us, and so on).
+
+    Methods:
+        add(seconds): Record a duration.
+        as_dict(): Get the histogram as a JSON-compatible dictionary.
+
+    Attributes:
+        count: The number of durations recorded.
+        total: The sum of the durations, in seconds.
+        minimum: The shortest duration, in seconds, or None.
+        maximum: The longest duration, in seconds, or None.
+        buckets: The number of durations in each bucket, keyed by the bucket's upper bound in microseconds.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.minimum = None
+        self.maximum = None
+        self.buckets = collections.Counter()
+
+    def __repr__(self) -> str:
+        return f"Histogram(count={self.count}, total={self.total:.6f})"
+
+    def add(self, seconds: float):
+        """
+        Record a duration.
+
+        :param self: The instance of the class.
+        :param seconds: The duration, in seconds.
+        :type seconds: float
+        :return: None
+        """
+        self.count += 1
+        self.total += seconds
+        if self.minimum is None or seconds < self.minimum:
+            self.minimum = seconds
+        if self.maximum is None or seconds > self.maximum:
+            self.maximum = seconds
+        self.buckets[1 << int(seconds * 1e6).bit_length()] += 1
+
+    def as_dict(self) -> dict:
+        """
+        Get the histogram as a JSON-compatible dictionary.
+
+        :param self: The instance of the class.
+        :return: The count, total, minimum, maximum and mean (in seconds) and the buckets (keyed by their upper bound
+                 in microseconds, as strings).
+        :rtype: dict
+        """
+        return {
+            "count": self.count,
+            "total": self.total,
+            "minimum": self.minimum,
+            "maximum": self.maximum,
+            "mean": self.total / self.count if self.count else None,
+            "buckets_us": {str(bound): self.buckets[bound] for bound in sorted(self.buckets)},
+        }
+
+
+class LineStats(object):
+    """
+    LineStats holds the counters and timings of one traced line.
+
+    Methods:
+        as_dict(): Get the statistics of the line as a JSON-compatible dictionary.
+
+    Attributes:
+        steps: The number of steps recorded for the line.
+        run: A Histogram of the time spent running the traced code (and anything it called) while the line was the
+             one executing, excluding the time spent in the tracer; one duration per stretch between two events.
+        record: A Histogram of the time spent recording each step of the line (copying, rendering and storing the
+                variables).
+        run_time: The total of `run`, in seconds.
+        record_time: The total of `record`, in seconds.
+    """
+
+    __slots__ = ("steps", "run", "record")
+
+    def __init__(self):
+        self.steps = 0
+        self.run = Histogram()
+        self.record = Histogram()
+
+    def __repr__(self) -> str:
+        return f"LineStats(steps={self.steps}, run_time={self.run_time:.6f}, record_time={self.record_time:.6f})"
+
+    @property
+    def run_time(self) -> float:
+        return self.run.total
+
+    @property
+    def record_time(self) -> float:
+        return self.record.total
+
+    def as_dict(self) -> dict:
+        """
+        Get the statistics of the line as a JSON-compatible dictionary.
+
+        :param self: The instance of the class.
+        :return: The steps, the run and record totals (in seconds) and the run and record histograms.
+        :rtype: dict
+        """
+        return {
+            "steps": self.steps,
+            "run_time": self.run_time,
+            "record_time": self.record_time,
+            "run": self.run.as_dict(),
+            "record": self.record.as_dict(),
+        }
+
+
+class TraceStats(object):
+    """
+    TraceStats holds the statistics of one run of a CodeTracer.
+
+    Counters (in `counters`):
+        steps: Steps recorded.
+        events: Call, line and return events received from the backend.
+        deepcopies: Snapshots whose variables were deep-copied in one go (only the values that changed are copied).
+        deepcopy_fallbacks: Snapshots that had to be copied variable by variable, because one variable could not be
+                            deep-copied.
+        copied_bytes: The shallow size (sys.getsizeof) of the variables copied, summed over every snapshot.
+        values_rendered: Variable values rendered.
+        values_reused: Variable values whose rendering was reused from the previous step, because they did not
+                       change.
+        render_cache_hits, render_cache_misses: Lookups in the ValueRenderer cache during the run.
+        output_writes: Calls to the OutputLogger's write().
+        output_chars: Characters of output captured.
+        cache_hits: 1 when the trace was restored from a TraceCache instead of being run, in which case no other
+                    statistic is collected.
+
+    Phases (in `phases`, as a Histogram of durations):
+        execute: The whole run of the traced code, including the tracer (one sample per run).
+        step: Recording one step.
+        deepcopy: Copying the variables of one snapshot.
+        render: Rendering the values of one snapshot.
+        table: Building the trace table (one sample per build).
+
+    Methods:
+        count(name, amount): Increase a counter.
+        add_time(phase, seconds): Record the duration of a phase.
+        line(line_number): Get the statistics of a line.
+        as_dict(): Get the statistics as a JSON-compatible dictionary.
+
+    Attributes:
+        counters: The counters, by name.
+        phases: A Histogram of durations for each phase, by name.
+        lines: The LineStats of each traced line, by line number, with histograms of its run and record times.
+        frame_events: The number of events received for the frames of each function, by function name.
+    """
+
+    def __init__(self):
+        self.counters = collections.Counter()
+        self.phases = collections.defaultdict(Histogram)
+        self.lines = {}
+        self.frame_events = collections.Counter()
+        self._current_line = None
+        self._resumed = None
+
+    def __repr__(self) -> str:
+        return (
+            f"TraceStats(steps={self.counters['steps']}, events={self.counters['events']}, "
+            f"lines={len(self.lines)})"
+        )
+
+    def count(self, name: str, amount: int = 1):
+        """
+        Increase a counter.
+
+        :param self: The instance of the class.
+        :param name: The name of the counter.
+        :type name: str
+        :param amount: The amount to add.
+        :type amount: int
+        :return: None
+        """
+        self.counters[name] += amount
+
+    def add_time(self, phase: str, seconds: float):
+        """
+        Record the duration of a phase.
+
+        :param self: The instance of the class.
+        :param phase: The name of the phase.
+        :type phase: str
+        :param seconds: The duration, in seconds.
+        :type seconds: float
+        :return: None
+        """
+        self.phases[phase].add(seconds)
+
+    def line(self, line_number: int) -> LineStats:
+        """
+        Get the statistics of a line, creating them on first use.
+
+        :param self: The instance of the class.
+        :param line_number: The line number.
+        :type line_number: int
+        :return: The statistics of the line.
+        :rtype: LineStats
+        """
+        stats = self.lines.get(line_number)
+        if stats is None:
+            stats = self.lines[line_number] = LineStats()
+        return stats
+
+    def as_dict(self) -> dict:
+        """
+        Get the statistics as a JSON-compatible dictionary, for example to send to a monitoring system.
+
+        :param self: The instance of the class.
+        :return: The counters, phases, lines (keyed by line number, as strings) and frame events.
+        :rtype: dict
+        """
+        return {
+            "counters": dict(self.counters),
+            "phases": {name: histogram.as_dict() for name, histogram in self.phases.items()},
+            "lines": {str(number): self.lines[number].as_dict() for number in sorted(self.lines)},
+            "frame_events": dict(self.frame_events),
+        }
+
+    def _event(self, function_name: str) -> float:
+        # Called when the tracer takes over from the traced code: the time since it last handed back control is
+        # charged to the line that was executing.
+        now = time.perf_counter()
+        self.counters["events"] += 1
+        self.frame_events[function_name] += 1
+        if self._resumed is not None and self._current_line is not None:
+            self.line(self._current_line).run.add(now - self._resumed)
+        return now
+
+    def _resume(self, line_number: typing.Optional[int]):
+        # Called when the tracer hands control back to the traced code, which continues on `line_number`.
+        if line_number is not None:
+            self._current_line = line_number
+        self._resumed = time.perf_counter()
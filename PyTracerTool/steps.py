@@ -0,0 +1,312 @@
+"""
+Compact step storage for PyTracerTool
+
+Storing a full snapshot of every variable on every step makes memory grow as O(steps x variables). StepLog
+instead stores, for each step, only the variables that changed since the previous step of the same frame, plus a
+full keyframe every `keyframe_interval` steps of a frame. The full state at any step is rebuilt on demand from the
+nearest keyframe, so random access costs at most `keyframe_interval` deltas.
+
+Classes:
+    - TraceStep: A typed record describing one traced step, as yielded by CodeTracer.iter_steps().
+    - StepLog: A sequence of steps (line number + variable state) stored as per-frame deltas and keyframes.
+"""
+
+import array
+import typing
+
+
+_NO_CHANGES = ({}, ())
+
+
+def _encoded_size(values: typing.Iterable[str]) -> int:
+    # isascii() only reads a flag of the string, so only the values that are not ASCII are encoded to be measured.
+    # A plain loop, as most deltas hold a single value and a generator would cost more than measuring it.
+    size = 0
+    for value in values:
+        size += len(value) if value.isascii() else len(value.encode("utf-8", "surrogatepass"))
+    return size
+
+
+class TraceStep(typing.NamedTuple):
+    """
+    TraceStep describes one traced step: a line that finished executing.
+
+    Attributes:
+        index: The position of the step in the trace, starting at 0.
+        line: The line number that was executed.
+        changes: The variables whose rendered value changed during the step, mapped to their new value. The
+            dictionary belongs to the TraceStep: modifying it does not change the trace.
+        output: The text printed since the previous step.
+        depth: The call depth of the frame that executed the line; 0 for the top level of the code.
+        frame_id: The id of the frame that executed the line.
+    """
+
+    index: int
+    line: int
+    changes: dict
+    output: str
+    depth: int
+    frame_id: int
+
+
+class StepLog(object):
+    """
+    StepLog stores the line number and variable state of every traced step as per-frame deltas.
+
+    Each step belongs to a frame, identified by an integer frame id. The first step of a frame, and every
+    `keyframe_interval`-th step after that, is stored as a keyframe holding the full state. The other steps store
+    a delta: the variables whose rendered value changed, and the variables that disappeared, since the previous
+    step of the same frame.
+
+    Indexing (`log[i]`) and iteration return the full state of a step as a dictionary, so a StepLog can be used
+    wherever a list of snapshots was used before.
+
+    Methods:
+        __init__(keyframe_interval): Initialise an empty StepLog.
+        append(frame_id, line, state): Record a step and return the variables that changed.
+        append_changes(frame_id, line, values): Record a step from the variables it assigned.
+        end_frame(frame_id): Forget the last state of a frame that has finished executing, and return the index of its last step.
+        state_at(index): Rebuild the full state at a step.
+        changes_at(index): Get the variables that changed at a step.
+        variable_names(): Get the names of every variable recorded in any step.
+        iter_changes(): Iterate over (line, frame id, changes) for every step.
+        iter_entries(): Iterate over the stored keyframes and deltas of every step.
+
+    Attributes:
+        keyframe_interval: The number of steps of a frame between two keyframes.
+        lines: An array with the line number of every step.
+        frame_ids: An array with the frame id of every step.
+        previous: An array with the index of the previous step of the same frame, or -1.
+        stored_size: The total size, in bytes (UTF-8 encoded), of the values stored in keyframes and deltas.
+    """
+
+    def __init__(self, keyframe_interval: int = 32):
+        """
+        Initialise a new, empty instance of StepLog.
+
+        :param self: The instance of the class.
+        :param keyframe_interval: The number of steps of a frame between two keyframes.
+        :type keyframe_interval: int
+        """
+        if keyframe_interval < 1:
+            raise ValueError("keyframe_interval must be at least 1")
+
+        self.keyframe_interval = keyframe_interval
+        self.lines = array.array("l")
+        self.frame_ids = array.array("l")
+        self.previous = array.array("l")
+        self.stored_size = 0
+        self._entries = []
+        self._frame_states = {}
+
+    def __len__(self) -> int:
+        return len(self.lines)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.state_at(i) for i in range(*index.indices(len(self)))]
+        return self.state_at(index)
+
+    def __iter__(self) -> typing.Iterator[dict]:
+        states = {}
+        for frame_id, entry in zip(self.frame_ids, self._entries):
+            if isinstance(entry, dict):
+                state = dict(entry)
+            else:
+                changed, removed = entry
+                state = dict(states[frame_id])
+                state.update(changed)
+                for name in removed:
+                    del state[name]
+            states[frame_id] = state
+            yield dict(state)
+
+    def append(self, frame_id: int, line: int, state: dict) -> dict:
+        """
+        Record a step.
+
+        :param self: The instance of the class.
+        :param frame_id: The id of the frame the step belongs to.
+        :type frame_id: int
+        :param line: The line number of the step.
+        :type line: int
+        :param state: The full variable state of the frame after the step.
+        :type state: dict
+        :return: The variables whose value changed since the previous step of the frame (all of them on the first
+                 step of a frame). The dictionary may be the one stored in the log, so it must not be modified.
+        :rtype: dict
+        """
+        index = len(self.lines)
+        last = self._frame_states.get(frame_id)
+
+        if last is None:
+            changed = dict(state)
+            self._entries.append(changed)
+            self.previous.append(-1)
+            self.stored_size += _encoded_size(changed.values())
+            since_keyframe = 0
+        else:
+            last_index, last_state, since_keyframe = last
+            changed = {
+                name: value for name, value in state.items()
+                if name not in last_state or last_state[name] != value
+            }
+            since_keyframe += 1
+            if since_keyframe >= self.keyframe_interval:
+                self._entries.append(dict(state))
+                self.stored_size += _encoded_size(state.values())
+                since_keyframe = 0
+            else:
+                removed = tuple(name for name in last_state if name not in state)
+                self._entries.append((changed, removed) if changed or removed else _NO_CHANGES)
+                self.stored_size += _encoded_size(changed.values())
+            self.previous.append(last_index)
+
+        self.lines.append(line)
+        self.frame_ids.append(frame_id)
+        self._frame_states[frame_id] = (index, state, since_keyframe)
+        return changed
+
+    def append_changes(self, frame_id: int, line: int, values: dict) -> dict:
+        """
+        Record a step from the variables it assigned; the frame's other variables keep their last values.
+
+        The cost depends on the number of variables assigned rather than on the size of the frame's state, except
+        at keyframes.
+
+        :param self: The instance of the class.
+        :param frame_id: The id of the frame the step belongs to.
+        :type frame_id: int
+        :param line: The line number of the step.
+        :type line: int
+        :param values: The variables assigned by the step, with their values.
+        :type values: dict
+        :return: The variables whose value changed since the previous step of the frame. The dictionary may be the
+                 one stored in the log, so it must not be modified.
+        :rtype: dict
+        """
+        last = self._frame_states.get(frame_id)
+        if last is None:
+            return self.append(frame_id, line, dict(values))
+
+        last_index, state, since_keyframe = last
+        changed = {name: value for name, value in values.items() if state.get(name) != value}
+        # The frame's last state is only referenced from here, so it is brought up to date in place.
+        state.update(changed)
+        since_keyframe += 1
+        if since_keyframe >= self.keyframe_interval:
+            self._entries.append(dict(state))
+            self.stored_size += _encoded_size(state.values())
+            since_keyframe = 0
+        else:
+            self._entries.append((changed, ()) if changed else _NO_CHANGES)
+            self.stored_size += _encoded_size(changed.values())
+
+        index = len(self.lines)
+        self.previous.append(last_index)
+        self.lines.append(line)
+        self.frame_ids.append(frame_id)
+        self._frame_states[frame_id] = (index, state, since_keyframe)
+        return changed
+
+    def end_frame(self, frame_id: int) -> typing.Optional[int]:
+        """
+        Forget the last state of a frame that has finished executing.
+
+        :param self: The instance of the class.
+        :param frame_id: The id of the frame.
+        :type frame_id: int
+        :return: The index of the frame's last step, or None if it recorded no step.
+        :rtype: typing.Optional[int]
+        """
+        last = self._frame_states.pop(frame_id, None)
+        return last[0] if last is not None else None
+
+    def state_at(self, index: int) -> dict:
+        """
+        Rebuild the full variable state at a step.
+
+        :param self: The instance of the class.
+        :param index: The index of the step; negative indices count from the end.
+        :type index: int
+        :return: The full variable state of the step's frame after the step.
+        :rtype: dict
+        :raises IndexError: If the index is out of range.
+        """
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("step index out of range")
+
+        chain = []
+        while not isinstance(self._entries[index], dict):
+            chain.append(self._entries[index])
+            index = self.previous[index]
+
+        state = dict(self._entries[index])
+        for changed, removed in reversed(chain):
+            state.update(changed)
+            for name in removed:
+                del state[name]
+        return state
+
+    def changes_at(self, index: int) -> dict:
+        """
+        Get the variables that changed at a step.
+
+        :param self: The instance of the class.
+        :param index: The index of the step.
+        :type index: int
+        :return: The variables whose value changed since the previous step of the same frame.
+        :rtype: dict
+        """
+        if index < 0:
+            index += len(self)
+        entry = self._entries[index]
+        if not isinstance(entry, dict):
+            return dict(entry[0])
+
+        previous = self.previous[index]
+        if previous == -1:
+            return dict(entry)
+        last_state = self.state_at(previous)
+        return {name: value for name, value in entry.items() if last_state.get(name, None) != value}
+
+    def variable_names(self) -> set:
+        """
+        Get the names of every variable recorded in any step.
+
+        :param self: The instance of the class.
+        :return: The set of variable names.
+        :rtype: set
+        """
+        names = set()
+        for entry in self._entries:
+            names.update(entry if isinstance(entry, dict) else entry[0])
+        return names
+
+    def iter_changes(self) -> typing.Iterator[typing.Tuple[int, int, dict]]:
+        """
+        Iterate over the steps without rebuilding their full state.
+
+        :param self: The instance of the class.
+        :return: An iterator of (line, frame id, changes) tuples, one per step.
+        :rtype: typing.Iterator[typing.Tuple[int, int, dict]]
+        """
+        for index in range(len(self)):
+            yield self.lines[index], self.frame_ids[index], self.changes_at(index)
+
+    def iter_entries(self) -> typing.Iterator[typing.Tuple[int, int, int, bool, dict, tuple]]:
+        """
+        Iterate over the steps as they are stored, without rebuilding any state.
+
+        :param self: The instance of the class.
+        :return: An iterator of (line, frame id, previous step of the frame, is keyframe, changed, removed) tuples,
+                 one per step. For a keyframe, `changed` is the full state and `removed` is empty.
+        :rtype: typing.Iterator[typing.Tuple[int, int, int, bool, dict, tuple]]
+        """
+        for index, entry in enumerate(self._entries):
+            if isinstance(entry, dict):
+                yield self.lines[index], self.frame_ids[index], self.previous[index], True, entry, ()
+            else:
+                yield self.lines[index], self.frame_ids[index], self.previous[index], False, entry[0], entry[1]
@@ -0,0 +1,378 @@
+"""
+Columnar trace tables for PyTracerTool
+
+A trace table has a row for every step and a column for every variable seen in the trace, so storing it as a list
+of rows of strings takes memory for steps x variables cells, even though most cells are empty (the variable
+belongs to another frame) or repeat the cell above. TraceTable stores the table by column instead:
+
+    - The line numbers are an array of integers.
+    - Each other column (the variables and OUTPUT) is run-length encoded: an array of the rows at which the value
+      of the column changes, and an array of the values it changes to, as ids into a pool holding every distinct
+      value of the table once (outputs, which rarely repeat, are stored once per step that printed them).
+
+The memory used therefore grows with the number of changes rather than with the size of the table, and the
+questions usually asked about a variable ("on which rows did x change?", "which values did y take?") are answered
+by walking its arrays of changes instead of every row.
+
+Rows are rebuilt only when they are read, so TraceTable can still be used like the list of rows (header first)
+that it replaces: it supports len(), indexing, slicing, iteration and comparison with a list.
+
+Classes:
+    - TraceTable: A trace table stored as a line number array and run-length encoded columns.
+"""
+
+import array
+import bisect
+import typing
+
+from .frames import label_key
+
+
+TRUNCATED_LINE = "..."
+
+
+class TraceTable(object):
+    """
+    TraceTable stores a trace table as a line number array and run-length encoded columns of interned values.
+
+    The header is "Line", the variables, then "OUTPUT". Rows are added with append(), which takes the state of the
+    frame that executed the step: the variables missing from the state are shown as empty cells.
+
+    Indexing works as for a list of rows with the header first, so `table[0]` is the header, `table[1]` the first
+    row and `len(table)` counts the header; `row_count` and `rows(start, stop)` count from the first row, as
+    TableRenderer expects.
+
+    Methods:
+        __init__(variables, truncated): Initialise an empty table with a column for each variable.
+        from_steps(step_log, step_outputs, variables, truncated): Build the table of a trace.
+        append(line, state, output): Add a row.
+        row(index): Get a row.
+        rows(start, stop): Get a range of rows.
+        column(name): Get every value of a column.
+        changed_rows(name): Get the rows at which a column takes a new value.
+        history(name): Get the successive values of a column, with the rows they appear at.
+        rows_at_line(line): Get the rows of the steps that executed a line.
+
+    Attributes:
+        header: The names of the columns.
+        variables: The names of the variable columns.
+        lines: An array with the line number of every row.
+        truncated: A description of the limit that stopped the trace, shown in a last row, or None.
+        row_count: The number of rows, including the truncation row, not counting the header.
+        pool_size: The number of distinct values stored.
+        run_count: The number of runs stored, over every column.
+    """
+
+    def __init__(self, variables: typing.Iterable[str], truncated: typing.Optional[str] = None):
+        """
+        Initialise a new, empty instance of TraceTable.
+
+        :param self: The instance of the class.
+        :param variables: The names of the variable columns, in order.
+        :type variables: typing.Iterable[str]
+        :param truncated: A description of the limit that stopped the trace, shown in a last row, or None.
+        :type truncated: typing.Optional[str]
+        """
+        self.variables = list(variables)
+        self.header = ["Line"] + self.variables + ["OUTPUT"]
+        self.truncated = truncated
+        self.lines = array.array("l")
+        self._positions = {name: position for position, name in enumerate(self.variables)}
+        self._output_position = len(self.variables)
+        # Value id 0 is the empty cell.
+        self._pool = [""]
+        self._ids = {"": 0}
+        self._starts = [array.array("l", [0]) for _ in range(len(self.variables) + 1)]
+        self._values = [array.array("l", [0]) for _ in range(len(self.variables) + 1)]
+        self._current = {}
+
+    @classmethod
+    def from_steps(
+        cls,
+        step_log,
+        step_outputs: typing.Optional[dict] = None,
+        variables: typing.Optional[typing.Iterable[str]] = None,
+        truncated: typing.Optional[str] = None,
+    ) -> "TraceTable":
+        """
+        Build the trace table of a trace.
+
+        :param step_log: The StepLog of the trace.
+        :type step_log: StepLog
+        :param step_outputs: The output printed by each step, by step index.
+        :type step_outputs: typing.Optional[dict]
+        :param variables: The variable columns, in order; by default every variable of the trace, sorted.
+        :type variables: typing.Optional[typing.Iterable[str]]
+        :param truncated: A description of the limit that stopped the trace, or None.
+        :type truncated: typing.Optional[str]
+        :return: The trace table.
+        :rtype: TraceTable
+        """
+        table = cls(sorted(step_log.variable_names(), key=label_key) if variables is None else variables, truncated)
+        step_outputs = step_outputs or {}
+
+        # The frame states are rebuilt from the stored deltas as the steps are read, without copying them. A step of
+        # the same frame as the row above only changes the cells of its delta.
+        states = {}
+        last_frame_id = None
+        for index, (line, frame_id, _, keyframe, changed, removed) in enumerate(step_log.iter_entries()):
+            output = step_outputs.get(index, "")
+            if keyframe:
+                state = states[frame_id] = dict(changed)
+                table.append(line, state, output)
+            else:
+                state = states[frame_id]
+                state.update(changed)
+                for name in removed:
+                    del state[name]
+                if frame_id == last_frame_id:
+                    table._append_delta(line, changed, removed, output)
+                else:
+                    table.append(line, state, output)
+            last_frame_id = frame_id
+        return table
+
+    def append(self, line: int, state: dict, output: str = ""):
+        """
+        Add a row.
+
+        :param self: The instance of the class.
+        :param line: The line number of the step.
+        :type line: int
+        :param state: The variables of the frame that executed the step, mapped to their rendered values.
+        :type state: dict
+        :param output: The output printed by the step.
+        :type output: str
+        :return: None
+        :raises KeyError: If a variable of the state has no column.
+        """
+        row = len(self.lines)
+        self.lines.append(line)
+
+        intern = self._intern
+        positions = self._positions
+        cells = {positions[name]: intern(value) for name, value in state.items()}
+        if output:
+            cells[self._output_position] = self._add_output(output)
+
+        current = self._current
+        for position, value_id in cells.items():
+            if current.get(position, 0) != value_id:
+                self._set(position, row, value_id)
+        for position in current.keys() - cells.keys():
+            self._set(position, row, 0)
+        self._current = {position: value_id for position, value_id in cells.items() if value_id}
+
+    def _append_delta(self, line: int, changed: dict, removed: typing.Iterable[str], output: str):
+        # Add a row that differs from the row above only by `changed`, `removed` and its output.
+        row = len(self.lines)
+        self.lines.append(line)
+
+        current = self._current
+        for name, value in changed.items():
+            position = self._positions[name]
+            value_id = self._intern(value)
+            if current.get(position, 0) != value_id:
+                self._set(position, row, value_id)
+                if value_id:
+                    current[position] = value_id
+                else:
+                    del current[position]
+        for name in removed:
+            position = self._positions[name]
+            if current.pop(position, 0):
+                self._set(position, row, 0)
+
+        position = self._output_position
+        if output:
+            self._set(position, row, self._add_output(output))
+            current[position] = self._values[position][-1]
+        elif current.pop(position, 0):
+            self._set(position, row, 0)
+
+    @property
+    def row_count(self) -> int:
+        return len(self.lines) + (self.truncated is not None)
+
+    @property
+    def pool_size(self) -> int:
+        return len(self._pool)
+
+    @property
+    def run_count(self) -> int:
+        return sum(map(len, self._starts))
+
+    def __len__(self) -> int:
+        return self.row_count + 1
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                return [self[position] for position in range(start, stop, step)]
+            header = [list(self.header)] if start == 0 and stop > 0 else []
+            return header + self.rows(max(start - 1, 0), max(stop - 1, 0))
+
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("trace table index out of range")
+        return list(self.header) if index == 0 else self.row(index - 1)
+
+    def __iter__(self) -> typing.Iterator[list]:
+        yield list(self.header)
+        chunk = 1024
+        for start in range(0, self.row_count, chunk):
+            yield from self.rows(start, start + chunk)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (TraceTable, list)):
+            return len(self) == len(other) and all(mine == theirs for mine, theirs in zip(self, other))
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"TraceTable(rows={self.row_count}, columns={len(self.header)}, values={self.pool_size})"
+
+    def row(self, index: int) -> list:
+        """
+        Get a row.
+
+        :param self: The instance of the class.
+        :param index: The index of the row, not counting the header; negative indices count from the end.
+        :type index: int
+        :return: The cells of the row.
+        :rtype: list
+        :raises IndexError: If the index is out of range.
+        """
+        if index < 0:
+            index += self.row_count
+        if not 0 <= index < self.row_count:
+            raise IndexError("row index out of range")
+        return self.rows(index, index + 1)[0]
+
+    def rows(self, start: int = 0, stop: typing.Optional[int] = None) -> typing.List[list]:
+        """
+        Get a range of rows, decoding only the runs that overlap it.
+
+        :param self: The instance of the class.
+        :param start: The index of the first row, not counting the header.
+        :type start: int
+        :param stop: The index after the last row; None for the end of the table.
+        :type stop: typing.Optional[int]
+        :return: The cells of each row.
+        :rtype: typing.List[list]
+        """
+        start, stop, _ = slice(start, stop).indices(self.row_count)
+        step_stop = min(stop, len(self.lines))
+        rows = [[line] for line in self.lines[start:step_stop]]
+
+        if rows:
+            pool = self._pool
+            for starts, values in zip(self._starts, self._values):
+                run = bisect.bisect_right(starts, start) - 1
+                next_start = starts[run + 1] if run + 1 < len(starts) else step_stop
+                value = pool[values[run]]
+                for offset, row in enumerate(rows, start):
+                    if offset >= next_start:
+                        run += 1
+                        next_start = starts[run + 1] if run + 1 < len(starts) else step_stop
+                        value = pool[values[run]]
+                    row.append(value)
+
+        if stop > len(self.lines) >= start and self.truncated is not None:
+            rows.append([TRUNCATED_LINE] + ['' for _ in self.variables] + [f"[Trace truncated: {self.truncated}]"])
+        return rows
+
+    def column(self, name: str) -> list:
+        """
+        Get every value of a column, one per step.
+
+        :param self: The instance of the class.
+        :param name: The name of the column: "Line", "OUTPUT" or a variable label such as "(main)x".
+        :type name: str
+        :return: The values of the column, with empty strings for the steps where it is empty.
+        :rtype: list
+        :raises KeyError: If there is no such column.
+        """
+        if name == "Line":
+            return self.lines.tolist()
+        starts, values = self._column(name)
+        cells = []
+        ends = starts[1:].tolist() + [len(self.lines)]
+        for begin, end, value_id in zip(starts, ends, values):
+            cells.extend([self._pool[value_id]] * (end - begin))
+        return cells
+
+    def changed_rows(self, name: str) -> array.array:
+        """
+        Get the rows at which a column takes a new value.
+
+        A variable's column is empty on the rows of other frames; a row counts as a change only if the value
+        differs from the last non-empty value of the column, so returning to a frame is not reported as a change.
+
+        :param self: The instance of the class.
+        :param name: The label of the variable, such as "(main)x".
+        :type name: str
+        :return: The indices of the rows, not counting the header, in increasing order.
+        :rtype: array.array
+        :raises KeyError: If there is no such variable.
+        """
+        return array.array("l", (row for row, _ in self._changes(name)))
+
+    def history(self, name: str) -> typing.List[typing.Tuple[int, str]]:
+        """
+        Get the successive values of a column, with the rows at which they first appear.
+
+        :param self: The instance of the class.
+        :param name: The label of the variable, such as "(main)x".
+        :type name: str
+        :return: A (row, value) pair for each change of the column, as reported by changed_rows.
+        :rtype: typing.List[typing.Tuple[int, str]]
+        :raises KeyError: If there is no such variable.
+        """
+        return [(row, self._pool[value_id]) for row, value_id in self._changes(name)]
+
+    def rows_at_line(self, line: int) -> array.array:
+        """
+        Get the rows of the steps that executed a line.
+
+        :param self: The instance of the class.
+        :param line: The line number.
+        :type line: int
+        :return: The indices of the rows, not counting the header, in increasing order.
+        :rtype: array.array
+        """
+        return array.array("l", (row for row, row_line in enumerate(self.lines) if row_line == line))
+
+    def _intern(self, value: str) -> int:
+        value_id = self._ids.get(value)
+        if value_id is None:
+            value_id = self._ids[value] = len(self._pool)
+            self._pool.append(value)
+        return value_id
+
+    def _add_output(self, output: str) -> int:
+        # Outputs are rarely repeated, so they are added to the pool without being interned.
+        self._pool.append(output)
+        return len(self._pool) - 1
+
+    def _set(self, position: int, row: int, value_id: int):
+        starts, values = self._starts[position], self._values[position]
+        if starts[-1] == row:
+            values[-1] = value_id
+        else:
+            starts.append(row)
+            values.append(value_id)
+
+    def _column(self, name: str) -> typing.Tuple[array.array, array.array]:
+        position = self._output_position if name == "OUTPUT" else self._positions[name]
+        return self._starts[position], self._values[position]
+
+    def _changes(self, name: str) -> typing.Iterator[typing.Tuple[int, int]]:
+        position = self._positions[name]
+        starts, values = self._starts[position], self._values[position]
+        last = 0
+        for row, value_id in zip(starts, values):
+            if value_id and value_id != last:
+                yield row, value_id
+                last = value_id
@@ -0,0 +1,300 @@
+"""
+Binary trace files for PyTracerTool
+
+A step-through viewer only needs a handful of steps at a time, but a pickled trace table has to be loaded in full
+before any step can be shown. The trace file format stores a trace so that any step can be read on its own:
+
+    - Every distinct string (variable name, rendered value or output) is stored once, in a string pool with an
+      offset table, and referred to by its id everywhere else.
+    - Steps are stored as in the StepLog: a keyframe with the full state of the frame, or the variables that changed
+      and disappeared since the previous step of the same frame. A delta chain is at most `keyframe_interval` steps
+      long, so rebuilding the state of a step reads a bounded number of records.
+    - A step index holds the offset of every step record, so step N is found without reading steps 0 to N-1.
+
+TraceFile memory-maps the file, so only the pages holding the requested steps and strings are read from disk.
+
+Layout (all integers little-endian):
+    header      magic, version, step count, string count, string index offset, step index offset, variable count,
+                truncation string id (-1 if the trace ran to completion)
+    variables   the string id of each variable name (u32), in column order
+    strings     the UTF-8 bytes of every string, back to back
+    string index    the offset of every string, plus the end of the last one (u64)
+    steps       one record per step: line, frame id, previous step of the frame, output string id, keyframe flag,
+                changed count and removed count, then (column, value string id) pairs and removed columns (u32)
+    step index  the offset of every step record (u64)
+
+Classes:
+    - TraceFile: Read-only, memory-mapped access to the steps of a trace file.
+
+Functions:
+    - write_trace_file(path, step_log, outputs, truncated): Write a trace to a file.
+"""
+
+import mmap
+import struct
+import typing
+
+from .frames import label_key
+from .steps import StepLog
+
+
+MAGIC = b"PYTRACE\0"
+VERSION = 1
+
+_HEADER = struct.Struct("<8sIQQQQIi")
+_STEP = struct.Struct("<iIqiBII")
+_OFFSET = struct.Struct("<Q")
+
+
+def write_trace_file(
+    path: str,
+    step_log: StepLog,
+    outputs: typing.Sequence[str],
+    truncated: typing.Optional[str] = None,
+):
+    """
+    Write a trace to a binary trace file.
+
+    :param path: The path of the file to write.
+    :type path: str
+    :param step_log: The steps of the trace.
+    :type step_log: StepLog
+    :param outputs: The output shown with each step, one string per step.
+    :type outputs: typing.Sequence[str]
+    :param truncated: A description of the limit that stopped the trace, or None.
+    :type truncated: typing.Optional[str]
+    :return: None
+
+    :seealso: CodeTracer.save_trace, TraceFile
+    """
+    strings = {}
+
+    def intern(text: str) -> int:
+        string_id = strings.get(text)
+        if string_id is None:
+            string_id = strings[text] = len(strings)
+        return string_id
+
+    variables = sorted(step_log.variable_names(), key=label_key)
+    columns = {name: column for column, name in enumerate(variables)}
+    variable_ids = [intern(name) for name in variables]
+    truncated_id = -1 if truncated is None else intern(truncated)
+
+    steps = bytearray()
+    step_offsets = []
+    for index, (line, frame_id, previous, keyframe, changed, removed) in enumerate(step_log.iter_entries()):
+        step_offsets.append(len(steps))
+        steps += _STEP.pack(
+            line, frame_id, previous, intern(outputs[index]), keyframe, len(changed), len(removed)
+        )
+        pairs = []
+        for name, value in changed.items():
+            pairs.append(columns[name])
+            pairs.append(intern(value))
+        steps += struct.pack(f"<{len(pairs)}I", *pairs)
+        steps += struct.pack(f"<{len(removed)}I", *(columns[name] for name in removed))
+
+    encoded = [text.encode("utf-8", "surrogatepass") for text in strings]
+    strings_start = _HEADER.size + 4 * len(variables)
+    string_offsets = [strings_start]
+    for data in encoded:
+        string_offsets.append(string_offsets[-1] + len(data))
+    string_index_offset = string_offsets[-1]
+    steps_start = string_index_offset + _OFFSET.size * len(string_offsets)
+    step_index_offset = steps_start + len(steps)
+
+    with open(path, "wb") as file:
+        file.write(_HEADER.pack(
+            MAGIC, VERSION, len(step_offsets), len(encoded), string_index_offset, step_index_offset,
+            len(variables), truncated_id,
+        ))
+        file.write(struct.pack(f"<{len(variable_ids)}I", *variable_ids))
+        file.writelines(encoded)
+        file.write(struct.pack(f"<{len(string_offsets)}Q", *string_offsets))
+        file.write(steps)
+        file.write(struct.pack(f"<{len(step_offsets)}Q", *(steps_start + offset for offset in step_offsets)))
+
+
+class TraceFile(object):
+    """
+    TraceFile gives read-only access to the steps of a binary trace file, without loading the whole file.
+
+    The file is memory-mapped when opened, and only the header and variable names are read up front. Reading a
+    step looks its record up in the step index and follows its delta chain back to the nearest keyframe, so it
+    costs at most `keyframe_interval` record reads, whatever the position of the step. Decoded strings are cached.
+
+    Methods:
+        __init__(path): Open and memory-map a trace file.
+        close(): Release the memory map and the file.
+        line_at(index): Get the line number of a step.
+        output_at(index): Get the output shown with a step.
+        state_at(index): Rebuild the full variable state at a step.
+        row(index): Get the trace table row of a step.
+        rows(start, stop): Get the trace table rows of a range of steps.
+
+    Attributes:
+        path: The path of the file.
+        variables: The names of the variables, in column order.
+        header: The header row of the trace table.
+        truncated: A description of the limit that stopped the trace, or None.
+    """
+
+    def __init__(self, path: str):
+        """
+        Initialise a new instance of TraceFile, opening and memory-mapping the file.
+
+        :param self: The instance of the class.
+        :param path: The path of a file written by write_trace_file.
+        :type path: str
+        :raises ValueError: If the file is not a trace file, or was written by an incompatible version.
+        """
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except BaseException:
+            self._file.close()
+            raise
+        self._strings = {}
+
+        if len(self._map) < _HEADER.size:
+            self.close()
+            raise ValueError(f"{path} is not a PyTracerTool trace file")
+        (
+            magic, version, self._step_count, self._string_count, self._string_index, self._step_index,
+            variable_count, truncated_id,
+        ) = _HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a PyTracerTool trace file")
+        if version != VERSION:
+            self.close()
+            raise ValueError(f"{path} has trace file version {version}, expected {VERSION}")
+
+        variable_ids = struct.unpack_from(f"<{variable_count}I", self._map, _HEADER.size)
+        self.variables = [self._string(string_id) for string_id in variable_ids]
+        self.header = ["Line"] + self.variables + ["OUTPUT"]
+        self.truncated = None if truncated_id == -1 else self._string(truncated_id)
+
+    def __len__(self) -> int:
+        return self._step_count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.row(i) for i in range(*index.indices(len(self)))]
+        return self.row(index)
+
+    def __enter__(self) -> "TraceFile":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """
+        Release the memory map and close the file.
+
+        :param self: The instance of the class.
+        :return: None
+        """
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+    def line_at(self, index: int) -> int:
+        """
+        Get the line number executed at a step.
+
+        :param self: The instance of the class.
+        :param index: The index of the step; negative indices count from the end.
+        :type index: int
+        :return: The line number.
+        :rtype: int
+        """
+        return _STEP.unpack_from(self._map, self._step_offset(index))[0]
+
+    def output_at(self, index: int) -> str:
+        """
+        Get the output shown with a step.
+
+        :param self: The instance of the class.
+        :param index: The index of the step; negative indices count from the end.
+        :type index: int
+        :return: The output.
+        :rtype: str
+        """
+        return self._string(_STEP.unpack_from(self._map, self._step_offset(index))[3])
+
+    def state_at(self, index: int) -> dict:
+        """
+        Rebuild the full variable state at a step.
+
+        :param self: The instance of the class.
+        :param index: The index of the step; negative indices count from the end.
+        :type index: int
+        :return: The full variable state of the step's frame after the step.
+        :rtype: dict
+        :raises IndexError: If the index is out of range.
+        """
+        chain = []
+        offset = self._step_offset(index)
+        while True:
+            _, _, previous, _, keyframe, changed_count, removed_count = _STEP.unpack_from(self._map, offset)
+            start = offset + _STEP.size
+            pairs = struct.unpack_from(f"<{2 * changed_count}I", self._map, start)
+            removed = struct.unpack_from(f"<{removed_count}I", self._map, start + 8 * changed_count)
+            chain.append((pairs, removed))
+            if keyframe:
+                break
+            offset = self._step_offset(previous)
+
+        values = {}
+        for pairs, removed in reversed(chain):
+            for position in range(0, len(pairs), 2):
+                values[pairs[position]] = pairs[position + 1]
+            for column in removed:
+                del values[column]
+        return {self.variables[column]: self._string(string_id) for column, string_id in values.items()}
+
+    def row(self, index: int) -> list:
+        """
+        Get the trace table row of a step, as in CodeTracer.trace_table.
+
+        :param self: The instance of the class.
+        :param index: The index of the step; negative indices count from the end.
+        :type index: int
+        :return: The line number, the value of every variable ('' when it has none) and the output.
+        :rtype: list
+        """
+        line, _, _, output_id, _, _, _ = _STEP.unpack_from(self._map, self._step_offset(index))
+        state = self.state_at(index)
+        return [line] + [state.get(var, '') for var in self.variables] + [self._string(output_id)]
+
+    def rows(self, start: int, stop: int) -> list:
+        """
+        Get the trace table rows of a range of steps.
+
+        :param self: The instance of the class.
+        :param start: The index of the first step.
+        :type start: int
+        :param stop: The index after the last step; clamped to the number of steps.
+        :type stop: int
+        :return: The rows of the steps, without the header.
+        :rtype: list
+        """
+        return [self.row(index) for index in range(max(start, 0), min(stop, len(self)))]
+
+    def _step_offset(self, index: int) -> int:
+        if index < 0:
+            index += self._step_count
+        if not 0 <= index < self._step_count:
+            raise IndexError("step index out of range")
+        return _OFFSET.unpack_from(self._map, self._step_index + _OFFSET.size * index)[0]
+
+    def _string(self, string_id: int) -> str:
+        text = self._strings.get(string_id)
+        if text is None:
+            start, end = struct.unpack_from("<2Q", self._map, self._string_index + _OFFSET.size * string_id)
+            text = self._strings[string_id] = self._map[start:end].decode("utf-8", "surrogatepass")
+        return text
@@ -0,0 +1,328 @@
+"""
+Warm tracing worker for PyTracerTool
+
+Starting an interpreter and importing PyTracerTool takes longer than tracing a small program, so a service that
+starts a new process for every program spends most of its time starting up. The worker is started once: it pays
+for the imports, and for a first trace that loads everything tracing uses lazily, up front. It then reads
+programs from stdin, one JSON object per line, and writes one JSON result per line to stdout, in the same order:
+
+    {"id": 1, "code": "x = 1\\nprint(x)", "input": ""}
+    {"id": 1, "trace_table": [["Line", "x", "OUTPUT"], [1, "1", ""], [2, "1", "1\\n"]], "truncated": null,
+     "error": null, "timed_out": false, "elapsed": 0.0004}
+
+"id" and "input" may be left out; "id" is copied to the result as it is. A line that is not a valid request gets
+a result with its "error" set.
+
+Every program runs with a fresh global namespace, and is isolated from the programs traced before it:
+
+    - "fork" (the default where os.fork is available) traces each program in a child process forked from the
+      worker, so nothing the program changes (modules, builtins, the working directory, ...) outlives it, and a
+      program that crashes the interpreter, or runs past --kill-after seconds, only loses its own child.
+    - "reset" traces each program in the worker process itself, which saves the fork, and then restores the
+      process-wide state programs commonly change: the modules they imported are unloaded, and builtins,
+      sys.path, the recursion limit and the working directory are put back. Changes made to modules that were
+      already imported are not undone, and a program that exits the process ends the worker.
+
+Classes:
+    - ProcessState: The process-wide state a traced program may change, saved to be restored later.
+
+Functions:
+    - warm_up(tracer_options): Trace a small program, to load what tracing uses lazily.
+    - trace_request(request, tracer_options): Trace the program of one request.
+    - serve(requests, results, isolation, kill_after, **tracer_options): Answer requests until they run out.
+    - main(argv): Run the worker from the command line.
+
+Usage:
+    ```bash
+    python -m PyTracerTool.worker --backend settrace --max-steps 10000 --timeout 5 --preload math random
+    ```
+"""
+
+import argparse
+import builtins
+import json
+import os
+import select
+import signal
+import sys
+import time
+import typing
+
+from .pytracertool import CodeTracer
+from .snapshots import CHANGE_DETECTION_MODES, SNAPSHOT_MODES
+
+
+ISOLATION_MODES = ("fork", "reset")
+
+# Traced while the worker starts, so that the first request does not pay for what tracing imports or compiles on
+# first use (such as tabulate, used to render objects).
+_WARM_UP_CODE = (
+    "class Point:\n"
+    "    def __init__(self, x):\n"
+    "        self.x = x\n"
+    "point = Point(1)\n"
+    "print(point.x)\n"
+)
+
+
+class ProcessState(object):
+    """
+    ProcessState holds the process-wide state a traced program may change, saved to be restored later.
+
+    Methods:
+        restore(): Put the saved state back, unloading the modules imported since it was saved.
+
+    Attributes:
+        modules: The names of the modules imported when the state was saved.
+        builtins: A copy of the builtins namespace.
+        path: A copy of sys.path.
+        recursion_limit: The recursion limit.
+        working_directory: The working directory.
+    """
+
+    def __init__(self):
+        self.modules = set(sys.modules)
+        self.builtins = dict(vars(builtins))
+        self.path = list(sys.path)
+        self.recursion_limit = sys.getrecursionlimit()
+        self.working_directory = os.getcwd()
+
+    def restore(self):
+        """
+        Put the saved state back, unloading the modules imported since it was saved.
+
+        :param self: The instance of the class.
+        :return: None
+        """
+        for name in set(sys.modules) - self.modules:
+            del sys.modules[name]
+        namespace = vars(builtins)
+        namespace.clear()
+        namespace.update(self.builtins)
+        sys.path[:] = self.path
+        sys.setrecursionlimit(self.recursion_limit)
+        try:
+            os.chdir(self.working_directory)
+        except OSError:
+            pass
+
+
+def warm_up(tracer_options: dict):
+    """
+    Trace a small program, so that what tracing imports or compiles on first use is loaded before the process
+    state is saved, and the first real program does not pay for it.
+
+    :param tracer_options: Keyword arguments passed to the CodeTracer.
+    :type tracer_options: dict
+    :return: None
+    """
+    trace_request({"code": _WARM_UP_CODE}, tracer_options)
+
+
+def _result(request_id, trace_table=None, truncated=None, error=None, timed_out=False, elapsed=0.0) -> dict:
+    return {
+        "id": request_id, "trace_table": trace_table, "truncated": truncated, "error": error,
+        "timed_out": timed_out, "elapsed": elapsed,
+    }
+
+
+def trace_request(request: dict, tracer_options: dict) -> dict:
+    """
+    Trace the program of one request in the current process.
+
+    :param request: The request, with "code" and optionally "id" and "input".
+    :type request: dict
+    :param tracer_options: Keyword arguments passed to the CodeTracer.
+    :type tracer_options: dict
+    :return: The JSON-compatible result: "id", "trace_table" (the rows, header first, or None if tracing failed),
+             "truncated", "error", "timed_out" and "elapsed".
+    :rtype: dict
+    """
+    request_id = request.get("id")
+    start = time.perf_counter()
+    try:
+        tracer = CodeTracer(request["code"], request.get("input", ""), **tracer_options)
+        tracer.generate_trace_table()
+        return _result(
+            request_id, [list(row) for row in tracer.trace_table], tracer.truncated,
+            elapsed=time.perf_counter() - start,
+        )
+    except KeyboardInterrupt:
+        raise
+    except BaseException as error:
+        return _result(request_id, error=f"{type(error).__name__}: {error}", elapsed=time.perf_counter() - start)
+
+
+def _trace_forked(request: dict, tracer_options: dict, kill_after: typing.Optional[float]) -> dict:
+    """
+    Trace the program of one request in a child process forked from the worker.
+
+    :param request: The request.
+    :type request: dict
+    :param tracer_options: Keyword arguments passed to the CodeTracer.
+    :type tracer_options: dict
+    :param kill_after: The time, in seconds, after which the child is killed, or None for no limit.
+    :type kill_after: typing.Optional[float]
+    :return: The result, as returned by trace_request.
+    :rtype: dict
+    """
+    read_end, write_end = os.pipe()
+    start = time.perf_counter()
+    pid = os.fork()
+    if pid == 0:
+        status = 1
+        try:
+            os.close(read_end)
+            result = json.dumps(trace_request(request, tracer_options)).encode("utf-8")
+            with os.fdopen(write_end, "wb") as pipe:
+                pipe.write(result)
+            status = 0
+        finally:
+            os._exit(status)
+
+    os.close(write_end)
+    chunks = []
+    timed_out = False
+    try:
+        while True:
+            remaining = None if kill_after is None else kill_after - (time.perf_counter() - start)
+            if remaining is not None and remaining <= 0:
+                timed_out = True
+                break
+            if not select.select([read_end], [], [], remaining)[0]:
+                continue
+            chunk = os.read(read_end, 65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    finally:
+        os.close(read_end)
+        if timed_out:
+            os.kill(pid, signal.SIGKILL)
+        os.waitpid(pid, 0)
+
+    elapsed = time.perf_counter() - start
+    if timed_out:
+        return _result(
+            request.get("id"), error=f"Timed out after {kill_after} seconds", timed_out=True, elapsed=elapsed
+        )
+    try:
+        return json.loads(b"".join(chunks))
+    except ValueError:
+        return _result(request.get("id"), error="Worker process exited while tracing", elapsed=elapsed)
+
+
+def serve(
+    requests: typing.Iterable[str],
+    results: typing.TextIO,
+    isolation: str = "fork",
+    kill_after: typing.Optional[float] = None,
+    **tracer_options,
+) -> int:
+    """
+    Trace the program of each request, writing each result as a line of JSON as soon as it is ready.
+
+    :param requests: The requests, one JSON object per line; blank lines are skipped.
+    :type requests: typing.Iterable[str]
+    :param results: The stream the results are written to.
+    :type results: typing.TextIO
+    :param isolation: "fork" or "reset".
+    :type isolation: str
+    :param kill_after: With "fork" isolation, the time in seconds after which a child still tracing is killed.
+    :type kill_after: typing.Optional[float]
+    :param tracer_options: Keyword arguments passed to every CodeTracer, such as backend or max_steps.
+    :return: The number of requests answered.
+    :rtype: int
+    :raises ValueError: If the isolation is unknown, or "fork" is used where os.fork is not available.
+    """
+    if isolation not in ISOLATION_MODES:
+        raise ValueError(f"Unknown isolation: {isolation!r}, expected one of {', '.join(ISOLATION_MODES)}")
+    if isolation == "fork" and not hasattr(os, "fork"):
+        raise ValueError('The "fork" isolation needs os.fork, which this platform does not provide')
+
+    warm_up(tracer_options)
+    state = ProcessState() if isolation == "reset" else None
+
+    answered = 0
+    for line in requests:
+        if not line.strip():
+            continue
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict) or not isinstance(request.get("code"), str):
+                raise ValueError('a request must be a JSON object with a "code" string')
+        except ValueError as error:
+            result = _result(None, error=f"Invalid request: {error}")
+        else:
+            if state is None:
+                result = _trace_forked(request, tracer_options, kill_after)
+            else:
+                result = trace_request(request, tracer_options)
+                state.restore()
+
+        results.write(json.dumps(result) + "\n")
+        results.flush()
+        answered += 1
+    return answered
+
+
+def main(argv: typing.Optional[typing.List[str]] = None) -> int:
+    """
+    Run the worker from the command line, answering requests from stdin on stdout until stdin is closed.
+
+    Anything the traced programs write to the process's stdout without going through sys.stdout (such as
+    os.write(1, ...)) is sent to stderr instead, so it cannot corrupt the results.
+
+    :param argv: The command-line arguments; defaults to sys.argv[1:].
+    :type argv: typing.Optional[typing.List[str]]
+    :return: The exit status.
+    :rtype: int
+    """
+    parser = argparse.ArgumentParser(
+        prog="python -m PyTracerTool.worker",
+        description="Trace programs read from stdin as JSON lines, writing one JSON result per line to stdout.",
+    )
+    parser.add_argument("--backend", default="auto", help="the CodeTracer backend (default: auto)")
+    parser.add_argument(
+        "--isolation", choices=ISOLATION_MODES, default="fork" if hasattr(os, "fork") else "reset",
+        help="how programs are isolated from each other (default: fork where available, reset otherwise)",
+    )
+    parser.add_argument("--max-steps", type=int, help="the maximum number of steps recorded per program")
+    parser.add_argument("--timeout", type=float, help="the time, in seconds, after which a trace is truncated")
+    parser.add_argument("--max-output-bytes", type=int, help="the maximum output captured per program")
+    parser.add_argument("--snapshot", choices=SNAPSHOT_MODES, default="deep", help="the snapshot mode")
+    parser.add_argument(
+        "--change-detection", choices=CHANGE_DETECTION_MODES, default="exact", help="the change detection mode"
+    )
+    parser.add_argument(
+        "--kill-after", type=float,
+        help='with the "fork" isolation, the time in seconds after which a program still tracing is killed',
+    )
+    parser.add_argument(
+        "--preload", nargs="+", default=[], metavar="MODULE",
+        help="modules imported once when the worker starts, for the programs that use them",
+    )
+    arguments = parser.parse_args(argv)
+
+    for module in arguments.preload:
+        __import__(module)
+
+    results = os.fdopen(os.dup(sys.stdout.fileno()), "w")
+    sys.stdout.flush()
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    try:
+        serve(
+            sys.stdin, results, arguments.isolation, arguments.kill_after,
+            backend=arguments.backend, max_steps=arguments.max_steps, timeout=arguments.timeout,
+            max_output_bytes=arguments.max_output_bytes, snapshot=arguments.snapshot,
+            change_detection=arguments.change_detection,
+        )
+    except KeyboardInterrupt:
+        return 130
+    finally:
+        results.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
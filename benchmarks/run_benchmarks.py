@@ -0,0 +1,238 @@
+"""
+PyTracerTool benchmark suite
+
+Measures how much slower CodeTracer makes a set of representative programs, and how much memory it needs to trace
+them. Each workload is run untraced (plain `exec`, with stdin and stdout redirected like the tracer does) and
+traced, and the traced run is split into its phases:
+
+    - trace: running the code under the tracing backend and recording the steps (CodeTracer._execute).
+    - table: building trace_table from the recorded steps (CodeTracer._build_trace_table).
+    - render: formatting the whole table as text (str(tracer)).
+
+For every workload the report gives the wall time of each phase (the best of `--repeat` runs), the overhead ratio
+of tracing against the untraced run, the time per step of each phase, and the peak memory allocated while tracing
+(measured with tracemalloc in a separate run, so it does not slow down the timed runs).
+
+The report is printed as a table, and can be written as JSON with --json. Passing a previous JSON report with
+--compare prints the change of each measurement, and exits with status 1 if any workload's trace time or peak
+memory grew by more than --threshold, so the suite can be used to catch regressions.
+
+Usage:
+    python benchmarks/run_benchmarks.py
+    python benchmarks/run_benchmarks.py --backend settrace --repeat 5 --json baseline.json
+    python benchmarks/run_benchmarks.py --json current.json --compare baseline.json --threshold 0.1
+    python benchmarks/run_benchmarks.py --only loops recursion
+    python benchmarks/run_benchmarks.py --backend reduced --json reduced.json --compare baseline.json
+"""
+
+import argparse
+import io
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tabulate  # noqa: E402
+
+from PyTracerTool import CodeTracer  # noqa: E402
+from PyTracerTool.backends import get_backend  # noqa: E402
+
+
+WORKLOADS = {
+    "loops": (
+        "total = 0\n"
+        "for i in range(2000):\n"
+        "    square = i * i\n"
+        "    if square % 3 == 0:\n"
+        "        total += square\n"
+        "    else:\n"
+        "        total -= 1\n",
+        "",
+    ),
+    "recursion": (
+        "def fib(n):\n"
+        "    if n < 2:\n"
+        "        return n\n"
+        "    return fib(n - 1) + fib(n - 2)\n"
+        "result = fib(14)\n",
+        "",
+    ),
+    "large_containers": (
+        "numbers = []\n"
+        "lookup = {}\n"
+        "for i in range(400):\n"
+        "    numbers.append(i)\n"
+        "    lookup[i] = str(i)\n"
+        "total = sum(numbers)\n",
+        "",
+    ),
+    "objects": (
+        "class Account:\n"
+        "    def __init__(self, owner, balance):\n"
+        "        self.owner = owner\n"
+        "        self.balance = balance\n"
+        "    def deposit(self, amount):\n"
+        "        self.balance += amount\n"
+        "accounts = []\n"
+        "for i in range(60):\n"
+        "    account = Account('user' + str(i), i)\n"
+        "    account.deposit(10)\n"
+        "    accounts.append(account)\n",
+        "",
+    ),
+    "printing": (
+        "for i in range(1500):\n"
+        "    print('line', i, 'of output')\n",
+        "",
+    ),
+    "input": (
+        "count = int(input())\n"
+        "names = []\n"
+        "for i in range(count):\n"
+        "    name = input()\n"
+        "    names.append(name.upper())\n"
+        "    print('Hello', name)\n",
+        "300\n" + "".join(f"name{i}\n" for i in range(300)),
+    ),
+}
+
+PHASES = ("trace", "table", "render")
+
+
+def run_untraced(python_code: str, user_input: str) -> float:
+    original_stdout, original_stdin = sys.stdout, sys.stdin
+    sys.stdout, sys.stdin = io.StringIO(), io.StringIO(user_input)
+    try:
+        start = time.perf_counter()
+        exec(compile(python_code, "<benchmark>", "exec"), {"__name__": "__main__"})
+        return time.perf_counter() - start
+    finally:
+        sys.stdout, sys.stdin = original_stdout, original_stdin
+
+
+def run_traced(python_code: str, user_input: str, backend: str) -> dict:
+    tracer = CodeTracer(python_code, user_input, backend=backend)
+    original_stdout = sys.stdout
+    sys.stdout = io.StringIO()
+    try:
+        start = time.perf_counter()
+        tracer._execute()
+        traced = time.perf_counter()
+        tracer._build_trace_table()
+        built = time.perf_counter()
+        str(tracer)
+        rendered = time.perf_counter()
+    finally:
+        sys.stdout = original_stdout
+    return {
+        "steps": len(tracer.tracer_info),
+        "trace": traced - start,
+        "table": built - traced,
+        "render": rendered - built,
+    }
+
+
+def measure_peak_memory(python_code: str, user_input: str, backend: str) -> int:
+    tracer = CodeTracer(python_code, user_input, backend=backend)
+    original_stdout = sys.stdout
+    sys.stdout = io.StringIO()
+    tracemalloc.start()
+    try:
+        tracer._execute()
+        tracer._build_trace_table()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+        sys.stdout = original_stdout
+
+
+def benchmark(name: str, backend: str, repeat: int) -> dict:
+    python_code, user_input = WORKLOADS[name]
+    untraced = min(run_untraced(python_code, user_input) for _ in range(repeat))
+    runs = [run_traced(python_code, user_input, backend) for _ in range(repeat)]
+    steps = runs[0]["steps"]
+    result = {"workload": name, "steps": steps, "untraced": untraced}
+    for phase in PHASES:
+        result[phase] = min(run[phase] for run in runs)
+        result[f"{phase}_per_step"] = result[phase] / steps if steps else 0.0
+    result["overhead"] = result["trace"] / untraced if untraced else float("inf")
+    result["peak_memory"] = measure_peak_memory(python_code, user_input, backend)
+    return result
+
+
+def compare(results: list, baseline: dict, threshold: float) -> bool:
+    previous = {result["workload"]: result for result in baseline["results"]}
+    rows = []
+    regressed = False
+    for result in results:
+        old = previous.get(result["workload"])
+        if old is None:
+            continue
+        changes = []
+        for key in ("trace", "peak_memory"):
+            change = (result[key] - old[key]) / old[key] if old[key] else 0.0
+            changes.append(f"{change:+.1%}")
+            if change > threshold:
+                regressed = True
+        rows.append([result["workload"]] + changes)
+    print(tabulate.tabulate(rows, headers=["workload", "trace time", "peak memory"], tablefmt="simple"))
+    return regressed
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Measure the overhead of tracing code with PyTracerTool.")
+    parser.add_argument("--backend", default="auto", help="the CodeTracer backend to benchmark (default: auto)")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per workload; the best time is kept")
+    parser.add_argument("--only", nargs="+", choices=sorted(WORKLOADS), help="the workloads to run")
+    parser.add_argument("--json", metavar="PATH", help="write the report as JSON to PATH")
+    parser.add_argument("--compare", metavar="PATH", help="compare against a previous JSON report")
+    parser.add_argument(
+        "--threshold", type=float, default=0.2,
+        help="relative growth of trace time or peak memory reported as a regression (default: 0.2)",
+    )
+    arguments = parser.parse_args(argv)
+
+    results = [benchmark(name, arguments.backend, arguments.repeat) for name in arguments.only or WORKLOADS]
+
+    rows = [
+        [
+            result["workload"], result["steps"], f"{result['untraced'] * 1e3:.2f}", f"{result['trace'] * 1e3:.1f}",
+            f"{result['overhead']:.0f}x", f"{result['trace_per_step'] * 1e6:.1f}",
+            f"{result['table_per_step'] * 1e6:.2f}", f"{result['render_per_step'] * 1e6:.2f}",
+            f"{result['peak_memory'] / 1024:.0f}",
+        ]
+        for result in results
+    ]
+    headers = [
+        "workload", "steps", "untraced ms", "trace ms", "overhead", "trace us/step", "table us/step",
+        "render us/step", "peak KiB",
+    ]
+    print(tabulate.tabulate(rows, headers=headers, tablefmt="simple"))
+
+    report = {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "backend": get_backend(arguments.backend, None).name,
+        "repeat": arguments.repeat,
+        "results": results,
+    }
+    if arguments.json:
+        with open(arguments.json, "w") as file:
+            json.dump(report, file, indent=2)
+
+    if arguments.compare:
+        with open(arguments.compare) as file:
+            baseline = json.load(file)
+        print()
+        if compare(results, baseline, arguments.threshold):
+            print(f"\nRegression: a measurement grew by more than {arguments.threshold:.0%}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
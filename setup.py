@@ -12,8 +12,8 @@ setup(
     description='A versatile tool for tracing code execution, capturing variable changes, and logging print statements.',
     long_description=long_description,
     url='https://github.com/DarshanLakshman/PyTracerTool.git',
-    packages=find_packages(),
-    install_requires=['tabulate', 'typing'],
+    packages=find_packages(exclude=["tests", "tests.*"]),
+    install_requires=['tabulate'],
     keywords=["trace", "debugging", "tracing", "execution", "visualisation"],
     classifiers=[
         'Development Status :: 4 - Beta',
@@ -0,0 +1,303 @@
+"""
+Tests for the tracing backends: every backend must record the same steps as sys.settrace.
+"""
+
+import re
+import sys
+import unittest
+
+from PyTracerTool import CodeTracer
+from PyTracerTool.backends import MonitoringBackend
+
+
+# Programs with none of the known differences of the instrument backend (see the instrument module).
+PROGRAMS = {
+    "functions": (
+        "def area(w, h):\n"
+        "    result = w * h\n"
+        "    return result\n"
+        "\n"
+        "total = 0\n"
+        "for side in range(1, 4):\n"
+        "    total += area(side, side + 1)\n"
+        "print(total)\n"
+    ),
+    "class": (
+        "class Counter:\n"
+        "    def __init__(self, start):\n"
+        "        self.count = start\n"
+        "\n"
+        "    def step(self):\n"
+        "        self.count += 1\n"
+        "        return self.count\n"
+        "\n"
+        "c = Counter(2)\n"
+        "c.step()\n"
+        "last = c.step()\n"
+        "print(last)\n"
+    ),
+    "while with break and else": (
+        "n = 10\n"
+        "steps = 0\n"
+        "while n != 1:\n"
+        "    if n % 2 == 0:\n"
+        "        n = n // 2\n"
+        "    else:\n"
+        "        n = 3 * n + 1\n"
+        "    steps += 1\n"
+        "    if steps > 50:\n"
+        "        break\n"
+        "else:\n"
+        "    print('reached 1')\n"
+        "print(steps)\n"
+    ),
+    "nested calls": (
+        "def double(x):\n"
+        "    return x * 2\n"
+        "\n"
+        "def quad(x):\n"
+        "    y = double(x)\n"
+        "    return double(y)\n"
+        "\n"
+        "print(quad(3))\n"
+    ),
+    "recursion": (
+        "def fib(n):\n"
+        "    if n < 2:\n"
+        "        return n\n"
+        "    return fib(n - 1) + fib(n - 2)\n"
+        "\n"
+        "print(fib(4))\n"
+    ),
+    "with and try": (
+        "import io\n"
+        "buffer = io.StringIO()\n"
+        "with buffer:\n"
+        "    buffer.write('x')\n"
+        "    size = buffer.tell()\n"
+        "try:\n"
+        "    value = int('12')\n"
+        "except ValueError:\n"
+        "    value = 0\n"
+        "else:\n"
+        "    value += 1\n"
+        "finally:\n"
+        "    done = True\n"
+        "print(size, value, done)\n"
+    ),
+    "input": (
+        "name = input()\n"
+        "age = int(input())\n"
+        "if age >= 18:\n"
+        "    print(name, 'is an adult')\n"
+        "else:\n"
+        "    print(name, 'is a minor')\n"
+    ),
+    "containers": (
+        "words = {}\n"
+        "for word in 'a b a c b a'.split():\n"
+        "    if word in words:\n"
+        "        words[word] += 1\n"
+        "    else:\n"
+        "        words[word] = 1\n"
+        "seen = set(words)\n"
+        "print(sorted(words.items()), len(seen))\n"
+    ),
+    "closure": (
+        "def make_adder(k):\n"
+        "    def add(x):\n"
+        "        return x + k\n"
+        "    return add\n"
+        "\n"
+        "add2 = make_adder(2)\n"
+        "print(add2(5), add2(1))\n"
+    ),
+    "decorators": (
+        "def register(f):\n"
+        "    seen.append(f.__name__)\n"
+        "    return f\n"
+        "\n"
+        "def tag(name):\n"
+        "    def apply(f):\n"
+        "        f.tag = name\n"
+        "        return f\n"
+        "    return apply\n"
+        "\n"
+        "seen = []\n"
+        "@register\n"
+        "@tag('x')\n"
+        "def g(a):\n"
+        "    return a + 1\n"
+        "@tag('y')\n"
+        "class C:\n"
+        "    size = 2\n"
+        "print(g(1), g.tag, C.tag, seen)\n"
+    ),
+}
+
+if sys.version_info >= (3, 10):
+    PROGRAMS["match"] = (
+        "for point in [(0, 4), (1, 2), (1, 9), 'x']:\n"
+        "    match point:\n"
+        "        case (0, y):\n"
+        "            kind = 'axis'\n"
+        "        case (1, y) if y > 5:\n"
+        "            kind = 'far'\n"
+        "        case (1, y): kind = 'near'\n"
+        "        case [*_]:\n"
+        "            kind = 'other'\n"
+        "    print(point, kind)\n"
+        "match 'z':\n"
+        "    case 'a' | 'b':\n"
+        "        kind = None\n"
+        "    case _:\n"
+        "        kind = 'rest'\n"
+    )
+
+ONE_LINE_LOOPS = {
+    "for": "x = 0\nfor i in range(4): x += i\nprint(x)\n",
+    "while": "n = 0\nwhile n < 3: n += 1\nprint(n)\n",
+    "while with several statements": "i = 0\nwhile i < 3: i += 1; j = i\n",
+    "nested for": "s = 0\nfor i in range(2):\n    for j in range(3): s += j\n",
+    "conditional expression": "for i in range(3): x = 1 if i else 2\n",
+    "list comprehension": "y = [i * i for i in range(3)]\nprint(y)\n",
+    "dict comprehension": "z = {i: str(i) for i in range(2)}\n",
+    "comprehension in a function": "def f(a):\n    return [k for k in range(a)]\nr = f(3)\nfor q in f(2): pass\n",
+}
+
+ONE_LINE_BODIES = {
+    "for": ONE_LINE_LOOPS["for"],
+    "nested for": ONE_LINE_LOOPS["nested for"],
+    "conditional expression": ONE_LINE_LOOPS["conditional expression"],
+    "for with continue": "for i in range(3): continue\nprint(i)\n",
+    "for with else": "for i in range(2): pass\nelse: print(i)\n",
+    "while not entered": "n = 5\nwhile n < 3: n += 1\nprint(n)\n",
+    "if with break": "n = 0\nwhile True:\n    n += 1\n    if n > 2: break\n",
+    "if with continue": "for i in range(4):\n    if i % 2: continue\n    print(i)\n",
+    "if and elif": "a = 0\nif a: a += 1\nelif a == 0: a = 5\nelse: a = 7\nprint(a)\n",
+    "if with return": "def g(a):\n    if a: return 1\n    return 2\nprint(g(0), g(1))\n",
+    "with": "import io\nwith io.StringIO('a') as f: d = f.read()\nprint(d)\n",
+    "try": "for i in range(2):\n    try: x = i\n    except ValueError: pass\nprint(x)\n",
+}
+
+
+def trace_rows(code: str, backend: str, user_input: str = "") -> list:
+    tracer = CodeTracer(code, user_input, backend=backend)
+    tracer.generate_trace_table()
+    # Objects rendered with their default repr differ by address from one run to the next.
+    return [[re.sub(r"0x[0-9a-f]+", "0x", cell) if isinstance(cell, str) else cell for cell in row]
+            for row in tracer.trace_table]
+
+
+class BackendParityTest(unittest.TestCase):
+    def assert_programs_match_settrace(self, backend: str):
+        for name, code in PROGRAMS.items():
+            with self.subTest(name):
+                self.assertEqual(trace_rows(code, backend, "Ada\n20\n"), trace_rows(code, "settrace", "Ada\n20\n"))
+
+    def test_instrument_matches_settrace(self):
+        self.assert_programs_match_settrace("instrument")
+
+    @unittest.skipUnless(MonitoringBackend.is_available(), "sys.monitoring needs Python 3.12+")
+    def test_monitoring_matches_settrace(self):
+        self.assert_programs_match_settrace("monitoring")
+
+
+@unittest.skipUnless(MonitoringBackend.is_available(), "sys.monitoring needs Python 3.12+")
+class MonitoringParityTest(unittest.TestCase):
+    def test_one_line_loops_match_settrace(self):
+        for name, code in ONE_LINE_LOOPS.items():
+            with self.subTest(name):
+                self.assertEqual(trace_rows(code, "monitoring"), trace_rows(code, "settrace"))
+
+    def test_one_line_for_records_every_iteration(self):
+        rows = trace_rows(ONE_LINE_LOOPS["for"], "monitoring")
+        self.assertEqual([row[0] for row in rows[1:]], [1, 2, 2, 2, 2, 2, 3])
+
+
+class InstrumentParityTest(unittest.TestCase):
+    def test_one_line_bodies_match_settrace(self):
+        for name, code in ONE_LINE_BODIES.items():
+            with self.subTest(name):
+                self.assertEqual(trace_rows(code, "instrument"), trace_rows(code, "settrace"))
+
+    def test_one_line_for_records_one_step_per_iteration(self):
+        rows = trace_rows(ONE_LINE_LOOPS["for"], "instrument")
+        self.assertEqual([row[0] for row in rows[1:]], [1, 2, 2, 2, 2, 2, 3])
+
+    def test_one_line_except_records_one_step(self):
+        # The statement that raises is not recorded (see the instrument module), but the handler is, once.
+        code = "try:\n    1 / 0\nexcept ZeroDivisionError: x = 1\nprint(x)\n"
+        rows = trace_rows(code, "instrument")
+        self.assertEqual([row[0] for row in rows[1:]].count(3), 1)
+
+    def test_multi_line_with_records_exit_step(self):
+        code = "import io\nwith io.StringIO('a') as f:\n    d = f.read()\nprint(d)\n"
+        self.assertEqual(trace_rows(code, "instrument"), trace_rows(code, "settrace"))
+
+
+class ReducedBackendTest(unittest.TestCase):
+    def test_records_assignments_loop_binds_and_prints(self):
+        code = (
+            "def square(n):\n"
+            "    result = n * n\n"
+            "    return result\n"
+            "total = 0\n"
+            "for i in range(2):\n"
+            "    if i:\n"
+            "        total += square(i)\n"
+            "    print(i)\n"
+        )
+        self.assertEqual(trace_rows(code, "reduced"), [
+            ["Line", "(main)i", "(main)total", "(square)n", "(square)result", "OUTPUT"],
+            [4, "", "0", "", "", ""],
+            [5, "0", "0", "", "", ""],
+            [8, "0", "0", "", "", "0\n"],
+            [5, "1", "0", "", "", ""],
+            [1, "", "", "1", "", ""],
+            [2, "", "", "1", "1", ""],
+            [7, "1", "1", "", "", ""],
+            [8, "1", "1", "", "", "1\n"],
+        ])
+
+    def test_item_attribute_and_method_changes_update_the_variable(self):
+        code = (
+            "class Box:\n"
+            "    pass\n"
+            "b = Box()\n"
+            "b.size = 2\n"
+            "items = []\n"
+            "items.append(b.size)\n"
+            "items[0] += 1\n"
+            "first, *rest = items + [5, 6]\n"
+        )
+        rows = trace_rows(code, "reduced")
+        header = rows[0]
+        self.assertEqual([row[0] for row in rows[1:]], [3, 4, 5, 6, 7, 8])
+        self.assertEqual([row[header.index("(main)items")] for row in rows[3:]], ["[]", "[2]", "[3]", "[3]"])
+        self.assertIn("2", rows[2][header.index("(main)b")])
+        self.assertEqual(rows[-1][header.index("(main)rest")], "[5, 6]")
+
+    def test_return_values_and_call_tree(self):
+        tracer = CodeTracer("def fact(n):\n    return 1 if n <= 1 else n * fact(n - 1)\nx = fact(3)\n", "",
+                            backend="reduced")
+        tracer.generate_trace_table()
+        self.assertEqual(
+            [(record.scope, record.return_value) for record in tracer.call_tree.frames],
+            [("main", "None"), ("fact", "6"), ("fact:2", "2"), ("fact:3", "1")],
+        )
+
+    def test_records_fewer_steps_than_settrace(self):
+        code = PROGRAMS["while with break and else"]
+        reduced = CodeTracer(code, "", backend="reduced")
+        reduced.generate_trace_table()
+        settrace = CodeTracer(code, "", backend="settrace")
+        settrace.generate_trace_table()
+        self.assertLess(len(reduced.execution_order), len(settrace.execution_order))
+        # Every variable ends with the value it has under settrace.
+        final = {label: value for label, value in reduced.tracer_info.state_at(-1).items()}
+        self.assertEqual(final, {label: settrace.tracer_info.state_at(-1)[label] for label in final})
+
+
+if __name__ == "__main__":
+    unittest.main()
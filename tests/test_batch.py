@@ -0,0 +1,54 @@
+"""
+Tests for batch tracing in a pool of worker processes.
+"""
+
+import unittest
+
+from PyTracerTool.batch import TracingPool
+
+
+def results_by_index(pool: TracingPool, submissions: list) -> list:
+    return sorted(pool.map_unordered(submissions), key=lambda result: result.index)
+
+
+class TracingPoolTest(unittest.TestCase):
+    def test_results_match_submissions(self):
+        with TracingPool(workers=2, timeout=10) as pool:
+            results = results_by_index(pool, [("x = 1\nprint(x)\n", ""), ("name = input()\n", "Ada\n")])
+        self.assertEqual([result.error for result in results], [None, None])
+        self.assertEqual(results[0].trace_table, [["Line", "(main)x", "OUTPUT"], [1, "1", ""], [2, "1", "1\n"]])
+        self.assertEqual(results[1].trace_table, [["Line", "(main)name", "OUTPUT"], [1, "Ada", ""]])
+
+    def test_submissions_do_not_leak_state_into_the_next(self):
+        submissions = [
+            ("import builtins\nbuiltins.abs = lambda x: 42\n", ""),
+            ("print(abs(-3))\n", ""),
+            ("import sys\nsys.setrecursionlimit(400)\nsys.path.insert(0, 'elsewhere')\n", ""),
+            ("import sys\nprint(sys.getrecursionlimit() > 400, 'elsewhere' in sys.path)\n", ""),
+        ]
+        with TracingPool(workers=1, timeout=10) as pool:
+            results = results_by_index(pool, submissions)
+        self.assertEqual([result.error for result in results], [None] * 4)
+        self.assertEqual(results[1].trace_table[-1][-1], "3\n")
+        self.assertEqual(results[3].trace_table[-1][-1], "True False\n")
+
+    def test_unreadable_result_is_reported_and_the_worker_replaced(self):
+        corrupt = (
+            "import multiprocessing.reduction\n"
+            "multiprocessing.reduction.ForkingPickler.dumps = classmethod(lambda cls, obj, protocol=None: b'\\x80')\n"
+        )
+        with TracingPool(workers=1, timeout=10) as pool:
+            results = results_by_index(pool, [(corrupt, ""), ("x = 1\n", "")])
+        self.assertTrue(results[0].error.startswith("Worker sent an unreadable result"))
+        self.assertIsNone(results[1].error)
+        self.assertEqual(results[1].trace_table, [["Line", "(main)x", "OUTPUT"], [1, "1", ""]])
+
+    def test_timed_out_submission_does_not_block_the_queue(self):
+        with TracingPool(workers=1, timeout=0.5) as pool:
+            results = results_by_index(pool, [("while True:\n    pass\n", ""), ("x = 1\n", "")])
+        self.assertTrue(results[0].timed_out)
+        self.assertIsNone(results[1].error)
+
+
+if __name__ == "__main__":
+    unittest.main()
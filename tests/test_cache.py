@@ -0,0 +1,157 @@
+"""
+Tests for trace caching.
+"""
+
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from PyTracerTool import CodeTracer
+from PyTracerTool.cache import TraceCache, cache_key, is_deterministic
+
+
+CODE = "total = 0\nfor i in range(3):\n    total += i\nprint(total)\n"
+
+
+def traced(code: str, cache: TraceCache, user_input: str = "", **options) -> CodeTracer:
+    tracer = CodeTracer(code, user_input, cache=cache, **options)
+    tracer.generate_trace_table()
+    return tracer
+
+
+def rows(tracer: CodeTracer) -> list:
+    return [list(row) for row in tracer.trace_table]
+
+
+class TraceCacheTest(unittest.TestCase):
+    def test_second_trace_is_a_hit_with_the_same_table(self):
+        cache = TraceCache()
+        first = traced(CODE, cache)
+        second = traced(CODE, cache)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        self.assertEqual(rows(second), rows(first))
+        self.assertEqual(list(second.execution_order), list(first.execution_order))
+        self.assertEqual(second.step_outputs, first.step_outputs)
+        self.assertEqual(second.calls_log, first.calls_log)
+
+    def test_code_input_and_options_are_part_of_the_key(self):
+        cache = TraceCache()
+        traced("name = input()\n", cache, "Ada\n")
+        variants = [
+            ("name = input()\n", "Grace\n", {}),
+            ("name = input() \n", "Ada\n", {}),
+            ("name = input()\n", "Ada\n", {"max_steps": 10}),
+            ("name = input()\n", "Ada\n", {"keyframe_interval": 4}),
+            ("name = input()\n", "Ada\n", {"snapshot": "repr"}),
+            ("name = input()\n", "Ada\n", {"backend": "instrument"}),
+        ]
+        for code, user_input, options in variants:
+            with self.subTest(user_input=user_input, options=options):
+                misses = cache.misses
+                traced(code, cache, user_input, **options)
+                self.assertEqual(cache.misses, misses + 1)
+        self.assertEqual(cache.hits, 0)
+
+    def test_restored_traces_are_not_shared(self):
+        cache = TraceCache()
+        traced(CODE, cache)
+        first = traced(CODE, cache)
+        second = traced(CODE, cache)
+        self.assertIsNot(first.tracer_info, second.tracer_info)
+        self.assertIsNot(first.call_tree, second.call_tree)
+        self.assertIsNot(first.trace_table, second.trace_table)
+        expected = rows(second)
+        first.tracer_info.append(99, 99, {})
+        first.step_outputs.clear()
+        self.assertEqual(rows(traced(CODE, cache)), expected)
+        self.assertEqual(len(traced(CODE, cache).tracer_info), len(second.tracer_info))
+
+    def test_cache_hit_replaces_the_stats(self):
+        cache = TraceCache()
+        traced(CODE, cache)
+        fresh = traced(CODE, cache, collect_stats=True)
+        self.assertEqual(fresh.stats.counters["cache_hits"], 1)
+        self.assertNotIn("steps", fresh.stats.counters)
+
+        reused = CodeTracer(CODE, "", cache=cache, collect_stats=True)
+        reused.generate_trace_table()
+        reused.code = "x = 1\n"
+        reused.generate_trace_table()
+        previous = reused.stats
+        reused.code = CODE
+        reused.generate_trace_table()
+        self.assertIsNot(reused.stats, previous)
+        self.assertEqual(reused.stats.counters["cache_hits"], 1)
+
+        self.assertIsNone(traced(CODE, cache).stats)
+
+    def test_nondeterministic_code_is_not_cached(self):
+        cache = TraceCache()
+        traced("import random\nx = random.random()\n", cache)
+        traced("import random\nx = random.random()\n", cache)
+        self.assertEqual((cache.hits, cache.misses, len(cache)), (0, 0, 0))
+
+    def test_trace_showing_an_address_is_not_cached(self):
+        cache = TraceCache()
+        code = "numbers = (n for n in range(3))\nfirst = next(numbers)\n"
+        self.assertTrue(is_deterministic(code))
+        traced(code, cache)
+        self.assertEqual(len(cache), 0)
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = TraceCache(max_entries=2)
+        for value in range(3):
+            traced(f"x = {value}\n", cache)
+        self.assertEqual(len(cache), 2)
+        traced("x = 0\n", cache)
+        self.assertEqual(cache.hits, 0)
+        traced("x = 2\n", cache)
+        self.assertEqual(cache.hits, 1)
+
+    def test_disk_tier_survives_a_new_cache(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        expected = rows(traced(CODE, TraceCache(directory=directory)))
+        cache = TraceCache(directory=directory)
+        self.assertEqual(rows(traced(CODE, cache)), expected)
+        self.assertEqual((cache.hits, cache.misses), (1, 0))
+
+
+class IsDeterministicTest(unittest.TestCase):
+    def test_examples(self):
+        self.assertTrue(is_deterministic(CODE))
+        self.assertTrue(is_deterministic("import math\nprint(math.sqrt(2))\n"))
+        self.assertFalse(is_deterministic("import random\n"))
+        self.assertFalse(is_deterministic("from os import path\n"))
+        self.assertFalse(is_deterministic("print(id(1))\n"))
+        self.assertFalse(is_deterministic("def broken(:\n"))
+
+    def test_classes_need_a_repr(self):
+        self.assertFalse(is_deterministic("class A:\n    pass\na = A()\n"))
+        self.assertTrue(is_deterministic("class A:\n    def __repr__(self):\n        return 'A()'\na = A()\n"))
+
+    def test_sets_need_a_fixed_hash_seed(self):
+        programs = ["s = {'a', 'b'}\n", "s = set('ab')\n", "s = {c for c in 'ab'}\n", "s = frozenset('ab')\n"]
+        for code in programs:
+            with self.subTest(code):
+                with mock.patch("PyTracerTool.cache._fixed_hash_seed", return_value=None):
+                    self.assertFalse(is_deterministic(code))
+                with mock.patch("PyTracerTool.cache._fixed_hash_seed", return_value="0"):
+                    self.assertTrue(is_deterministic(code))
+
+    def test_sets_of_objects_are_not_deterministic(self):
+        code = "class A:\n    def __repr__(self):\n        return 'A()'\ns = {A(), A()}\n"
+        with mock.patch("PyTracerTool.cache._fixed_hash_seed", return_value="0"):
+            self.assertFalse(is_deterministic(code))
+
+    def test_hash_seed_is_part_of_the_key(self):
+        with mock.patch("PyTracerTool.cache._fixed_hash_seed", return_value="1"):
+            first = cache_key(CODE, "")
+        with mock.patch("PyTracerTool.cache._fixed_hash_seed", return_value="2"):
+            second = cache_key(CODE, "")
+        self.assertNotEqual(first, second)
+
+
+if __name__ == "__main__":
+    unittest.main()
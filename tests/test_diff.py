@@ -0,0 +1,92 @@
+"""
+Tests for trace diffing: the alignment must be a longest common subsequence of the step keys.
+"""
+
+import random
+import unittest
+
+from PyTracerTool import CodeTracer
+from PyTracerTool.diff import TraceIndex, _match_keys, _opcodes, diff_traces
+
+
+REFERENCE = "total = 0\nfor i in range(5):\n    total += i\nprint(total)\n"
+
+
+def lcs_length(a: list, b: list) -> int:
+    # The textbook dynamic programming solution, as a reference for the linear-space Myers alignment.
+    lengths = [[0] * (len(b) + 1) for _ in range(len(a) + 1)]
+    for i, a_item in enumerate(a):
+        for j, b_item in enumerate(b):
+            if a_item == b_item:
+                lengths[i + 1][j + 1] = lengths[i][j] + 1
+            else:
+                lengths[i + 1][j + 1] = max(lengths[i][j + 1], lengths[i + 1][j])
+    return lengths[len(a)][len(b)]
+
+
+def trace(code: str) -> CodeTracer:
+    tracer = CodeTracer(code, "")
+    tracer.generate_trace_table()
+    return tracer
+
+
+class MatchKeysTest(unittest.TestCase):
+    def test_matches_are_a_longest_common_subsequence(self):
+        generator = random.Random(1)
+        for _ in range(500):
+            a = [generator.randint(0, 3) for _ in range(generator.randint(0, 30))]
+            b = [generator.randint(0, 3) for _ in range(generator.randint(0, 30))]
+            matches = _match_keys(a, b)
+            with self.subTest(a=a, b=b):
+                self.assertTrue(all(a[i] == b[j] for i, j in matches))
+                self.assertTrue(all(
+                    first[0] < second[0] and first[1] < second[1] for first, second in zip(matches, matches[1:])
+                ))
+                self.assertEqual(len(matches), lcs_length(a, b))
+
+    def test_opcodes_cover_both_sequences(self):
+        generator = random.Random(2)
+        for _ in range(200):
+            a = [generator.randint(0, 2) for _ in range(generator.randint(0, 15))]
+            b = [generator.randint(0, 2) for _ in range(generator.randint(0, 15))]
+            opcodes = _opcodes(_match_keys(a, b), len(a), len(b))
+            with self.subTest(a=a, b=b):
+                self.assertEqual(sum(i2 - i1 for _, i1, i2, _, _ in opcodes), len(a))
+                self.assertEqual(sum(j2 - j1 for _, _, _, j1, j2 in opcodes), len(b))
+                for tag, i1, i2, j1, j2 in opcodes:
+                    if tag == "equal":
+                        self.assertEqual(a[i1:i2], b[j1:j2])
+
+
+class DiffTracesTest(unittest.TestCase):
+    def test_identical_programs(self):
+        result = diff_traces(trace(REFERENCE), trace(REFERENCE))
+        self.assertTrue(result.identical)
+        self.assertEqual(result.similarity, 1.0)
+
+    def test_first_divergence_and_variables(self):
+        candidate = trace(REFERENCE.replace("range(5)", "range(1, 5)"))
+        result = candidate.diff(trace(REFERENCE))
+        self.assertEqual(result.first_divergence, (1, 1))
+        self.assertEqual(result.differing_variables, {"(main)i": ("0", "1")})
+        self.assertTrue(result.output_equal)
+
+    def test_output_mismatch(self):
+        # Output is not part of the step keys, so the print steps are aligned and their outputs compared.
+        reference = trace(REFERENCE)
+        result = diff_traces(reference, trace(REFERENCE.replace("print(total)", "print('total', total)")))
+        last = len(reference.execution_order) - 1
+        self.assertIsNone(result.first_divergence)
+        self.assertFalse(result.output_equal)
+        self.assertEqual(result.output_mismatches, [(last, last, "10\n", "total 10\n")])
+        self.assertFalse(result.identical)
+
+    def test_reused_index_matches_fresh_index(self):
+        reference = trace(REFERENCE)
+        index = TraceIndex(reference)
+        candidate = trace(REFERENCE.replace("total += i", "total += i * 2"))
+        self.assertEqual(diff_traces(index, candidate), diff_traces(reference, candidate))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+"""
+Tests for trace table display: every format and page must show the rows of the table, and only those.
+"""
+
+import json
+import unittest
+
+from PyTracerTool import CodeTracer
+from PyTracerTool.display import TableRenderer
+from PyTracerTool.table import TraceTable
+
+
+def traced_table(code: str) -> TraceTable:
+    tracer = CodeTracer(code, "")
+    tracer.generate_trace_table()
+    return tracer.trace_table
+
+
+def numbered_table(row_count: int, truncated: str = None) -> TraceTable:
+    table = TraceTable(["(main)i"], truncated)
+    for i in range(row_count):
+        table.append(1, {"(main)i": str(i)}, "")
+    return table
+
+
+class TableRendererTest(unittest.TestCase):
+    def test_html_escapes_values(self):
+        table = traced_table("s = '<b>&amp;</b>'\nprint('a < b & c')\n")
+        page = TableRenderer(table).render(format="html")
+        self.assertIn("<td>&lt;b&gt;&amp;amp;&lt;/b&gt;</td>", page)
+        self.assertIn("<td>a &lt; b &amp; c<br></td>", page)
+        self.assertNotIn("<b>", page)
+        self.assertIn("<th>(main)s</th>", page)
+        self.assertEqual(page.count("<tr>"), len(table))
+
+    def test_html_escapes_the_header_of_a_list(self):
+        page = TableRenderer([["Line", "<x>", "OUTPUT"], [1, "\"&'", ""]]).render(format="html")
+        self.assertIn("<th>&lt;x&gt;</th>", page)
+        self.assertIn("<td>&quot;&amp;&#x27;</td>", page)
+
+    def test_json_round_trips(self):
+        table = traced_table("text = 'quote \" and \\\\ and \\u00e9'\nfor i in range(3):\n    print(i, text)\n")
+        for source in (table, list(table)):
+            with self.subTest(type(source).__name__):
+                renderer = TableRenderer(source)
+                window = json.loads(renderer.render(format="json"))
+                self.assertEqual([window["header"]] + window["rows"], list(table))
+                self.assertEqual(window["start"], 0)
+                self.assertEqual(window["stop"], table.row_count)
+                self.assertEqual(window["row_count"], table.row_count)
+
+                window = json.loads(renderer.render(2, 4, columns=["OUTPUT", "Line"], format="json"))
+                self.assertEqual(window["header"], ["OUTPUT", "Line"])
+                self.assertEqual(window["rows"], [[row[-1], row[0]] for row in table[3:5]])
+                self.assertEqual((window["start"], window["stop"]), (2, 4))
+
+    def test_pages_cover_every_row_once(self):
+        for row_count in (0, 1, 5, 6, 7):
+            for truncated in (None, "max_steps (7) reached"):
+                with self.subTest(row_count=row_count, truncated=truncated):
+                    table = numbered_table(row_count, truncated)
+                    renderer = TableRenderer(table, page_size=3)
+                    self.assertEqual(renderer.page_count, max(-(-table.row_count // 3), 1))
+                    rows = []
+                    for number in range(1, renderer.page_count + 1):
+                        page = json.loads(renderer.page(number, format="json"))
+                        self.assertLessEqual(len(page["rows"]), 3)
+                        self.assertEqual(page["start"], (number - 1) * 3)
+                        rows.extend(page["rows"])
+                    self.assertEqual(rows, list(table)[1:])
+                    for number in (0, renderer.page_count + 1):
+                        with self.assertRaises(IndexError):
+                            renderer.page(number)
+
+    def test_windows_past_the_end_are_empty(self):
+        renderer = TableRenderer(numbered_table(5))
+        self.assertEqual(renderer.window(5, 10), (["Line", "(main)i", "OUTPUT"], []))
+        self.assertEqual(renderer.window(4, 2)[1], [])
+        self.assertEqual(renderer.window(-2)[1], [[1, "3", ""], [1, "4", ""]])
+
+    def test_invalid_arguments(self):
+        with self.assertRaises(ValueError):
+            TableRenderer(numbered_table(1), page_size=0)
+        with self.assertRaises(ValueError):
+            TableRenderer(numbered_table(1)).render(format="xml")
+        with self.assertRaises(KeyError):
+            TableRenderer(numbered_table(1)).window(columns=["(main)j"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+"""
+Tests for frame filtering: only the submitted code and the allowed modules may be traced, under every trace backend.
+"""
+
+import colorsys
+import json
+import unittest
+from unittest import mock
+
+from PyTracerTool import CodeTracer
+from PyTracerTool.backends import MonitoringBackend
+from PyTracerTool.filters import FrameFilter
+
+
+BACKENDS = ("settrace",) + (("monitoring",) if MonitoringBackend.is_available() else ())
+
+CODE = "import colorsys\nh = colorsys.rgb_to_hsv(1.0, 0.5, 0.0)\nprint(h[0])\n"
+
+
+def traced_scopes(backend: str, **options) -> set:
+    tracer = CodeTracer(CODE, "", backend=backend, **options)
+    tracer.generate_trace_table()
+    return {label[1:label.index(")")] for label in tracer.trace_table[0][1:-1]}
+
+
+class FrameFilterTest(unittest.TestCase):
+    def test_submitted_source_is_traced_by_default(self):
+        frame_filter = FrameFilter("<source>")
+        self.assertTrue(frame_filter.accepts_code(compile("x = 1", "<source>", "exec"), "__main__"))
+        self.assertFalse(frame_filter.accepts_code(colorsys.rgb_to_hsv.__code__, "colorsys"))
+        self.assertFalse(frame_filter.accepts_code(json.dumps.__code__, "json"))
+
+    def test_allow_matches_module_names_and_filenames(self):
+        code = colorsys.rgb_to_hsv.__code__
+        for pattern in ("colorsys", "color*", "*/colorsys.py", code.co_filename):
+            with self.subTest(pattern):
+                self.assertTrue(FrameFilter("<source>", allow=[pattern]).accepts_code(code, "colorsys"))
+        for pattern in ("json", "colorsys.*", "colorsys.py", "COLORSYS"):
+            with self.subTest(pattern):
+                self.assertFalse(FrameFilter("<source>", allow=[pattern]).accepts_code(code, "colorsys"))
+
+    def test_deny_takes_precedence_over_allow(self):
+        code = colorsys.rgb_to_hsv.__code__
+        for deny in ("colorsys", "*/colorsys.py", "*"):
+            with self.subTest(deny):
+                self.assertFalse(FrameFilter("<source>", allow=["*"], deny=[deny]).accepts_code(code, "colorsys"))
+        source = compile("x = 1", "<source>", "exec")
+        self.assertFalse(FrameFilter("<source>", deny=["<source>"]).accepts_code(source, "__main__"))
+        self.assertTrue(FrameFilter("<source>", allow=["*"], deny=["json"]).accepts_code(code, "colorsys"))
+
+    def test_the_package_itself_is_never_traced(self):
+        code = FrameFilter.accepts_code.__code__
+        self.assertFalse(FrameFilter("<source>", allow=["*"]).accepts_code(code, "PyTracerTool.filters"))
+
+    def test_decisions_are_cached_per_code_object(self):
+        frame_filter = FrameFilter("<source>", allow=["colorsys"], deny=["json"])
+        with mock.patch.object(FrameFilter, "_matches", wraps=FrameFilter._matches) as matches:
+            for _ in range(3):
+                self.assertTrue(frame_filter.accepts_code(colorsys.rgb_to_hsv.__code__, "colorsys"))
+                self.assertFalse(frame_filter.accepts_code(json.dumps.__code__, "json"))
+            # One allow and one deny match for the first, one allow match for the second.
+            self.assertEqual(matches.call_count, 3)
+            frame_filter.accepts_code(colorsys.hsv_to_rgb.__code__, "colorsys")
+            self.assertEqual(matches.call_count, 5)
+
+    def test_backends_follow_the_patterns(self):
+        for backend in BACKENDS:
+            with self.subTest(backend):
+                self.assertEqual(traced_scopes(backend), {"main"})
+                self.assertEqual(traced_scopes(backend, allow=["colorsys"]), {"main", "rgb_to_hsv"})
+                self.assertEqual(traced_scopes(backend, allow=["*/colorsys.py"]), {"main", "rgb_to_hsv"})
+                self.assertEqual(traced_scopes(backend, allow=["colorsys"], deny=["*/colorsys.py"]), {"main"})
+                # A run with allow patterns must not leave the allowed code traced in the next run.
+                self.assertEqual(traced_scopes(backend), {"main"})
+
+    def test_backends_trace_allowed_code_alike(self):
+        if len(BACKENDS) < 2:
+            self.skipTest("sys.monitoring is not available")
+        tables = []
+        for backend in BACKENDS:
+            tracer = CodeTracer(CODE, "", backend=backend, allow=["colorsys"])
+            tracer.generate_trace_table()
+            tables.append(list(tracer.trace_table))
+        self.assertEqual(tables[0], tables[1])
+
+
+if __name__ == "__main__":
+    unittest.main()
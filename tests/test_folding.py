@@ -0,0 +1,56 @@
+"""
+Tests for loop folding.
+"""
+
+import unittest
+
+from PyTracerTool import CodeTracer
+from PyTracerTool.folding import FoldedBlock, find_cycles
+
+
+class FindCyclesTest(unittest.TestCase):
+    def test_single_line_loop(self):
+        self.assertEqual(find_cycles([1, 2, 2, 2, 2, 3]), [FoldedBlock(1, 1, 4, (2,))])
+
+    def test_multi_line_loop(self):
+        lines = [1] + [2, 3, 4] * 5 + [5]
+        self.assertEqual(find_cycles(lines), [FoldedBlock(1, 3, 5, (2, 3, 4))])
+
+    def test_too_few_repeats_are_not_folded(self):
+        self.assertEqual(find_cycles([1, 2, 3, 2, 3, 4]), [])
+        self.assertEqual(find_cycles([1, 2, 3, 2, 3, 4], min_repeats=2), [FoldedBlock(1, 2, 2, (2, 3))])
+
+    def test_short_period_repeating_too_few_times_does_not_hide_a_longer_one(self):
+        # (1, 1) repeats twice at index 0, but (1, 1, 2) repeats three times from the same index.
+        lines = [1, 1, 2] * 3 + [9]
+        self.assertEqual(find_cycles(lines), [FoldedBlock(0, 3, 3, (1, 1, 2))])
+
+    def test_consecutive_runs_do_not_overlap(self):
+        lines = [5, 5, 5, 5, 1, 2, 1, 2, 1, 2]
+        self.assertEqual(find_cycles(lines), [FoldedBlock(0, 1, 4, (5,)), FoldedBlock(4, 2, 3, (1, 2))])
+
+    def test_max_period(self):
+        lines = list(range(10)) * 3
+        self.assertEqual(find_cycles(lines, max_period=9), [])
+        self.assertEqual(find_cycles(lines, max_period=10), [FoldedBlock(0, 10, 3, tuple(range(10)))])
+
+    def test_blocks_cover_the_repeated_lines(self):
+        lines = [1, 2, 3, 4, 2, 3, 4, 2, 3, 4, 2, 3, 5]
+        for block in find_cycles(lines):
+            for number in range(block.repeats):
+                self.assertEqual(tuple(lines[index] for index in block.iteration(number)), block.lines)
+
+
+class FoldedTraceTableTest(unittest.TestCase):
+    def test_folded_table_expands_back_to_the_full_table(self):
+        tracer = CodeTracer("total = 0\nfor i in range(20):\n    total += i\nprint(total)\n", "")
+        tracer.generate_trace_table()
+        rows = [list(row) for row in tracer.trace_table]
+        blocks = tracer.find_loops()
+        self.assertEqual(len(blocks), 1)
+        self.assertLess(len(tracer.folded_trace_table()), len(rows))
+        self.assertEqual(tracer.expand_block(blocks[0]), rows[1 + blocks[0].start:1 + blocks[0].stop])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+"""
+Tests for call tracking: the call tree of a trace and the recursion levels in the variable labels.
+"""
+
+import pickle
+import unittest
+
+from PyTracerTool import CodeTracer
+from PyTracerTool.frames import CallTree, label_key
+
+
+BACKENDS = ("settrace", "instrument")
+
+FACTORIAL = "def fact(n):\n    return 1 if n <= 1 else n * fact(n - 1)\nprint(fact(3))\n"
+
+SAME_NAME = (
+    "class B:\n"
+    "    def __init__(self):\n"
+    "        self.v = 1\n"
+    "class A:\n"
+    "    def __init__(self):\n"
+    "        self.b = B()\n"
+    "a = A()\n"
+)
+
+
+def trace(code: str, backend: str) -> CodeTracer:
+    tracer = CodeTracer(code, "", backend=backend)
+    tracer.generate_trace_table()
+    return tracer
+
+
+class RecursionLabelTest(unittest.TestCase):
+    def test_recursive_calls_get_their_own_columns(self):
+        for backend in BACKENDS:
+            with self.subTest(backend):
+                tracer = trace(FACTORIAL, backend)
+                self.assertEqual(
+                    [label for label in tracer.trace_table[0] if label.startswith("(fact")],
+                    ["(fact)n", "(fact:2)n", "(fact:3)n"],
+                )
+                self.assertEqual([record.level for record in tracer.call_tree.frames], [1, 1, 2, 3])
+
+    def test_functions_with_the_same_name_are_not_recursion(self):
+        for backend in BACKENDS:
+            with self.subTest(backend):
+                tracer = trace(SAME_NAME, backend)
+                scopes = [record.scope for record in tracer.call_tree.frames if record.function == "__init__"]
+                self.assertEqual(scopes, ["__init__", "__init__"])
+                self.assertNotIn("(__init__:2)self", tracer.trace_table[0])
+
+    def test_sequential_calls_reuse_the_first_level(self):
+        tracer = trace("def f(x):\n    return x\nf(1)\nf(2)\n", "settrace")
+        self.assertEqual([record.scope for record in tracer.call_tree.frames], ["main", "f", "f"])
+
+    def test_label_key_orders_levels_numerically(self):
+        labels = ["(fact:10)n", "(fact)n", "(fact:9)n", "(fact:2)n"]
+        self.assertEqual(sorted(labels, key=label_key), ["(fact)n", "(fact:2)n", "(fact:9)n", "(fact:10)n"])
+
+
+class CallTreeTest(unittest.TestCase):
+    def test_levels_are_counted_per_key(self):
+        tree = CallTree()
+        outer = tree.enter("__init__", None, 0, key="A.__init__")
+        inner = tree.enter("__init__", outer.frame_id, 0, key="B.__init__")
+        again = tree.enter("__init__", inner.frame_id, 0, key="A.__init__")
+        self.assertEqual([outer.scope, inner.scope, again.scope], ["__init__", "__init__", "__init__:2"])
+
+    def test_levels_default_to_the_function_name(self):
+        tree = CallTree()
+        outer = tree.enter("f", None, 0)
+        inner = tree.enter("f", outer.frame_id, 0)
+        tree.exit(inner.frame_id, 0, None)
+        after = tree.enter("f", outer.frame_id, 0)
+        self.assertEqual([outer.scope, inner.scope, after.scope], ["f", "f:2", "f:2"])
+
+    def test_pickle_keeps_the_tree(self):
+        tree = trace(FACTORIAL, "settrace").call_tree
+        copy = pickle.loads(pickle.dumps(tree))
+        self.assertEqual(
+            [(record.scope, record.depth, record.last_step, record.return_value) for record in copy.walk()],
+            [(record.scope, record.depth, record.last_step, record.return_value) for record in tree.walk()],
+        )
+        self.assertEqual(copy.events, tree.events)
+
+
+if __name__ == "__main__":
+    unittest.main()
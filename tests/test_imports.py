@@ -0,0 +1,35 @@
+"""
+Tests that importing PyTracerTool leaves the optional features and their dependencies unloaded.
+"""
+
+import subprocess
+import sys
+import unittest
+
+
+LAZY_MODULES = (
+    "tabulate", "copy", "PyTracerTool.cache", "PyTracerTool.diff", "PyTracerTool.tracefile",
+    "PyTracerTool.snapshots",
+)
+
+
+def loaded_after(statements: str) -> set:
+    script = f"import sys\n{statements}\nprint(' '.join(m for m in {LAZY_MODULES!r} if m in sys.modules))"
+    output = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True).stdout
+    return set(output.split())
+
+
+class LazyImportTest(unittest.TestCase):
+    def test_import_loads_no_optional_module(self):
+        self.assertEqual(loaded_after("import PyTracerTool"), set())
+
+    def test_shallow_trace_does_not_load_copy(self):
+        loaded = loaded_after(
+            "from PyTracerTool import CodeTracer\n"
+            "CodeTracer('x = [1]\\n', '', snapshot='shallow').generate_trace_table()"
+        )
+        self.assertEqual(loaded, {"PyTracerTool.snapshots"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+"""
+Tests for streaming steps: iter_steps must hand over the steps as they are recorded and leave nothing running.
+"""
+
+import sys
+import threading
+import time
+import unittest
+
+from PyTracerTool import CodeTracer
+
+
+INFINITE = "n = 0\nwhile True:\n    n += 1\n"
+
+
+def worker_threads() -> list:
+    return [thread for thread in threading.enumerate() if thread.name == "pytracertool-iter-steps"]
+
+
+class IterStepsTest(unittest.TestCase):
+    def test_steps_match_the_trace_table(self):
+        tracer = CodeTracer("total = 0\nfor i in range(3):\n    total += i\nprint(total)\n", "")
+        steps = list(tracer.iter_steps())
+        self.assertEqual([step.index for step in steps], list(range(len(steps))))
+        self.assertEqual([step.line for step in steps], [row[0] for row in tracer.trace_table[1:]])
+        self.assertEqual(steps[-1].output, "3\n")
+
+    def test_break_stops_the_traced_code(self):
+        tracer = CodeTracer(INFINITE, "")
+        for step in tracer.iter_steps(buffer_size=4):
+            if step.index == 20:
+                break
+        recorded = len(tracer.tracer_info)
+        time.sleep(0.1)
+        self.assertEqual(len(tracer.tracer_info), recorded)
+        self.assertLessEqual(recorded, 20 + 4 + 2)
+        self.assertEqual(worker_threads(), [])
+
+    def test_exception_is_reraised_after_the_steps_before_it(self):
+        tracer = CodeTracer("x = 1\ny = 2\nraise ValueError('boom')\n", "")
+        lines = []
+        with self.assertRaisesRegex(ValueError, "boom"):
+            for step in tracer.iter_steps():
+                lines.append(step.line)
+        self.assertEqual(lines[:2], [1, 2])
+        self.assertEqual(worker_threads(), [])
+
+    def test_streams_are_restored(self):
+        stdout, stdin = sys.stdout, sys.stdin
+        for code in ("name = input()\nprint(name)\n", INFINITE):
+            with self.subTest(code):
+                tracer = CodeTracer(code, "Ada\n")
+                for step in tracer.iter_steps():
+                    if step.index == 5:
+                        break
+                self.assertIs(sys.stdout, stdout)
+                self.assertIs(sys.stdin, stdin)
+
+    def test_no_thread_is_left_running(self):
+        for code in ("x = 1\n", INFINITE):
+            with self.subTest(code):
+                steps = CodeTracer(code, "").iter_steps()
+                next(steps)
+                steps.close()
+                self.assertEqual(worker_threads(), [])
+
+    def test_small_buffer_holds_back_the_traced_code(self):
+        tracer = CodeTracer(INFINITE, "")
+        steps = tracer.iter_steps(buffer_size=2)
+        for _ in range(3):
+            next(steps)
+        time.sleep(0.1)
+        # The steps consumed, the full queue, and one step waiting to be put in it.
+        self.assertLessEqual(len(tracer.tracer_info), 3 + 2 + 1)
+        steps.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
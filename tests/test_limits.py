@@ -0,0 +1,96 @@
+"""
+Tests for the execution limits: runaway code must be stopped under every backend.
+"""
+
+import sys
+import unittest
+
+from PyTracerTool import CodeTracer
+from PyTracerTool.backends import MonitoringBackend
+
+
+BACKENDS = ("settrace", "instrument", "reduced") + (("monitoring",) if MonitoringBackend.is_available() else ())
+
+INFINITE_LOOPS = {
+    "one-line while": "n = 0\nwhile True: n += 1\n",
+    "one-line while in a function": "def spin():\n    n = 0\n    while True: n += 1\nspin()\n",
+    "while": "n = 0\nwhile True:\n    n += 1\n",
+}
+
+# Loops that record no steps, so only the timeout can stop them.
+SILENT_LOOPS = {
+    "empty one-line while": "while True: pass\n",
+    "empty one-line while in a function": "def spin():\n    while True: pass\nspin()\n",
+    "infinite comprehension": "x = [i for i in iter(int, 1)]\n",
+    "infinite comprehension in a while test": "while [i for i in iter(int, 1)]:\n    pass\n",
+}
+
+
+def trace(code: str, backend: str, **limits) -> CodeTracer:
+    tracer = CodeTracer(code, "", backend=backend, **limits)
+    tracer.generate_trace_table()
+    return tracer
+
+
+class LimitsTest(unittest.TestCase):
+    def test_max_steps_stops_infinite_loops(self):
+        for backend in BACKENDS:
+            for name, code in INFINITE_LOOPS.items():
+                with self.subTest(backend=backend, loop=name):
+                    tracer = trace(code, backend, max_steps=100, timeout=5.0)
+                    self.assertEqual(tracer.truncated, "max_steps (100) reached")
+                    self.assertEqual(len(tracer.tracer_info), 100)
+
+    def test_timeout_stops_infinite_loops(self):
+        for backend in BACKENDS:
+            for name, code in {**INFINITE_LOOPS, **SILENT_LOOPS}.items():
+                with self.subTest(backend=backend, loop=name):
+                    tracer = trace(code, backend, timeout=0.2)
+                    self.assertEqual(tracer.truncated, "timeout (0.2) reached")
+
+    def test_max_output_bytes_stops_printing(self):
+        for backend in BACKENDS:
+            with self.subTest(backend=backend):
+                tracer = trace("while True: print('spam')\n", backend, max_output_bytes=50, timeout=5.0)
+                self.assertEqual(tracer.truncated, "max_output_bytes (50) reached")
+                self.assertLessEqual(sum(map(len, tracer.step_outputs.values())), 50)
+
+    def test_max_snapshot_bytes_counts_encoded_bytes(self):
+        # 30 two-byte characters, stored twice: 60 characters, but 120 bytes.
+        code = 's = "\u00e9" * 30\nt = s\n'
+        self.assertIsNone(trace(code, "settrace", max_snapshot_bytes=120).truncated)
+        self.assertEqual(trace(code, "settrace", max_snapshot_bytes=80).truncated, "max_snapshot_bytes (80) reached")
+
+    def test_every_entry_point_is_limited(self):
+        for method in ("generate_trace_table", "trace_lines", "capture_print_statements"):
+            with self.subTest(method):
+                tracer = CodeTracer(INFINITE_LOOPS["while"], "", max_steps=100, timeout=5.0)
+                getattr(tracer, method)()
+                self.assertEqual(tracer.truncated, "max_steps (100) reached")
+                self.assertEqual(len(tracer.execution_order), 100)
+
+                tracer = CodeTracer(SILENT_LOOPS["empty one-line while"], "", timeout=0.2)
+                getattr(tracer, method)()
+                self.assertEqual(tracer.truncated, "timeout (0.2) reached")
+
+    def test_streams_are_restored_after_an_exception(self):
+        stdin, stdout, trace_function = sys.stdin, sys.stdout, sys.gettrace()
+        for method in ("generate_trace_table", "trace_lines", "capture_print_statements"):
+            with self.subTest(method):
+                tracer = CodeTracer("name = input()\nprint(name)\nraise ValueError(name)\n", "Ada\n")
+                with self.assertRaisesRegex(ValueError, "Ada"):
+                    getattr(tracer, method)()
+                self.assertIs(sys.stdin, stdin)
+                self.assertIs(sys.stdout, stdout)
+                self.assertIs(sys.gettrace(), trace_function)
+                self.assertEqual(tracer.output_lines, {"2": "Ada\n"})
+
+    def test_finished_trace_is_not_truncated(self):
+        for backend in BACKENDS:
+            with self.subTest(backend=backend):
+                tracer = trace("x = 0\nfor i in range(3): x += i\n", backend, max_steps=100, timeout=5.0)
+                self.assertIsNone(tracer.truncated)
+
+
+if __name__ == "__main__":
+    unittest.main()
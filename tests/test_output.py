@@ -0,0 +1,76 @@
+"""
+Tests for output capture: every step must get exactly the output it printed, under every backend.
+"""
+
+import io
+import unittest
+from unittest import mock
+
+from PyTracerTool import CodeTracer
+from PyTracerTool.backends import MonitoringBackend
+
+
+BACKENDS = ("settrace", "instrument", "reduced") + (("monitoring",) if MonitoringBackend.is_available() else ())
+
+
+def trace(code: str, backend: str) -> CodeTracer:
+    tracer = CodeTracer(code, "", backend=backend)
+    tracer.generate_trace_table()
+    return tracer
+
+
+def printed(tracer: CodeTracer) -> list:
+    return [(row[0], row[-1]) for row in tracer.trace_table[1:] if row[-1]]
+
+
+class OutputTest(unittest.TestCase):
+    def test_loop_prints_one_chunk_per_step(self):
+        code = "for i in range(3):\n    print(i)\nprint('done', end='')\n"
+        for backend in BACKENDS:
+            with self.subTest(backend):
+                tracer = trace(code, backend)
+                self.assertEqual(printed(tracer), [(2, "0\n"), (2, "1\n"), (2, "2\n"), (3, "done")])
+                self.assertEqual(tracer.trace_table.column("OUTPUT"), [
+                    tracer.step_outputs.get(index, "") for index in range(len(tracer.tracer_info))
+                ])
+
+    def test_print_in_a_called_function(self):
+        code = (
+            "def greet(name):\n"
+            "    print('hello', name)\n"
+            "    return len(name)\n"
+            "size = greet('Ada')\n"
+            "print(size)\n"
+        )
+        for backend in BACKENDS:
+            with self.subTest(backend):
+                tracer = trace(code, backend)
+                self.assertEqual(printed(tracer), [(2, "hello Ada\n"), (5, "3\n")])
+
+    def test_several_prints_on_one_line(self):
+        code = "print(1); print(2)\nx = 1\n"
+        for backend in BACKENDS:
+            with self.subTest(backend):
+                # Reduced instrumentation records a step after each print, the other backends one per line.
+                expected = [(1, "1\n"), (1, "2\n")] if backend == "reduced" else [(1, "1\n2\n")]
+                self.assertEqual(printed(trace(code, backend)), expected)
+
+    def test_output_of_other_threads_is_not_captured(self):
+        code = (
+            "import threading\n"
+            "thread = threading.Thread(target=print, args=('from a thread',))\n"
+            "thread.start()\n"
+            "thread.join()\n"
+            "print('from the code')\n"
+        )
+        for backend in BACKENDS:
+            with self.subTest(backend):
+                stdout = io.StringIO()
+                with mock.patch("sys.stdout", stdout):
+                    tracer = trace(code, backend)
+                self.assertEqual(printed(tracer), [(5, "from the code\n")])
+                self.assertEqual(stdout.getvalue(), "from a thread\n")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+"""
+Tests for value rendering: a cached rendering must be the one a fresh rendering would give.
+"""
+
+import unittest
+
+from PyTracerTool import CodeTracer
+from PyTracerTool.rendering import ValueRenderer
+
+
+class Point(object):
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+
+
+class ValueRendererTest(unittest.TestCase):
+    def test_equal_values_of_different_types_do_not_collide(self):
+        renderer = ValueRenderer()
+        values = [1, True, 1.0, 0, False, 0.0, "1", b"1", (1,), (True,), (1.0,), (1, True), (True, 1)]
+        for _ in range(2):
+            self.assertEqual([renderer.render("v", value) for value in values], [str(value) for value in values])
+        for value in reversed(values):
+            self.assertEqual(renderer.render("v", value), str(value))
+
+    def test_objects_with_equal_attributes_of_different_types_do_not_collide(self):
+        renderer = ValueRenderer()
+        grids = [renderer.render("point", Point(x, 2)) for x in (1, True, 1.0, 1)]
+        self.assertIn("True", grids[1])
+        self.assertIn("1.0", grids[2])
+        self.assertEqual(len(set(grids)), 3)
+        self.assertEqual(grids[3], grids[0])
+
+    def test_least_recently_used_value_is_evicted(self):
+        renderer = ValueRenderer(max_entries=3)
+        for value in (1, 2, 3):
+            renderer.render("v", value)
+        self.assertEqual((renderer.hits, renderer.misses), (0, 3))
+
+        renderer.render("v", 1)
+        renderer.render("v", 4)
+        self.assertEqual((renderer.hits, renderer.misses), (1, 4))
+        # 2 was the least recently used value when 4 was added; 1 had just been used.
+        renderer.render("v", 2)
+        self.assertEqual((renderer.hits, renderer.misses), (1, 5))
+        # Adding 2 evicted 3, and kept 1, 4 and 2.
+        for value in (1, 4, 2):
+            renderer.render("v", value)
+        self.assertEqual((renderer.hits, renderer.misses), (4, 5))
+        renderer.render("v", 3)
+        self.assertEqual((renderer.hits, renderer.misses), (4, 6))
+
+    def test_values_outside_the_cache_are_rendered_every_time(self):
+        for renderer in (ValueRenderer(max_entries=0), ValueRenderer()):
+            with self.subTest(max_entries=renderer.max_entries):
+                for _ in range(3):
+                    self.assertEqual(renderer.render("v", [1, 2]), "[1, 2]")
+                    self.assertEqual(renderer.render("v", 1.5), "1.5")
+                self.assertEqual(renderer.hits, 0)
+        renderer = ValueRenderer(max_entries=0)
+        for _ in range(3):
+            renderer.render("v", 1)
+        self.assertEqual((renderer.hits, renderer.misses), (0, 3))
+
+    def test_functions_are_not_shown(self):
+        renderer = ValueRenderer()
+        self.assertIsNone(renderer.render("f", len))
+        self.assertIsNone(renderer.render("f", lambda: None))
+
+    def test_trace_with_a_small_cache(self):
+        code = "x = 1\nx = True\nx = 1.0\nx = 1\nx = (1, True)\nx = (True, 1)\n"
+        for render_cache_size in (0, 1, 4096):
+            with self.subTest(render_cache_size=render_cache_size):
+                tracer = CodeTracer(code, "", render_cache_size=render_cache_size)
+                tracer.generate_trace_table()
+                self.assertEqual(
+                    tracer.trace_table.column("(main)x"), ["1", "True", "1.0", "1", "(1, True)", "(True, 1)"]
+                )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+"""
+Tests for the snapshot policies: every mode and change detection must render what a fresh rendering would show.
+"""
+
+import types
+import unittest
+from unittest import mock
+
+from PyTracerTool.rendering import ValueRenderer
+from PyTracerTool.snapshots import Snapshotter
+
+
+def frame(**local_variables) -> types.SimpleNamespace:
+    return types.SimpleNamespace(f_locals=local_variables, f_code=types.SimpleNamespace(co_name="main"))
+
+
+class SnapshotterTest(unittest.TestCase):
+    def test_exact_detects_an_item_replaced_in_place(self):
+        snapshotter = Snapshotter(ValueRenderer(), change_detection="exact")
+        items = [1, 2, 3]
+        self.assertEqual(snapshotter.snapshot(frame(items=items), 0), {"(main)items": "[1, 2, 3]"})
+        items[1] = 5
+        self.assertEqual(snapshotter.snapshot(frame(items=items), 0), {"(main)items": "[1, 5, 3]"})
+        items[1] = 5.0
+        self.assertEqual(snapshotter.snapshot(frame(items=items), 0), {"(main)items": "[1, 5.0, 3]"})
+        self.assertEqual(snapshotter.reused, 0)
+
+    def test_sampled_reuses_the_rendering_of_an_untouched_list(self):
+        snapshotter = Snapshotter(ValueRenderer(), change_detection="sampled", sample_size=4)
+        items = list(range(1000))
+        first = snapshotter.snapshot(frame(items=items), 0)["(main)items"]
+        second = snapshotter.snapshot(frame(items=items), 0)["(main)items"]
+        self.assertIs(second, first)
+        self.assertEqual(snapshotter.reused, 1)
+
+        # A sampled item is checked; an item between two samples is missed until a sampled one changes.
+        items[250] = -1
+        self.assertIn("-1", snapshotter.snapshot(frame(items=items), 0)["(main)items"])
+        items[1] = -2
+        self.assertNotIn("-2", snapshotter.snapshot(frame(items=items), 0)["(main)items"])
+        items.append(1000)
+        self.assertIn("-2", snapshotter.snapshot(frame(items=items), 0)["(main)items"])
+
+    def test_off_renders_every_step(self):
+        snapshotter = Snapshotter(ValueRenderer(), change_detection="off")
+        items = [1, 2, 3]
+        for _ in range(3):
+            self.assertEqual(snapshotter.snapshot(frame(items=items), 0), {"(main)items": "[1, 2, 3]"})
+        self.assertEqual(snapshotter.reused, 0)
+
+    def test_frames_are_tracked_separately(self):
+        snapshotter = Snapshotter(ValueRenderer())
+        items = [1, 2]
+        snapshotter.snapshot(frame(items=items), 0)
+        snapshotter.end_frame(0)
+        snapshotter.snapshot(frame(items=items), 1)
+        self.assertEqual(snapshotter.reused, 0)
+
+    def test_repr_truncates_long_values(self):
+        snapshotter = Snapshotter(ValueRenderer(), mode="repr")
+        state = snapshotter.snapshot(frame(text="a" * 200, items=list(range(100)), short="abc"), 0)
+        self.assertEqual(state["(main)text"], "a" * 77 + "...")
+        self.assertEqual(state["(main)items"], "[0, 1, 2, 3, 4, 5, ...]")
+        self.assertEqual(state["(main)short"], "abc")
+        self.assertEqual(snapshotter.render_value("text", "b" * 81), "b" * 77 + "...")
+
+    def test_shallow_renders_values_that_cannot_be_copied(self):
+        snapshotter = Snapshotter(ValueRenderer(), mode="shallow")
+        generator = (i for i in range(3))
+        with mock.patch("copy.deepcopy", side_effect=AssertionError("shallow snapshots are not copied")):
+            state = snapshotter.snapshot(frame(generator=generator, items=[1, 2]), 0)
+        self.assertTrue(state["(main)generator"].startswith("<generator object"))
+        self.assertEqual(state["(main)items"], "[1, 2]")
+        self.assertEqual(next(generator), 0)
+
+    def test_deep_falls_back_to_the_live_value(self):
+        snapshotter = Snapshotter(ValueRenderer(), mode="deep")
+        state = snapshotter.snapshot(frame(generator=(i for i in range(3)), items=[[1], [2]]), 0)
+        self.assertTrue(state["(main)generator"].startswith("<generator object"))
+        self.assertEqual(state["(main)items"], "[[1], [2]]")
+
+    def test_unknown_policies_are_rejected(self):
+        with self.assertRaises(ValueError):
+            Snapshotter(ValueRenderer(), mode="full")
+        with self.assertRaises(ValueError):
+            Snapshotter(ValueRenderer(), change_detection="always")
+
+
+if __name__ == "__main__":
+    unittest.main()
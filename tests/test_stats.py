@@ -0,0 +1,41 @@
+"""
+Tests for the tracer statistics collected with collect_stats=True.
+"""
+
+import json
+import unittest
+
+from PyTracerTool import CodeTracer
+
+
+LOOP = "total = 0\nfor i in range(5):\n    total += i\nprint(total)\n"
+
+
+class LineStatsTest(unittest.TestCase):
+    def setUp(self):
+        self.tracer = CodeTracer(LOOP, "", collect_stats=True)
+        self.tracer.generate_trace_table()
+        self.stats = self.tracer.stats
+
+    def test_record_histogram_has_one_sample_per_step(self):
+        for number, line in self.stats.lines.items():
+            with self.subTest(line=number):
+                self.assertEqual(line.record.count, line.steps)
+                self.assertEqual(sum(line.record.buckets.values()), line.steps)
+        self.assertEqual(self.stats.lines[3].steps, 5)
+
+    def test_totals_match_histograms(self):
+        line = self.stats.lines[3]
+        self.assertEqual(line.record_time, line.record.total)
+        self.assertEqual(line.run_time, line.run.total)
+        self.assertGreater(line.run.count, 0)
+
+    def test_as_dict_is_json_compatible(self):
+        lines = json.loads(json.dumps(self.stats.as_dict()))["lines"]
+        self.assertEqual(lines["3"]["steps"], 5)
+        self.assertEqual(sum(lines["3"]["record"]["buckets_us"].values()), 5)
+        self.assertIn("buckets_us", lines["3"]["run"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+"""
+Tests for the step log: rebuilding states from keyframes and deltas must give back every state that was appended.
+"""
+
+import random
+import unittest
+
+from PyTracerTool import CodeTracer
+from PyTracerTool.steps import StepLog
+
+
+def random_steps(count: int, seed: int) -> list:
+    # Steps of three interleaved frames whose variables are added, changed, kept and removed.
+    generator = random.Random(seed)
+    states = {0: {}, 1: {}, 2: {}}
+    steps = []
+    for line in range(count):
+        frame_id = generator.choice((0, 0, 0, 1, 2))
+        state = dict(states[frame_id])
+        for name in generator.sample("abcdef", generator.randint(0, 3)):
+            if name in state and generator.random() < 0.2:
+                del state[name]
+            else:
+                state[name] = str(generator.randint(0, 3))
+        states[frame_id] = state
+        steps.append((frame_id, line, state))
+    return steps
+
+
+def naive_changes(steps: list) -> list:
+    last_states, changes = {}, []
+    for frame_id, _, state in steps:
+        last = last_states.get(frame_id)
+        changes.append(dict(state) if last is None else {
+            name: value for name, value in state.items() if last.get(name) != value
+        })
+        last_states[frame_id] = state
+    return changes
+
+
+class StepLogTest(unittest.TestCase):
+    def test_states_and_changes_across_keyframes(self):
+        steps = random_steps(200, seed=3)
+        changes = naive_changes(steps)
+        for keyframe_interval in (1, 2, 3, 32):
+            with self.subTest(keyframe_interval=keyframe_interval):
+                log = StepLog(keyframe_interval)
+                for (frame_id, line, state), expected in zip(steps, changes):
+                    self.assertEqual(log.append(frame_id, line, state), expected)
+
+                self.assertEqual(len(log), len(steps))
+                self.assertEqual(list(log), [state for _, _, state in steps])
+                for index, (frame_id, line, state) in enumerate(steps):
+                    self.assertEqual(log.state_at(index), state)
+                    self.assertEqual(log.changes_at(index), changes[index])
+                    self.assertEqual((log.lines[index], log.frame_ids[index]), (line, frame_id))
+                self.assertEqual(log.state_at(-1), steps[-1][2])
+                self.assertEqual(log[-3:], [state for _, _, state in steps[-3:]])
+                self.assertEqual([entry[2] for entry in log.iter_changes()], changes)
+                with self.assertRaises(IndexError):
+                    log.state_at(len(steps))
+
+    def test_append_changes_keeps_the_other_variables(self):
+        for keyframe_interval in (1, 2, 32):
+            with self.subTest(keyframe_interval=keyframe_interval):
+                log = StepLog(keyframe_interval)
+                self.assertEqual(log.append_changes(0, 1, {"x": "1"}), {"x": "1"})
+                self.assertEqual(log.append_changes(0, 2, {"y": "2"}), {"y": "2"})
+                self.assertEqual(log.append_changes(0, 3, {"x": "1"}), {})
+                self.assertEqual(log.append_changes(0, 4, {"x": "3"}), {"x": "3"})
+                self.assertEqual(
+                    list(log), [{"x": "1"}, {"x": "1", "y": "2"}, {"x": "1", "y": "2"}, {"x": "3", "y": "2"}]
+                )
+                self.assertEqual(list(map(log.changes_at, range(4))), [{"x": "1"}, {"y": "2"}, {}, {"x": "3"}])
+
+    def test_ended_frame_starts_over(self):
+        log = StepLog(32)
+        log.append(0, 1, {"x": "1"})
+        self.assertEqual(log.end_frame(0), 0)
+        self.assertIsNone(log.end_frame(0))
+        log.append(0, 2, {"y": "2"})
+        self.assertEqual(log.state_at(1), {"y": "2"})
+        self.assertEqual(log.previous.tolist(), [-1, -1])
+
+    def test_changes_of_streamed_steps_can_be_modified(self):
+        code = "def f(n):\n    m = n + 1\n    return m\nx = 1\nfor i in range(40):\n    x = f(i)\n"
+        for backend in ("settrace", "reduced"):
+            with self.subTest(backend):
+                expected = CodeTracer(code, "", backend=backend)
+                expected.generate_trace_table()
+
+                tracer = CodeTracer(code, "", backend=backend)
+                for step in tracer.iter_steps():
+                    step.changes.clear()
+                    step.changes["(main)x"] = "corrupted"
+                self.assertEqual(list(tracer.tracer_info), list(expected.tracer_info))
+                self.assertEqual(list(tracer.tracer_info.iter_changes()), list(expected.tracer_info.iter_changes()))
+
+    def test_invalid_keyframe_interval(self):
+        with self.assertRaises(ValueError):
+            StepLog(0)
+
+
+if __name__ == "__main__":
+    unittest.main()
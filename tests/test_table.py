@@ -0,0 +1,93 @@
+"""
+Tests for the columnar trace table: the column queries must agree with the rows they are answered without.
+"""
+
+import unittest
+
+from PyTracerTool import CodeTracer
+
+
+PROGRAMS = {
+    "frames": (
+        "def square(n):\n"
+        "    result = n * n\n"
+        "    return result\n"
+        "total = 0\n"
+        "for i in range(40):\n"
+        "    total += square(i % 3)\n"
+        "    last = total\n"
+        "print(total)\n"
+    ),
+    "recursion": (
+        "def fact(n):\n"
+        "    if n <= 1:\n"
+        "        return 1\n"
+        "    return n * fact(n - 1)\n"
+        "x = fact(6)\n"
+        "x = fact(3)\n"
+    ),
+    "repeated values": (
+        "flag = True\n"
+        "for i in range(50):\n"
+        "    flag = not flag\n"
+        "    del i\n"
+        "    i = 0\n"
+    ),
+}
+
+
+def naive_history(rows: list, position: int) -> list:
+    history, last = [], ""
+    for row, cells in enumerate(rows):
+        if cells[position] and cells[position] != last:
+            history.append((row, cells[position]))
+            last = cells[position]
+    return history
+
+
+class TraceTableTest(unittest.TestCase):
+    def test_queries_match_the_rows(self):
+        for name, code in PROGRAMS.items():
+            for keyframe_interval in (1, 32):
+                with self.subTest(name, keyframe_interval=keyframe_interval):
+                    tracer = CodeTracer(code, "", keyframe_interval=keyframe_interval)
+                    tracer.generate_trace_table()
+                    table = tracer.trace_table
+                    header, rows = list(table[0]), list(table[1:])
+
+                    for position, label in enumerate(header[1:-1], 1):
+                        history = naive_history(rows, position)
+                        self.assertEqual(table.history(label), history, label)
+                        self.assertEqual(table.changed_rows(label).tolist(), [row for row, _ in history], label)
+                        self.assertEqual(table.column(label), [cells[position] for cells in rows], label)
+
+                    for line in {cells[0] for cells in rows}:
+                        self.assertEqual(
+                            table.rows_at_line(line).tolist(),
+                            [row for row, cells in enumerate(rows) if cells[0] == line],
+                        )
+                    self.assertEqual(table.rows_at_line(1000).tolist(), [])
+
+    def test_rows_match_the_step_states(self):
+        for name, code in PROGRAMS.items():
+            for keyframe_interval in (1, 32):
+                with self.subTest(name, keyframe_interval=keyframe_interval):
+                    tracer = CodeTracer(code, "", keyframe_interval=keyframe_interval)
+                    tracer.generate_trace_table()
+                    header = tracer.trace_table[0]
+                    for index, cells in enumerate(tracer.trace_table[1:]):
+                        state = tracer.tracer_info.state_at(index)
+                        self.assertEqual(cells[0], tracer.tracer_info.lines[index])
+                        self.assertEqual(cells[1:-1], [state.get(label, "") for label in header[1:-1]])
+
+    def test_unknown_column(self):
+        tracer = CodeTracer("x = 1\n", "")
+        tracer.generate_trace_table()
+        with self.assertRaises(KeyError):
+            tracer.trace_table.history("(main)y")
+        with self.assertRaises(KeyError):
+            tracer.trace_table.changed_rows("(main)y")
+
+
+if __name__ == "__main__":
+    unittest.main()
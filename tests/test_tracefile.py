@@ -0,0 +1,68 @@
+"""
+Tests for binary trace files: a saved trace must read back as the trace table it was saved from.
+"""
+
+import os
+import tempfile
+import unittest
+
+from PyTracerTool import CodeTracer
+from PyTracerTool.tracefile import TraceFile
+
+
+PROGRAMS = {
+    "loop": "total = 0\nfor i in range(40):\n    total += i\n    print(i)\nprint('total', total)\n",
+    "recursion": "def fact(n):\n    return 1 if n <= 1 else n * fact(n - 1)\nprint(fact(5))\n",
+    "disappearing variables": "def f():\n    a = 1\n    del a\n    b = [1, 2]\n    return b\nx = f()\n",
+    "unicode": "word = 'caf\\u00e9 \\u2603'\nprint(word * 2)\nother = word.upper()\n",
+    "input": "name = input()\nprint('Hello', name)\n",
+}
+
+
+class TraceFileTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "trace.bin")
+
+    def save(self, code: str, user_input: str = "Ada\n", **options) -> CodeTracer:
+        # A short keyframe interval makes the delta chains of the file cross several keyframes.
+        tracer = CodeTracer(code, user_input, keyframe_interval=4, **options)
+        tracer.generate_trace_table()
+        tracer.save_trace(self.path)
+        return tracer
+
+    def test_rows_match_trace_table(self):
+        for name, code in PROGRAMS.items():
+            with self.subTest(name):
+                tracer = self.save(code)
+                with TraceFile(self.path) as trace:
+                    self.assertEqual(trace.header, tracer.trace_table[0])
+                    self.assertEqual(len(trace), len(tracer.trace_table) - 1)
+                    self.assertEqual(trace.rows(0, len(trace)), [list(row) for row in tracer.trace_table[1:]])
+                    self.assertIsNone(trace.truncated)
+
+    def test_random_access_matches_step_log(self):
+        tracer = self.save(PROGRAMS["loop"])
+        with TraceFile(self.path) as trace:
+            for index in (len(trace) - 1, 0, 37, 5, len(trace) // 2):
+                self.assertEqual(trace.row(index), list(tracer.trace_table[index + 1]))
+                self.assertEqual(trace.state_at(index), tracer.tracer_info.state_at(index))
+                self.assertEqual(trace.line_at(index), tracer.execution_order[index])
+
+    def test_truncated_trace_keeps_its_reason(self):
+        tracer = self.save("while True:\n    pass\n", max_steps=10)
+        with TraceFile(self.path) as trace:
+            self.assertEqual(trace.truncated, tracer.truncated)
+            # The trace table ends with a row saying why the trace stopped, which the file keeps as `truncated`.
+            self.assertEqual(trace.rows(0, len(trace)), [list(row) for row in tracer.trace_table[1:-1]])
+
+    def test_other_files_are_rejected(self):
+        with open(self.path, "wb") as file:
+            file.write(b"not a trace file, but long enough to hold a header" * 2)
+        with self.assertRaises(ValueError):
+            TraceFile(self.path)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,102 @@
+"""
+Tests for the tracing worker: run as a process, it must answer every line and isolate the programs it traces.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import unittest
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs the worker, then reports on stderr how many times it warmed up.
+WORKER = (
+    "import sys\n"
+    "from PyTracerTool import worker\n"
+    "calls = []\n"
+    "warm_up = worker.warm_up\n"
+    "worker.warm_up = lambda options: (calls.append(options), warm_up(options))\n"
+    "status = worker.main(sys.argv[1:])\n"
+    "sys.stderr.write(f'warm ups: {len(calls)}\\n')\n"
+    "sys.exit(status)\n"
+)
+
+LEAKING = (
+    "import sys\n"
+    "import builtins\n"
+    "import colorsys\n"
+    "sys.modules['leaked_module'] = sys\n"
+    "builtins.leaked_name = 1\n"
+    "sys.path.append('/leaked')\n"
+    "global counter\n"
+    "counter = 1\n"
+)
+
+CHECKING = (
+    "import sys\n"
+    "import builtins\n"
+    "leaks = ['leaked_module' in sys.modules, hasattr(builtins, 'leaked_name'), '/leaked' in sys.path,\n"
+    "         'counter' in globals()]\n"
+)
+
+
+def run_worker(lines: list, *arguments: str) -> tuple:
+    completed = subprocess.run(
+        [sys.executable, "-c", WORKER, "--backend", "settrace", *arguments],
+        input="".join(line + "\n" for line in lines), capture_output=True, text=True, cwd=ROOT, timeout=60,
+    )
+    results = [json.loads(line) for line in completed.stdout.splitlines()]
+    return completed.returncode, results, completed.stderr
+
+
+def isolations() -> list:
+    return ["fork", "reset"] if hasattr(os, "fork") else ["reset"]
+
+
+class WorkerTest(unittest.TestCase):
+    def test_programs_do_not_leak_into_the_next_one(self):
+        requests = [json.dumps({"id": 1, "code": LEAKING}), json.dumps({"id": 2, "code": CHECKING})]
+        for isolation in isolations():
+            with self.subTest(isolation):
+                status, results, stderr = run_worker(requests, "--isolation", isolation)
+                self.assertEqual(status, 0, stderr)
+                self.assertEqual([result["error"] for result in results], [None, None])
+                table = results[1]["trace_table"]
+                self.assertEqual(table[-1][table[0].index("(main)leaks")], "[False, False, False, False]")
+
+    def test_malformed_lines_get_an_error(self):
+        requests = ["not json", json.dumps({"code": 1}), "[1, 2]", "", json.dumps({"id": "ok", "code": "x = 1\n"})]
+        for isolation in isolations():
+            with self.subTest(isolation):
+                status, results, stderr = run_worker(requests, "--isolation", isolation)
+                self.assertEqual(status, 0, stderr)
+                self.assertEqual(len(results), 4)
+                for result in results[:3]:
+                    self.assertTrue(result["error"].startswith("Invalid request: "))
+                    self.assertIsNone(result["trace_table"])
+                self.assertEqual(results[3]["id"], "ok")
+                self.assertEqual(results[3]["trace_table"], [["Line", "(main)x", "OUTPUT"], [1, "1", ""]])
+
+    def test_warm_up_runs_once(self):
+        requests = [json.dumps({"id": index, "code": f"x = {index}\n"}) for index in range(3)]
+        for isolation in isolations():
+            with self.subTest(isolation):
+                status, results, stderr = run_worker(requests, "--isolation", isolation)
+                self.assertEqual(status, 0, stderr)
+                self.assertEqual([result["id"] for result in results], [0, 1, 2])
+                self.assertIn("warm ups: 1\n", stderr)
+
+    def test_program_exiting_only_loses_its_child(self):
+        if not hasattr(os, "fork"):
+            self.skipTest("the fork isolation needs os.fork")
+        requests = [json.dumps({"code": "import os\nos._exit(3)\n"}), json.dumps({"code": "x = 1\n"})]
+        status, results, stderr = run_worker(requests, "--isolation", "fork")
+        self.assertEqual(status, 0, stderr)
+        self.assertEqual(results[0]["error"], "Worker process exited while tracing")
+        self.assertIsNone(results[1]["error"])
+
+
+if __name__ == "__main__":
+    unittest.main()